@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appkarin'
+
+    def ready(self):
+        # Registrar señales (contadores desnormalizados)
+        from . import signals  # noqa: F401
+        
+        # El modo token del wizard necesita un caché compartido entre workers
+        from .wizard_state import verificar_configuracion
+        verificar_configuracion()
@@ -0,0 +1,104 @@
+# cache_paginas.py - Caché de páginas completas del flujo público (hub, inicio, Paso 1)
+"""
+El HTML de estas páginas es el mismo para todos los visitantes de una empresa;
+sólo cambian el token CSRF, el usuario admin logueado y el control de sesión
+del wizard. El HTML se guarda en caché con:
+- clave: vista + argumentos de la URL + ruta (sin query string: parámetros
+  como utm_* no crean entradas nuevas) + usuario + variante (resultado del
+  control de sesión) + huella del catálogo con que se renderizó
+- vigencia: PAGINAS_CACHE_TIMEOUT, sin pasar la del catálogo, para que una
+  página nunca quede más desactualizada que el catálogo (ver catalogo.py)
+- el token CSRF reemplazado por un marcador, que se sustituye en cada respuesta
+
+Cada respuesta lleva un ETag fuerte (huella del HTML + secreto CSRF del
+visitante): si el navegador revalida con If-None-Match se responde 304 sin
+renderizar. Un cambio de templates en un despliegue se refleja al expirar
+la entrada (PAGINAS_CACHE_TIMEOUT), porque el ETag sale del HTML renderizado.
+
+Costo aceptado antes de consultar el caché: la clave lee request.user, así
+que cada GET (también de visitantes anónimos) accede a la sesión; y en modo
+token (WIZARD_STATE_MODE) la variante de Paso 1 descifra el token Fernet del
+wizard. Ambos son más baratos que renderizar la página.
+"""
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from .cache_utils import hash_key
+from .catalogo import obtener_catalogo
+import hashlib
+
+
+# Reemplaza al token CSRF en el HTML guardado
+MARCADOR_CSRF = 'csrf-pagina-cacheada-f3a9c1'
+
+
+def render_pagina(request, template_name, context=None):
+    """render() para vistas con @pagina_cacheada: {% csrf_token %} queda como marcador"""
+    context = dict(context or {}, csrf_token=MARCADOR_CSRF)
+    return render(request, template_name, context)
+
+
+def sin_cache(response):
+    """Marca una respuesta de una vista con @pagina_cacheada para que no se guarde"""
+    response.sin_cache = True
+    return response
+
+
+def pagina_cacheada(nombre, variante=None):
+    """
+    Cachea la respuesta HTML de la vista y responde 304 a revalidaciones.
+
+    Args:
+        nombre: Identificador de la página dentro de la clave
+        variante: Función (request) que resuelve el control de sesión de la
+            vista; se evalúa en cada request y separa las entradas en caché
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return vista(request, *args, **kwargs)
+
+            user = request.user
+            partes = [
+                *args, sorted(kwargs.items()),
+                request.path,
+                user.get_username() if user.is_authenticated else '',
+                variante(request) if variante else ''
+            ]
+            catalogo = obtener_catalogo()
+            key = f'appkarin:pagina:{nombre}:{catalogo.huella[:16]}:{hash_key(partes)}'
+
+            pagina = cache.get(key)
+            if pagina is None:
+                response = vista(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming or getattr(response, 'sin_cache', False):
+                    return response
+                pagina = {
+                    'contenido': response.content,
+                    'content_type': response['Content-Type'],
+                    'huella': hashlib.sha256(response.content).hexdigest(),
+                }
+                cache.set(key, pagina, max(1, min(settings.PAGINAS_CACHE_TIMEOUT, int(catalogo.vigencia()))))
+
+            contenido = pagina['contenido']
+            huella = pagina['huella']
+            if MARCADOR_CSRF.encode() in contenido:
+                # get_token crea la cookie CSRF si falta; el ETag cambia si el secreto cambia
+                token = get_token(request)
+                huella = hashlib.sha256(f"{huella}:{request.META['CSRF_COOKIE']}".encode()).hexdigest()
+                contenido = contenido.replace(MARCADOR_CSRF.encode(), token.encode())
+
+            response = HttpResponse(contenido, content_type=pagina['content_type'])
+            response['ETag'] = quote_etag(huella[:40])
+            # Depende de la sesión y del token CSRF: sólo el navegador la guarda y siempre revalida
+            patch_cache_control(response, private=True, no_cache=True)
+
+            return get_conditional_response(request, etag=response['ETag'], response=response)
+        return envoltura
+    return decorador
@@ -0,0 +1,35 @@
+# cache_utils.py - Utilidades de caché versionado
+from django.core.cache import caches
+import hashlib
+
+
+def get_cache_version(nombre, alias='default'):
+    """
+    Retorna la versión actual de un grupo de claves de caché.
+    Las claves que incluyen la versión quedan invalidadas al incrementarla.
+    Con alias='compartido' la versión es la misma para todos los workers.
+    """
+    cache = caches[alias]
+    key = f'appkarin:version:{nombre}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_cache_version(nombre, alias='default'):
+    """Incrementa la versión de un grupo de claves (invalida todas sus entradas)"""
+    cache = caches[alias]
+    key = f'appkarin:version:{nombre}'
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # La clave no existía (o expiró): se inicializa
+        cache.add(key, 2, timeout=None)
+        return cache.get(key, 2)
+
+
+def hash_key(valor):
+    """Hash corto y estable para usar texto libre dentro de una clave de caché"""
+    return hashlib.md5(str(valor).encode('utf-8')).hexdigest()
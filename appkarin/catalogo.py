@@ -0,0 +1,211 @@
+# catalogo.py - Caché del catálogo del wizard (categorías, items, relaciones, tiempos, empresas)
+"""
+Datos de referencia que casi nunca cambian y que el flujo público consulta en
+cada request. Se guardan en dos niveles:
+- caché compartido con clave versionada: un proceso nuevo no consulta la BD
+- memoria del proceso: mientras la versión no cambie no hay consultas ni
+  deserialización, sólo la lectura de la versión
+
+Las señales (signals.py) incrementan la versión al guardar o eliminar desde el
+admin. Con Redis la versión es la misma para todos los workers y el cambio se
+ve de inmediato. Con caché en memoria local cada worker tiene su propia
+versión: ahí la vigencia de un catálogo se cuenta desde que se leyó de la BD
+(no desde que llegó a memoria), así que un cambio se ve en todos los workers
+a más tardar CATALOGO_CACHE_TIMEOUT después.
+"""
+from dataclasses import astuple, dataclass
+from django.conf import settings
+from django.core.cache import cache
+from .cache_utils import get_cache_version
+import hashlib
+import json
+import threading
+import time
+
+
+CATALOGO_CACHE = 'catalogo'
+
+
+@dataclass(frozen=True)
+class ItemCatalogo:
+    id: int
+    enunciado: str
+    categoria_id: int
+    categoria_nombre: str
+
+
+@dataclass(frozen=True)
+class CategoriaCatalogo:
+    id: int
+    nombre: str
+    items: tuple
+
+
+@dataclass(frozen=True)
+class RelacionCatalogo:
+    id: int
+    rol: str
+
+
+@dataclass(frozen=True)
+class TiempoCatalogo:
+    id: int
+    intervalo: str
+
+
+@dataclass(frozen=True)
+class EmpresaCatalogo:
+    id: int
+    nombre: str
+    descripcion: str
+
+
+class Catalogo:
+    """Catálogo inmutable de una versión, con búsquedas por id"""
+
+    def __init__(self, version, categorias, relaciones, tiempos, empresas, api, creado=None):
+        self.version = version
+        # Momento en que se leyó de la BD: de aquí se cuenta la vigencia
+        self.creado = time.time() if creado is None else creado
+        self.categorias = tuple(categorias)
+        self.relaciones = tuple(relaciones)
+        self.tiempos = tuple(tiempos)
+        self.empresas = tuple(empresas)
+        # Salida ya serializada de los endpoints JSON del wizard
+        self.api = api
+        # Huella del contenido de cada sección de api (ETag de los endpoints)
+        self.huellas = {
+            seccion: hashlib.sha256(
+                json.dumps(datos, sort_keys=True, separators=(',', ':')).encode()
+            ).hexdigest()
+            for seccion, datos in api.items()
+        }
+        # Huella de todo el catálogo (clave de las páginas cacheadas)
+        self.huella = hashlib.sha256(
+            json.dumps([self.huellas, [astuple(empresa) for empresa in self.empresas]], sort_keys=True).encode()
+        ).hexdigest()
+        self._indexar()
+
+    def _indexar(self):
+        self._items = {item.id: item for categoria in self.categorias for item in categoria.items}
+        self._relaciones = {relacion.id: relacion for relacion in self.relaciones}
+        self._tiempos = {tiempo.id: tiempo for tiempo in self.tiempos}
+        self._empresas = {empresa.id: empresa for empresa in self.empresas}
+        self._empresas_por_nombre = {empresa.nombre: empresa for empresa in self.empresas}
+
+    def __getstate__(self):
+        # Los índices se reconstruyen al leer desde el caché compartido
+        return {
+            'version': self.version,
+            'creado': self.creado,
+            'categorias': self.categorias,
+            'relaciones': self.relaciones,
+            'tiempos': self.tiempos,
+            'empresas': self.empresas,
+            'api': self.api,
+            'huellas': self.huellas,
+            'huella': self.huella,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._indexar()
+
+    def vigencia(self):
+        """Segundos que le quedan a este catálogo antes de volver a leerlo"""
+        return settings.CATALOGO_CACHE_TIMEOUT - (time.time() - self.creado)
+
+    def item(self, item_id):
+        return self._items.get(_como_id(item_id))
+
+    def relacion(self, relacion_id):
+        return self._relaciones.get(_como_id(relacion_id))
+
+    def tiempo(self, tiempo_id):
+        return self._tiempos.get(_como_id(tiempo_id))
+
+    def empresa(self, empresa_id):
+        return self._empresas.get(_como_id(empresa_id))
+
+    def empresa_por_nombre(self, nombre):
+        return self._empresas_por_nombre.get(nombre)
+
+
+def _como_id(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _construir_catalogo(version):
+    from django.db.models import Prefetch
+    from .models import Categoria, Item, RelacionEmpresa, Tiempo, Empresa
+    from .serializers import CategoriaWithItemsSerializer, RelacionEmpresaSerializer, TiempoSerializer
+
+    categorias_qs = list(Categoria.objects.order_by('id').prefetch_related(
+        Prefetch('item_set', queryset=Item.objects.select_related('categoria').order_by('id'))
+    ))
+    relaciones_qs = list(RelacionEmpresa.objects.order_by('id'))
+    tiempos_qs = list(Tiempo.objects.order_by('id'))
+
+    categorias = [
+        CategoriaCatalogo(
+            id=categoria.id,
+            nombre=categoria.nombre,
+            items=tuple(
+                ItemCatalogo(item.id, item.enunciado, categoria.id, categoria.nombre)
+                for item in categoria.item_set.all()
+            )
+        )
+        for categoria in categorias_qs
+    ]
+
+    # Datos planos (sin referencias al serializer) para poder guardarlos en caché
+    api = json.loads(json.dumps({
+        'categorias': CategoriaWithItemsSerializer(categorias_qs, many=True).data,
+        'relacion_empresas': RelacionEmpresaSerializer(relaciones_qs, many=True).data,
+        'tiempos': TiempoSerializer(tiempos_qs, many=True).data,
+    }))
+
+    return Catalogo(
+        version=version,
+        categorias=categorias,
+        relaciones=[RelacionCatalogo(relacion.id, relacion.rol) for relacion in relaciones_qs],
+        tiempos=[TiempoCatalogo(tiempo.id, tiempo.intervalo) for tiempo in tiempos_qs],
+        empresas=[
+            EmpresaCatalogo(empresa.id, empresa.nombre, empresa.descripcion)
+            for empresa in Empresa.objects.order_by('id')
+        ],
+        api=api
+    )
+
+
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def obtener_catalogo():
+    """Catálogo de la versión vigente (memoria del proceso → caché → BD)"""
+    global _memo
+
+    version = get_cache_version(CATALOGO_CACHE)
+
+    def vigente(catalogo):
+        return catalogo is not None and catalogo.version == version and catalogo.vigencia() > 0
+
+    if vigente(_memo):
+        return _memo
+
+    with _memo_lock:
+        if vigente(_memo):
+            return _memo
+
+        key = f'appkarin:catalogo:v{version}'
+        catalogo = cache.get(key)
+        if not vigente(catalogo):
+            catalogo = _construir_catalogo(version)
+            cache.set(key, catalogo, settings.CATALOGO_CACHE_TIMEOUT)
+
+        _memo = catalogo
+        return catalogo
@@ -0,0 +1,116 @@
+# docx_templates.py - Registro de plantillas Word precompiladas por proceso
+from docxtpl import DocxTemplate
+from jinja2 import Template
+import hashlib
+import io
+import os
+import re
+import threading
+
+
+class _DocxPrecompilado(DocxTemplate):
+    """
+    DocxTemplate que usa las plantillas Jinja ya compiladas de PlantillaCompilada
+    en lugar de parchar y compilar el XML en cada render.
+    """
+
+    def __init__(self, plantilla):
+        super().__init__(io.BytesIO(plantilla.contenido))
+        self.plantilla = plantilla
+
+    def init_docx(self, reload=True):
+        if not self.docx or (self.is_rendered and reload):
+            # Cada render parte de una copia limpia del documento en memoria
+            self.template_file = io.BytesIO(self.plantilla.contenido)
+        super().init_docx(reload)
+
+    def _render_compilado(self, template, part, context):
+        self.current_rendering_part = part
+        dst_xml = template.render(context)
+        dst_xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", dst_xml)
+        dst_xml = (
+            dst_xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        return self.resolve_listing(dst_xml)
+
+    def build_xml(self, context, jinja_env=None):
+        if jinja_env:
+            return super().build_xml(context, jinja_env)
+        return self._render_compilado(self.plantilla.cuerpo, self.docx._part, context)
+
+    def build_headers_footers_xml(self, context, uri, jinja_env=None):
+        if jinja_env:
+            yield from super().build_headers_footers_xml(context, uri, jinja_env)
+            return
+        for relKey, part in self.get_headers_footers(uri):
+            template, encoding = self.plantilla.partes[relKey]
+            yield relKey, self._render_compilado(template, part, context).encode(encoding)
+
+
+class PlantillaCompilada:
+    """
+    Plantilla de informe cargada una sola vez: bytes del .docx y el XML del
+    cuerpo, encabezados y pies ya parchado y compilado con Jinja.
+    """
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.path = path
+        self.firma = (stat.st_mtime_ns, stat.st_size)
+
+        with open(path, 'rb') as f:
+            self.contenido = f.read()
+        self.hash = hashlib.sha256(self.contenido).hexdigest()
+
+        base = DocxTemplate(io.BytesIO(self.contenido))
+        base.init_docx()
+
+        self.cuerpo = self._compilar(base, base.get_xml())
+        self.partes = {}
+        for uri in (DocxTemplate.HEADER_URI, DocxTemplate.FOOTER_URI):
+            for relKey, part in base.get_headers_footers(uri):
+                xml = base.get_part_xml(part)
+                self.partes[relKey] = (self._compilar(base, xml), base.get_headers_footers_encoding(xml))
+
+    @staticmethod
+    def _compilar(base, xml):
+        # Mismo preprocesamiento que DocxTemplate.render_xml_part
+        xml = base.patch_xml(xml)
+        xml = re.sub(r"<w:p([ >])", r"\n<w:p\1", xml)
+        return Template(xml)
+
+    def render(self, context):
+        """Renderiza el contexto sobre una copia del documento y retorna el .docx en bytes"""
+        doc = _DocxPrecompilado(self)
+        doc.render(context)
+
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        return buffer.getvalue()
+
+
+_plantillas = {}
+_plantillas_lock = threading.Lock()
+
+
+def obtener_plantilla(path):
+    """
+    Plantilla compilada para la ruta indicada.
+    Se vuelve a cargar si cambió el mtime o el tamaño del archivo.
+    """
+    stat = os.stat(path)
+    firma = (stat.st_mtime_ns, stat.st_size)
+
+    plantilla = _plantillas.get(path)
+    if plantilla and plantilla.firma == firma:
+        return plantilla
+
+    with _plantillas_lock:
+        plantilla = _plantillas.get(path)
+        if not plantilla or plantilla.firma != firma:
+            plantilla = PlantillaCompilada(path)
+            _plantillas[path] = plantilla
+    return plantilla
@@ -3,12 +3,39 @@ import os
 from dotenv import load_dotenv
 import sys
 import json
+import time
+import threading
 import requests
 from azure.identity import ClientSecretCredential
 
 load_dotenv()
+
+# Token de Graph compartido por el proceso; se renueva poco antes de expirar
+_token_cache = {}
+_token_lock = threading.Lock()
+TOKEN_MARGEN_SEGUNDOS = 300
 # Correo desde el cual ENVIAR (debe tener buzón de Exchange)
 # ==========================
+
+
+class EmailEnvioError(Exception):
+    """Graph no aceptó el envío (sendMail responde 202 cuando lo acepta)"""
+
+
+def verificar_envio(resp):
+    """
+    Levanta EmailEnvioError si la respuesta de sendMail no es 202.
+    Sirve para respuestas de requests (send_mail) y de httpx (send_mail_async).
+    """
+    if resp.status_code == 202:
+        return
+    try:
+        err = resp.json()
+    except Exception:
+        err = {"raw": resp.text}
+    raise EmailEnvioError(f"Graph respondió HTTP {resp.status_code}: {json.dumps(err)}")
+
+
 class EmailSDK:
 
     def __init__(self, to, subject, message, sender, cc=None):
@@ -44,9 +71,15 @@ class EmailSDK:
         self.token = self.get_token()
 
     def get_token(self):
-        cred = ClientSecretCredential(tenant_id=self.tenant_id, client_id=self.client_id, client_secret=self.client_secret)
-        token = cred.get_token("https://graph.microsoft.com/.default").token
-        return token
+        clave = (self.tenant_id, self.client_id)
+        with _token_lock:
+            cacheado = _token_cache.get(clave)
+            if cacheado and cacheado.expires_on - TOKEN_MARGEN_SEGUNDOS > time.time():
+                return cacheado.token
+            cred = ClientSecretCredential(tenant_id=self.tenant_id, client_id=self.client_id, client_secret=self.client_secret)
+            access_token = cred.get_token("https://graph.microsoft.com/.default")
+            _token_cache[clave] = access_token
+            return access_token.token
 
     def graph_request(self, method, url, **kwargs):
         headers = kwargs.pop("headers", {})
@@ -73,9 +106,7 @@ class EmailSDK:
             err = {"raw": r.text}
         return False, {"status": r.status_code, "error": err}
 
-    def send_mail(self, save_to_sent=True):
-        url = f"{self.graph}/users/{self.sender}/sendMail"
-        
+    def _payload_mail(self, save_to_sent=True):
         # Construir lista de destinatarios TO
         to_recipients = [{"emailAddress": {"address": email}} for email in self.to]
         
@@ -94,9 +125,27 @@ class EmailSDK:
             cc_recipients = [{"emailAddress": {"address": email}} for email in self.cc]
             payload["message"]["ccRecipients"] = cc_recipients
         
+        return payload
+
+    def send_mail(self, save_to_sent=True):
+        url = f"{self.graph}/users/{self.sender}/sendMail"
+        payload = self._payload_mail(save_to_sent)
         r = self.graph_request("POST", url, data=json.dumps(payload))
         return r
 
+    async def send_mail_async(self, client, save_to_sent=True):
+        """
+        Igual que send_mail pero con un httpx.AsyncClient: no bloquea el event loop
+        mientras Graph responde.
+        """
+        url = f"{self.graph}/users/{self.sender}/sendMail"
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        return await client.post(url, headers=headers, content=json.dumps(self._payload_mail(save_to_sent)), timeout=30)
+
 def main():
     # Ejemplo de uso con CC
     email = EmailSDK(
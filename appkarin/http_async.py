@@ -0,0 +1,31 @@
+# http_async.py - Cliente HTTP asíncrono compartido por las vistas ASGI
+from django.conf import settings
+import asyncio
+import httpx
+import weakref
+
+
+# Un cliente por event loop: httpx.AsyncClient no puede usarse desde otro loop
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client():
+    """
+    httpx.AsyncClient del event loop actual, creado una sola vez.
+
+    Comparte el pool de conexiones (keep-alive) hacia Spaces y Graph entre
+    requests, igual que get_s3_client() para el código síncrono.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.S3_READ_TIMEOUT, connect=settings.S3_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                max_keepalive_connections=settings.S3_MAX_POOL_CONNECTIONS
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=settings.S3_MAX_RETRIES),
+        )
+        _clients[loop] = client
+    return client
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from appkarin.s3_client import get_s3_client
+from appkarin.upload_staging import limpiar_staging, limpiar_staging_s3
+import time
+
+
+class Command(BaseCommand):
+    help = "Elimina adjuntos temporales del wizard (disco local y prefijo de staging en S3) que superan UPLOAD_STAGING_MAX_AGE_HOURS"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Ejecuta una sola limpieza y termina'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=300.0,
+            help='Segundos entre limpiezas (default: 300)'
+        )
+        parser.add_argument(
+            '--max-buckets',
+            type=int,
+            default=24,
+            help='Máximo de directorios horarios eliminados por pasada (default: 24)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("🧹 Janitor de staging iniciado")
+
+        while True:
+            eliminados = limpiar_staging(max_buckets=options['max_buckets'])
+            if eliminados:
+                self.stdout.write(f"🗑️ {eliminados} directorios de staging eliminados")
+
+            try:
+                eliminados_s3 = limpiar_staging_s3(get_s3_client(), max_buckets=options['max_buckets'])
+            except Exception as e:
+                # Falla transitoria de S3: se reintenta en la próxima pasada
+                self.stderr.write(f"⚠️ No se pudo limpiar el staging de S3: {e}")
+                eliminados_s3 = 0
+            if eliminados_s3:
+                self.stdout.write(f"🗑️ {eliminados_s3} prefijos horarios de staging eliminados en S3")
+
+            # Con backlog se sigue de inmediato, sin esperar el intervalo
+            if max(eliminados, eliminados_s3) >= options['max_buckets']:
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, close_old_connections, DatabaseError, InterfaceError
+from appkarin.service_export_jobs import (
+    tomar_siguiente_trabajo, procesar_trabajo, limpiar_exportaciones_antiguas,
+    reclamar_trabajos_colgados
+)
+import time
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de exportaciones de denuncias (worker en segundo plano)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Procesa los trabajos pendientes y termina'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando la cola está vacía (default: 2)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("🚀 Worker de exportaciones iniciado")
+        ultima_limpieza = 0
+        ultimo_reclamo = 0
+
+        while True:
+            # Proceso de larga vida: descarta conexiones caídas o vencidas
+            # (CONN_MAX_AGE, timeout de inactividad o failover de la BD)
+            close_old_connections()
+
+            try:
+                # Limpieza de archivos vencidos como máximo una vez por hora
+                if time.time() - ultima_limpieza > 3600:
+                    eliminados = limpiar_exportaciones_antiguas()
+                    if eliminados:
+                        self.stdout.write(f"🗑️ {eliminados} exportaciones vencidas eliminadas")
+                    ultima_limpieza = time.time()
+
+                # Trabajos de workers caídos, como máximo una vez por minuto
+                if time.time() - ultimo_reclamo > 60:
+                    reclamados = reclamar_trabajos_colgados()
+                    if reclamados:
+                        self.stdout.write(f"⚠️ {reclamados} exportaciones interrumpidas marcadas con error")
+                    ultimo_reclamo = time.time()
+
+                job = tomar_siguiente_trabajo()
+                if job:
+                    procesar_trabajo(job)
+            except (DatabaseError, InterfaceError) as e:
+                # Conexión perdida: se cierra y se reintenta en la próxima pasada
+                # (un trabajo que quedó en PROCESANDO lo reclama reclamar_trabajos_colgados)
+                if options['once']:
+                    raise
+                self.stderr.write(f"⚠️ Error de base de datos en el worker: {e}")
+                connection.close()
+                time.sleep(options['intervalo'])
+                continue
+
+            if job:
+                close_old_connections()
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['intervalo'])
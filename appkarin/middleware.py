@@ -0,0 +1,44 @@
+# middleware.py - Middlewares propios de la aplicación
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+import time
+
+
+# Marca de la última renovación de la sesión (epoch)
+CLAVE_RENOVACION = '_renovada'
+
+
+def _debe_renovar(renovada):
+    return renovada is None or time.time() - renovada >= settings.SESSION_RENEW_INTERVAL
+
+
+@sync_and_async_middleware
+def renovar_sesion_middleware(get_response):
+    """
+    Expiración deslizante sin escribir la sesión en cada request.
+
+    Reemplaza SESSION_SAVE_EVERY_REQUEST: la sesión se guarda cuando cambia o,
+    como mucho, una vez cada SESSION_RENEW_INTERVAL segundos para extender
+    SESSION_COOKIE_AGE. Sólo toca sesiones ya creadas: un visitante sin
+    sesión no genera escrituras. Debe ir después de SessionMiddleware.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = await get_response(request)
+            session = request.session
+            if session.session_key and not session.modified:
+                # Una cookie de sesión expirada deja session_key en None al cargar
+                if _debe_renovar(await session.aget(CLAVE_RENOVACION)) and session.session_key:
+                    await session.aset(CLAVE_RENOVACION, int(time.time()))
+            return response
+    else:
+        def middleware(request):
+            response = get_response(request)
+            session = request.session
+            if session.session_key and not session.modified:
+                if _debe_renovar(session.get(CLAVE_RENOVACION)) and session.session_key:
+                    session[CLAVE_RENOVACION] = int(time.time())
+            return response
+
+    return middleware
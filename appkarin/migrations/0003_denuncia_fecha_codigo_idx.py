@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appkarin', '0002_archivo_archivo_archivo_fecha_subida_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='denuncia',
+            name='estado_actual',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_REVISION', 'En Revisión'), ('RESUELTO', 'Resuelto'), ('ENVIADO_A_DT', 'Enviado a DT')], default='PENDIENTE', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='denuncia',
+            index=models.Index(fields=['fecha', 'codigo'], name='denuncia_fecha_codigo_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def poblar_contadores(apps, schema_editor):
+    """Calcula los contadores iniciales a partir de Archivo y Foro"""
+    Denuncia = apps.get_model('appkarin', 'Denuncia')
+    Archivo = apps.get_model('appkarin', 'Archivo')
+    Foro = apps.get_model('appkarin', 'Foro')
+    ForoContador = apps.get_model('appkarin', 'ForoContador')
+
+    archivos = Archivo.objects.filter(
+        denuncia_id=OuterRef('codigo')
+    ).order_by().values('denuncia_id').annotate(c=Count('id')).values('c')
+    Denuncia.objects.update(num_archivos=Coalesce(Subquery(archivos), 0))
+
+    totales = Foro.objects.filter(admin__isnull=False).order_by().values(
+        'denuncia_id', 'admin_id'
+    ).annotate(
+        leidos=Count('id', filter=Q(leido=True)),
+        no_leidos=Count('id', filter=Q(leido=False)),
+        total=Count('id')
+    )
+    ForoContador.objects.bulk_create(
+        [ForoContador(**fila) for fila in totales.iterator()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appkarin', '0003_denuncia_fecha_codigo_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='denuncia',
+            name='num_archivos',
+            field=models.PositiveIntegerField(default=0, help_text='Cantidad de archivos adjuntos'),
+        ),
+        migrations.CreateModel(
+            name='ForoContador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('leidos', models.PositiveIntegerField(default=0)),
+                ('no_leidos', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('admin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('denuncia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contadores_foro', to='appkarin.denuncia')),
+            ],
+            options={
+                'verbose_name': 'Contador de foro',
+                'verbose_name_plural': 'Contadores de foro',
+                'constraints': [models.UniqueConstraint(fields=('denuncia', 'admin'), name='foro_contador_denuncia_admin_uniq')],
+            },
+        ),
+        migrations.RunPython(poblar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:45
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def crear_configuracion_busqueda(apps, schema_editor):
+    """
+    Crea la configuración de texto 'spanish_unaccent' (stemming en español
+    + eliminación de tildes). Si la extensión unaccent no está disponible
+    se crea solo con stemming en español.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_ts_config WHERE cfgname = 'spanish_unaccent'"
+        )
+        if cursor.fetchone():
+            return
+
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'unaccent'"
+        )
+        tiene_unaccent = cursor.fetchone() is not None
+
+        cursor.execute("CREATE TEXT SEARCH CONFIGURATION spanish_unaccent (COPY = spanish)")
+        if tiene_unaccent:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+            cursor.execute(
+                "ALTER TEXT SEARCH CONFIGURATION spanish_unaccent "
+                "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem"
+            )
+        else:
+            print("⚠️ Extensión unaccent no disponible: búsqueda sin normalizar tildes")
+
+
+def eliminar_configuracion_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS spanish_unaccent")
+
+
+def poblar_indice_busqueda(apps, schema_editor):
+    """Calcula el documento y el vector de búsqueda de las denuncias existentes"""
+    from django.contrib.postgres.search import SearchVector
+
+    Denuncia = apps.get_model('appkarin', 'Denuncia')
+
+    pendientes = []
+    for denuncia in Denuncia.objects.select_related(
+        'usuario', 'item', 'item__categoria'
+    ).iterator(chunk_size=1000):
+        partes = [
+            denuncia.usuario.nombre,
+            denuncia.usuario.apellidos,
+            denuncia.item.enunciado,
+            denuncia.item.categoria.nombre,
+        ]
+        denuncia.documento_busqueda = ' '.join(p for p in partes if p)
+        pendientes.append(denuncia)
+        if len(pendientes) >= 1000:
+            Denuncia.objects.bulk_update(pendientes, ['documento_busqueda'])
+            pendientes = []
+    if pendientes:
+        Denuncia.objects.bulk_update(pendientes, ['documento_busqueda'])
+
+    if schema_editor.connection.vendor == 'postgresql':
+        Denuncia.objects.update(search_vector=(
+            SearchVector('codigo', weight='A', config='spanish_unaccent') +
+            SearchVector('documento_busqueda', weight='B', config='spanish_unaccent') +
+            SearchVector('descripcion', weight='C', config='spanish_unaccent')
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appkarin', '0004_contadores_denuncia'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_configuracion_busqueda, eliminar_configuracion_busqueda),
+        migrations.AddField(
+            model_name='denuncia',
+            name='documento_busqueda',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Usuario, item y categoría desnormalizados para la búsqueda'),
+        ),
+        migrations.AddField(
+            model_name='denuncia',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='denuncia',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='denuncia_search_idx'),
+        ),
+        migrations.RunPython(poblar_indice_busqueda, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appkarin', '0006_export_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivo',
+            name='hash_contenido',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 del contenido del archivo', max_length=64, null=True),
+        ),
+    ]
@@ -1,12 +1,17 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.conf import settings
 from .utils import (
                     validate_admin_password, validate_rut,generate_user_id, 
                     generate_denuncia_code,validate_rut,
                     )
 import re
+import uuid
 
 
 
@@ -221,10 +226,30 @@ class Denuncia(models.Model):
         ]
     )
     
+    # Contadores desnormalizados (mantenidos por appkarin.signals)
+    num_archivos = models.PositiveIntegerField(
+        default=0,
+        help_text="Cantidad de archivos adjuntos"
+    )
+    
+    # Búsqueda de texto completo (mantenida por appkarin.search)
+    documento_busqueda = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        help_text="Usuario, item y categoría desnormalizados para la búsqueda"
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         verbose_name = "Denuncia"
         verbose_name_plural = "Denuncias"
         ordering = ['-fecha']
+        indexes = [
+            # Paginación keyset del DataTable por (fecha, codigo)
+            models.Index(fields=['fecha', 'codigo'], name='denuncia_fecha_codigo_idx'),
+            GinIndex(fields=['search_vector'], name='denuncia_search_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         # Generar código único si no existe
@@ -274,52 +299,55 @@ class Archivo(models.Model):
     
     fecha_subida = models.DateTimeField(auto_now_add=True, null=True)  
     
+    # sha256 del contenido: archivos idénticos comparten un mismo objeto en S3
+    hash_contenido = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        db_index=True,
+        help_text="SHA-256 del contenido del archivo"
+    )
+    
     class Meta:
         verbose_name = "Archivo"
         verbose_name_plural = "Archivos"
     
-    def save(self, *args, **kwargs):
+    def _preparar_campos(self):
         if not self.Peso and self.archivo:
             try:
                 self.Peso = self.archivo.size
             except (FileNotFoundError, OSError, AttributeError):
                 pass
         
-        # Guardar primero
-        super().save(*args, **kwargs)
-        
-        if self.archivo:
+        # URL pública calculada localmente por el storage (sin llamadas a S3)
+        if self.archivo and not self.url:
             try:
-            
-                import boto3
-                from django.conf import settings
-                from botocore.config import Config
-                
-                s3_client = boto3.client(
-                    's3',
-                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                    config=Config(signature_version='s3v4')
-                )
-                
-                s3_client.put_object_acl(
-                    Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                    Key=self.archivo.name,
-                    ACL='public-read'
-                )
-                
-                
+                self.url = self.archivo.url
             except Exception as e:
-                print(f"⚠️ No se pudo establecer ACL público: {e}")
-            
-            # Actualizar URL si está vacía
-            if not self.url:
-                try:
-                    self.url = self.archivo.url
-                    super().save(update_fields=['url'])
-                except Exception as e:
-                    print(f"⚠️ No se pudo obtener URL del archivo: {e}")
+                print(f"⚠️ No se pudo obtener URL del archivo: {e}")
+    
+    def save(self, *args, **kwargs):
+        # El objeto ya quedó subido (privado) en S3: basta con una sola escritura
+        self._preparar_campos()
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def crear_lote(cls, archivos):
+        """
+        Inserta varios Archivo con un solo bulk_create.
+        bulk_create no dispara señales: se recalcula num_archivos de cada denuncia.
+        """
+        from .signals import recalcular_num_archivos
+        
+        for archivo in archivos:
+            archivo._preparar_campos()
+        
+        creados = cls.objects.bulk_create(archivos)
+        
+        for denuncia_id in {archivo.denuncia_id for archivo in creados}:
+            recalcular_num_archivos(denuncia_id)
+        
+        return creados
     
     def get_url(self):
         if self.archivo:
@@ -386,6 +414,32 @@ class Foro(models.Model):
         verbose_name_plural = "Foros"
 
 
+class ForoContador(models.Model):
+    """
+    Contadores de mensajes del foro por (denuncia, admin).
+    Se recalculan desde appkarin.signals al crear, editar o eliminar un Foro.
+    """
+    denuncia = models.ForeignKey(
+        Denuncia,
+        on_delete=models.CASCADE,
+        related_name='contadores_foro'
+    )
+    admin = models.ForeignKey(AdminDenuncias, on_delete=models.CASCADE)
+    leidos = models.PositiveIntegerField(default=0)
+    no_leidos = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Contador de foro"
+        verbose_name_plural = "Contadores de foro"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['denuncia', 'admin'],
+                name='foro_contador_denuncia_admin_uniq'
+            ),
+        ]
+
+
 class DenunciaEstado(models.Model):
     
     estado = models.CharField(max_length=250)
@@ -401,4 +455,54 @@ class EstadosDenuncia(models.Model):
 
     class Meta:
         verbose_name = "Estado de denuncia"
-        verbose_name_plural = "Estados de denuncias"
\ No newline at end of file
+        verbose_name_plural = "Estados de denuncias"
+
+
+def exports_storage():
+    """Almacenamiento local (no publicado por nginx) de exportaciones generadas"""
+    return FileSystemStorage(location=settings.EXPORTS_ROOT)
+
+
+class ExportJob(models.Model):
+    """
+    Trabajo de exportación de denuncias procesado en segundo plano
+    (ver management command procesar_exportaciones)
+    """
+    ESTADOS = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('COMPLETADO', 'Completado'),
+        ('ERROR', 'Error'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(AdminDenuncias, on_delete=models.CASCADE)
+    formato = models.CharField(max_length=10, default='xlsx')
+    filtros = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Mismos datos que recibe el endpoint de exportación (search, user_info)"
+    )
+    huella = models.CharField(
+        max_length=64,
+        db_index=True,
+        help_text="Hash de (usuario, formato, filtros) para reutilizar exportaciones"
+    )
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='PENDIENTE')
+    archivo = models.FileField(storage=exports_storage, max_length=255, blank=True, null=True)
+    total_registros = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Exportación"
+        verbose_name_plural = "Exportaciones"
+        ordering = ['fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion'], name='export_job_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"Exportación {self.id} ({self.estado})"
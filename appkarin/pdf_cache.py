@@ -0,0 +1,117 @@
+# pdf_cache.py - Caché en disco de PDFs generados, con expulsión LRU por tamaño
+from django.conf import settings
+from pathlib import Path
+from .docx_templates import obtener_plantilla
+import hashlib
+import json
+import os
+import tempfile
+
+
+def template_hash(path):
+    """Hash sha256 de la plantilla (registro compilado, invalidado por mtime)"""
+    return obtener_plantilla(path).hash
+
+
+def pdf_cache_key(codigo, template_path, fecha_actualizacion, contexto):
+    """
+    Clave de versión del PDF de una denuncia.
+    
+    Además de (código, plantilla, fecha_actualizacion) incluye un hash del
+    contexto de renderizado: así cambios en usuario/ítem/categoría o la fecha
+    de descarga impresa en el informe también generan una versión nueva.
+    """
+    partes = [
+        codigo,
+        template_hash(template_path),
+        fecha_actualizacion.isoformat() if fecha_actualizacion else '',
+        json.dumps(contexto, sort_keys=True, default=str),
+    ]
+    return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()
+
+
+class PDFCache:
+    """
+    Caché de PDFs en un directorio local.
+    
+    Cada entrada es un archivo <clave>.pdf; los aciertos actualizan su mtime y,
+    al superar max_bytes, se eliminan primero las entradas usadas hace más tiempo.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.root / f'{key}.pdf'
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def contiene(self, key):
+        return self._path(key).exists()
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        # Escritura atómica: otros procesos nunca leen un PDF a medio escribir
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._evict()
+
+    def _evict(self):
+        entradas = []
+        total = 0
+        for path in self.root.glob('*.pdf'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entradas.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entradas.sort()
+        for _, size, path in entradas:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+_cache = None
+
+
+def get_pdf_cache():
+    """Caché compartida, o None si está deshabilitada (PDF_CACHE_MAX_MB = 0)"""
+    global _cache
+    if settings.PDF_CACHE_MAX_MB <= 0:
+        return None
+    if _cache is None:
+        _cache = PDFCache(settings.PDF_CACHE_ROOT, settings.PDF_CACHE_MAX_MB * 1024 * 1024)
+    return _cache
@@ -0,0 +1,245 @@
+# pdf_converter.py - Pool persistente de conversión DOCX -> PDF con LibreOffice
+from django.conf import settings
+from pathlib import Path
+import atexit
+import os
+import queue
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import xmlrpc.client
+
+
+class PDFConversionError(Exception):
+    """Error al convertir un documento a PDF"""
+
+
+class PDFConversionBusy(PDFConversionError):
+    """La cola de conversión está llena"""
+
+
+class _TransporteConTimeout(xmlrpc.client.Transport):
+    """Transporte XML-RPC con timeout de socket: un unoserver colgado no bloquea el puesto"""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        conexion = super().make_connection(host)
+        conexion.timeout = self.timeout
+        return conexion
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class _Slot:
+    """
+    Puesto de conversión: un servidor unoserver remoto, o uno local (proceso
+    LibreOffice persistente con perfil propio) que el puesto arranca y mantiene.
+    """
+
+    def __init__(self, index, host=None, port=None, profile_dir=None):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.profile_dir = profile_dir
+        self.proceso = None
+
+    @property
+    def local(self):
+        return self.profile_dir is not None
+
+    def iniciar(self, timeout):
+        """Arranca el unoserver local si no está corriendo (sólo la primera vez o tras una falla)"""
+        if self.proceso is not None and self.proceso.poll() is None:
+            return
+
+        self.host = '127.0.0.1'
+        self.port = str(_puerto_libre())
+
+        # Script de consola de unoserver, instalado junto al Python que trae
+        # el módulo uno de LibreOffice (ver Dockerfile)
+        self.proceso = subprocess.Popen([
+            settings.PDF_UNOSERVER_COMMAND,
+            '--interface', self.host,
+            '--port', self.port,
+            '--uno-port', str(_puerto_libre()),
+            '--user-installation', self.profile_dir.as_uri(),
+            '--conversion-timeout', str(timeout),
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        limite = time.monotonic() + settings.PDF_UNOSERVER_START_TIMEOUT
+        while time.monotonic() < limite:
+            if self.proceso.poll() is not None:
+                break
+            try:
+                self.proxy(timeout=2).info()
+                print(f"✅ unoserver local iniciado (puesto {self.index}, puerto {self.port})")
+                return
+            except (OSError, xmlrpc.client.Error):
+                time.sleep(0.5)
+
+        self.detener()
+        raise PDFConversionError('No se pudo iniciar LibreOffice (unoserver local)')
+
+    def detener(self):
+        if self.proceso is not None:
+            self.proceso.terminate()
+            try:
+                self.proceso.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proceso.kill()
+            self.proceso = None
+
+    def proxy(self, timeout):
+        return xmlrpc.client.ServerProxy(
+            f'http://{self.host}:{self.port}',
+            transport=_TransporteConTimeout(timeout),
+            allow_none=True
+        )
+
+
+class _Reserva:
+    """Puesto reservado: convierte en él hasta liberarlo (liberar es idempotente)"""
+
+    def __init__(self, pool, slot):
+        self._pool = pool
+        self._slot = slot
+
+    def convert(self, docx_bytes):
+        return self._pool._convert_in_slot(self._slot, docx_bytes)
+
+    def liberar(self):
+        slot, self._slot = self._slot, None
+        if slot is not None:
+            self._pool._slots.put(slot)
+
+
+class PDFConversionPool:
+    """
+    Pool acotado de conversiones a PDF sobre procesos LibreOffice persistentes.
+
+    - Con PDF_UNOSERVER_HOSTS los `size` puestos se reparten entre esos
+      servidores unoserver (varios puestos por servidor si size > servidores).
+    - Sin servidores configurados cada puesto arranca su propio unoserver local
+      (perfil -env:UserInstallation propio) al primer uso y lo mantiene vivo;
+      si el proceso muere o se cuelga se reinicia en la conversión siguiente.
+
+    Cada llamada XML-RPC tiene timeout de socket, por lo que un servidor
+    colgado libera el puesto. Las solicitudes que exceden max_queue en espera
+    se rechazan con PDFConversionBusy.
+    """
+
+    def __init__(self, size=2, max_queue=10, timeout=60, hosts=None, profiles_root=None):
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._slots = queue.Queue()
+        self._todos = []
+
+        profiles_root = Path(profiles_root or os.path.join(tempfile.gettempdir(), 'lo_profiles'))
+
+        for i in range(size):
+            if hosts:
+                server, _, port = hosts[i % len(hosts)].partition(':')
+                slot = _Slot(i, server, port or '2003')
+            else:
+                # Un perfil por proceso y puesto: sin colisiones entre workers de gunicorn
+                profile_dir = profiles_root / f'{os.getpid()}_{i}'
+                profile_dir.mkdir(parents=True, exist_ok=True)
+                slot = _Slot(i, profile_dir=profile_dir)
+            self._todos.append(slot)
+            self._slots.put(slot)
+
+        atexit.register(self.cerrar)
+
+    def convert(self, docx_bytes):
+        """
+        Convierte un documento DOCX (bytes) a PDF (bytes)
+
+        Raises:
+            PDFConversionBusy: Si la cola está llena o no hubo puesto libre a tiempo
+            PDFConversionError: Si la conversión falla o excede el timeout
+        """
+        slot = self._acquire_slot()
+        try:
+            return self._convert_in_slot(slot, docx_bytes)
+        finally:
+            self._slots.put(slot)
+
+    def reservar(self):
+        """
+        Reserva un puesto para varias conversiones seguidas (descargas por lote).
+        Se pide antes de empezar a responder, para que un pool ocupado sea un
+        503 y no una descarga cortada.
+
+        Raises:
+            PDFConversionBusy: Si la cola está llena o no hubo puesto libre a tiempo
+        """
+        return _Reserva(self, self._acquire_slot())
+
+    def cerrar(self):
+        """Detiene los unoserver locales (al terminar el proceso)"""
+        for slot in self._todos:
+            if slot.local:
+                slot.detener()
+
+    def _acquire_slot(self):
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                raise PDFConversionBusy('Servicio de PDF ocupado, intente nuevamente')
+            self._waiting += 1
+
+        try:
+            return self._slots.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PDFConversionBusy('Tiempo de espera agotado en la cola de PDF')
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def _convert_in_slot(self, slot, docx_bytes):
+        if slot.local:
+            slot.iniciar(self.timeout)
+
+        try:
+            # Misma llamada que unoserver.client.UnoClient.convert (API 3), con timeout
+            resultado = slot.proxy(self.timeout).convert(
+                None, docx_bytes, None, 'pdf', None, [], True, None, None
+            )
+            return resultado.data
+        except Exception as e:
+            if slot.local:
+                # LibreOffice pudo quedar colgado o caído: se reinicia en el próximo uso
+                slot.detener()
+            if isinstance(e, socket.timeout):
+                raise PDFConversionError(f'La conversión a PDF excedió {self.timeout}s')
+            raise PDFConversionError(f'Error en unoserver {slot.host}:{slot.port}: {e}')
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pdf_pool():
+    """Pool compartido por proceso, creado al primer uso"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PDFConversionPool(
+                    size=settings.PDF_POOL_SIZE,
+                    max_queue=settings.PDF_QUEUE_MAX,
+                    timeout=settings.PDF_CONVERSION_TIMEOUT,
+                    hosts=settings.PDF_UNOSERVER_HOSTS,
+                    profiles_root=settings.PDF_PROFILES_ROOT,
+                )
+    return _pool
@@ -0,0 +1,41 @@
+# s3_client.py - Cliente S3 compartido por toda la aplicación
+from botocore.config import Config
+from django.conf import settings
+import boto3
+import threading
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Cliente boto3 de S3 (DigitalOcean Spaces) creado una sola vez por proceso.
+    
+    Los clientes boto3 son thread-safe: se comparte el pool de conexiones
+    (keep-alive) y los modelos de servicio ya cargados entre requests e hilos.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.session.Session().client(
+                    's3',
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME,
+                    config=Config(
+                        signature_version='s3v4',
+                        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                        tcp_keepalive=True,
+                        connect_timeout=settings.S3_CONNECT_TIMEOUT,
+                        read_timeout=settings.S3_READ_TIMEOUT,
+                        retries={
+                            'max_attempts': settings.S3_MAX_RETRIES,
+                            'mode': 'standard'
+                        }
+                    )
+                )
+    return _client
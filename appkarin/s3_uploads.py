@@ -0,0 +1,314 @@
+# s3_uploads.py - Subidas a S3 en paralelo con transferencias administradas (multipart)
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db.models import Q
+import asyncio
+import hashlib
+import os
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def transfer_config():
+    """Configuración multipart: tamaño de parte y concurrencia por archivo"""
+    return TransferConfig(
+        multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+        max_concurrency=settings.S3_MULTIPART_CONCURRENCY,
+        use_threads=True,
+    )
+
+
+# Objetos direccionados por contenido: objetos/<sha256>
+PREFIJO_OBJETOS = 'objetos/'
+
+
+def clave_contenido(sha256):
+    """
+    Key de un contenido en el bucket. Un mismo archivo adjuntado a varias
+    denuncias se guarda una sola vez. Los objetos son privados (el bucket
+    no los publica): se entregan sólo por la descarga autorizada, que toma
+    el nombre y el tipo del Archivo.
+    """
+    return f"{PREFIJO_OBJETOS}{sha256}"
+
+
+def hash_subida(subida):
+    """
+    sha256 de un archivo local o fileobj. Si el archivo viene del upload
+    handler (HashTemporaryFileUploadHandler), el hash ya se calculó al recibirlo.
+    """
+    fileobj = subida.get('fileobj')
+    if getattr(fileobj, 'sha256', None):
+        return fileobj.sha256
+
+    digest = hashlib.sha256()
+    if 'path' in subida:
+        with open(subida['path'], 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    else:
+        fileobj.seek(0)
+        for chunk in iter(lambda: fileobj.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def asignar_claves(subidas):
+    """
+    Asigna 'key' y 'reutilizado' a subidas que ya tienen 'sha256'.
+    
+    Si algún Archivo (de cualquier denuncia) ya tiene ese contenido se
+    reutiliza su objeto; si no, la key es clave_contenido(sha256). Un
+    contenido repetido en el lote se sube una vez.
+    
+    Returns:
+        list: Una subida por cada contenido que falta subir
+    """
+    from .models import Archivo
+
+    existentes = dict(
+        Archivo.objects.filter(
+            hash_contenido__in={subida['sha256'] for subida in subidas}
+        ).exclude(archivo='').exclude(archivo__isnull=True).values_list('hash_contenido', 'archivo')
+    )
+
+    por_subir = {}
+    for subida in subidas:
+        sha256 = subida['sha256']
+        subida['reutilizado'] = sha256 in existentes
+        if subida['reutilizado']:
+            subida['key'] = existentes[sha256]
+        elif sha256 in por_subir:
+            subida['key'] = por_subir[sha256]['key']
+        else:
+            subida['key'] = clave_contenido(sha256)
+            por_subir[sha256] = subida
+    return list(por_subir.values())
+
+
+def eliminar_sin_referencias(s3_client, keys):
+    """
+    Elimina de S3 los objetos que ya no referencia ningún Archivo. Un objeto
+    de objetos/<sha256> sigue en uso mientras algún Archivo tenga ese hash,
+    aunque sea de otra denuncia.
+    """
+    from .models import Archivo
+
+    keys = set(keys)
+    hashes = {key[len(PREFIJO_OBJETOS):] for key in keys if key.startswith(PREFIJO_OBJETOS)}
+    referencias = Archivo.objects.filter(
+        Q(archivo__in=keys) | Q(hash_contenido__in=hashes)
+    ).values_list('archivo', 'hash_contenido')
+
+    en_uso = set()
+    for key, sha256 in referencias:
+        en_uso.add(key)
+        if sha256:
+            en_uso.add(clave_contenido(sha256))
+
+    for key in keys - en_uso:
+        try:
+            s3_client.delete_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+        except Exception as e:
+            print(f"⚠️ No se pudo eliminar {key} de S3: {e}")
+
+
+def mover_desde_staging(s3_client, staging_key, content_type):
+    """
+    Lleva un adjunto subido directo al staging del bucket a su key por
+    contenido.
+    
+    El sha256 se calcula leyendo el objeto de staging por partes: el hash
+    declarado por el navegador no se usa, porque un contenido falso bajo el
+    hash de otro documento reemplazaría ese documento en otras denuncias.
+    Si el contenido ya existe no se copia; el objeto de staging se borra
+    después.
+    
+    Returns:
+        dict: 'key', 'sha256' y 'reutilizado'
+    """
+    bucket = settings.AWS_STORAGE_BUCKET_NAME
+    body = s3_client.get_object(Bucket=bucket, Key=staging_key)['Body']
+    digest = hashlib.sha256()
+    try:
+        for chunk in body.iter_chunks(chunk_size=HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    finally:
+        body.close()
+
+    subida = {'sha256': digest.hexdigest()}
+    if asignar_claves([subida]):
+        s3_client.copy_object(
+            Bucket=bucket,
+            Key=subida['key'],
+            CopySource={'Bucket': bucket, 'Key': staging_key},
+            ContentType=content_type,
+            MetadataDirective='REPLACE'
+        )
+    return subida
+
+
+def subir_archivos(s3_client, subidas):
+    """
+    Sube varios archivos en paralelo desde un pool de hilos.
+    
+    Cada subida recibe 'sha256' (si no venía calculado) y 'key': la del
+    objeto que ya guarda ese contenido (no se vuelve a subir) o
+    clave_contenido(sha256). 'reutilizado' indica si se omitió la subida.
+    
+    Cada archivo se transmite por partes (upload_fileobj / upload_file), por lo
+    que la memoria usada es del orden del tamaño de parte y no del archivo.
+    
+    Args:
+        s3_client: Cliente boto3 de S3 (thread-safe)
+        subidas: Lista de dicts con 'nombre', 'content_type' y 'fileobj' o 'path'
+    
+    Returns:
+        list: Excepción o None por cada subida, en el mismo orden recibido
+    """
+    if not subidas:
+        return []
+
+    config = transfer_config()
+    max_workers = min(settings.S3_UPLOAD_PARALLEL_FILES, len(subidas))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='s3-upload') as executor:
+        sin_hash = [subida for subida in subidas if not subida.get('sha256')]
+        for subida, sha256 in zip(sin_hash, executor.map(hash_subida, sin_hash)):
+            subida['sha256'] = sha256
+
+        unicos = asignar_claves(subidas)
+
+        def subir(subida):
+            extra_args = {'ContentType': subida['content_type']}
+            try:
+                if 'path' in subida:
+                    s3_client.upload_file(
+                        subida['path'], settings.AWS_STORAGE_BUCKET_NAME, subida['key'],
+                        ExtraArgs=extra_args, Config=config
+                    )
+                else:
+                    fileobj = subida['fileobj']
+                    fileobj.seek(0)
+                    s3_client.upload_fileobj(
+                        fileobj, settings.AWS_STORAGE_BUCKET_NAME, subida['key'],
+                        ExtraArgs=extra_args, Config=config
+                    )
+                return None
+            except Exception as e:
+                return e
+
+        errores = dict(zip(
+            (subida['sha256'] for subida in unicos),
+            executor.map(subir, unicos)
+        ))
+
+    return [
+        None if subida['reutilizado'] else errores[subida['sha256']]
+        for subida in subidas
+    ]
+
+
+def _tamano_subida(subida):
+    if 'path' in subida:
+        return os.path.getsize(subida['path'])
+    fileobj = subida['fileobj']
+    if getattr(fileobj, 'size', None) is not None:
+        return fileobj.size
+    fileobj.seek(0, os.SEEK_END)
+    tamano = fileobj.tell()
+    fileobj.seek(0)
+    return tamano
+
+
+async def _leer_por_partes(subida):
+    """Cuerpo del PUT: lee el archivo por partes en un hilo, sin bloquear el event loop"""
+    from asgiref.sync import sync_to_async
+
+    if 'path' in subida:
+        fileobj = await sync_to_async(open, thread_sensitive=False)(subida['path'], 'rb')
+    else:
+        fileobj = subida['fileobj']
+        fileobj.seek(0)
+    leer = sync_to_async(fileobj.read, thread_sensitive=False)
+    try:
+        while True:
+            chunk = await leer(settings.S3_MULTIPART_CHUNKSIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        if 'path' in subida:
+            fileobj.close()
+
+
+async def subir_archivos_async(subidas):
+    """
+    Versión asíncrona de subir_archivos para las vistas ASGI (mismo contrato).
+    
+    El hash y la consulta de deduplicación corren en hilos; cada contenido nuevo
+    se sube con un PUT firmado vía httpx leyendo el archivo por partes, sin
+    ocupar un hilo mientras se espera a Spaces. Hasta S3_UPLOAD_PARALLEL_FILES
+    subidas simultáneas.
+    
+    Returns:
+        list: Excepción o None por cada subida, en el mismo orden recibido
+    """
+    from asgiref.sync import sync_to_async
+    from .http_async import get_async_http_client
+    from .s3_client import get_s3_client
+
+    if not subidas:
+        return []
+
+    sin_hash = [subida for subida in subidas if not subida.get('sha256')]
+    hashes = await asyncio.gather(*(
+        sync_to_async(hash_subida, thread_sensitive=False)(subida) for subida in sin_hash
+    ))
+    for subida, sha256 in zip(sin_hash, hashes):
+        subida['sha256'] = sha256
+
+    unicos = await sync_to_async(asignar_claves)(subidas)
+
+    s3_client = get_s3_client()
+    client = get_async_http_client()
+    semaforo = asyncio.Semaphore(settings.S3_UPLOAD_PARALLEL_FILES)
+
+    async def subir(subida):
+        async with semaforo:
+            try:
+                # Firmar es local: no hay llamada de red en el cliente boto3
+                url = s3_client.generate_presigned_url(
+                    'put_object',
+                    Params={
+                        'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+                        'Key': subida['key'],
+                        'ContentType': subida['content_type']
+                    },
+                    ExpiresIn=settings.UPLOAD_SLOT_EXPIRES
+                )
+                # Content-Type va firmado: debe coincidir exactamente
+                response = await client.put(
+                    url,
+                    content=_leer_por_partes(subida),
+                    headers={
+                        'Content-Type': subida['content_type'],
+                        'Content-Length': str(_tamano_subida(subida))
+                    }
+                )
+                response.raise_for_status()
+                return None
+            except Exception as e:
+                return e
+
+    resultados = await asyncio.gather(*(subir(subida) for subida in unicos))
+    errores = dict(zip((subida['sha256'] for subida in unicos), resultados))
+
+    return [
+        None if subida['reutilizado'] else errores[subida['sha256']]
+        for subida in subidas
+    ]
@@ -0,0 +1,108 @@
+# search.py - Búsqueda de texto completo de denuncias (Postgres)
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+import re
+
+
+# Configuración de texto creada en la migración 0005 (español + unaccent)
+SEARCH_CONFIG = 'spanish_unaccent'
+
+
+def construir_documento(denuncia):
+    """
+    Documento desnormalizado con los campos relacionados que se buscan:
+    nombre y apellidos del usuario, enunciado del item y nombre de la categoría
+    """
+    partes = [
+        denuncia.usuario.nombre,
+        denuncia.usuario.apellidos,
+        denuncia.item.enunciado,
+        denuncia.item.categoria.nombre,
+    ]
+    return ' '.join(p for p in partes if p)
+
+
+def search_vector_expression(config=SEARCH_CONFIG):
+    """Vector ponderado: código (A), documento (B), descripción (C)"""
+    return (
+        SearchVector('codigo', weight='A', config=config) +
+        SearchVector('documento_busqueda', weight='B', config=config) +
+        SearchVector('descripcion', weight='C', config=config)
+    )
+
+
+def actualizar_indice_busqueda(queryset):
+    """
+    Recalcula documento_busqueda y search_vector para las denuncias del queryset.
+    Usa update() para no disparar señales de Denuncia.
+    """
+    from .models import Denuncia
+
+    denuncias = list(
+        queryset.select_related('usuario', 'item', 'item__categoria')
+        .only(
+            'codigo', 'documento_busqueda',
+            'usuario__nombre', 'usuario__apellidos',
+            'item__enunciado', 'item__categoria__nombre'
+        )
+    )
+    if not denuncias:
+        return
+
+    for denuncia in denuncias:
+        denuncia.documento_busqueda = construir_documento(denuncia)
+    Denuncia.objects.bulk_update(denuncias, ['documento_busqueda'], batch_size=500)
+
+    if connection.vendor == 'postgresql':
+        Denuncia.objects.filter(
+            codigo__in=[d.codigo for d in denuncias]
+        ).update(search_vector=search_vector_expression())
+
+
+def buscar_denuncias(queryset, termino, extra_q=None):
+    """
+    Filtra y anota 'rank' según el término de búsqueda.
+    
+    Args:
+        queryset: QuerySet de Denuncia
+        termino (str): Texto ingresado por el usuario
+        extra_q (Q): Condición adicional que también cuenta como coincidencia
+    
+    Returns:
+        QuerySet filtrado y anotado con 'rank' (sin ordenar)
+    """
+    termino = (termino or '').strip()
+    extra_q = extra_q or Q()
+
+    if connection.vendor != 'postgresql':
+        # Respaldo para bases de datos sin búsqueda de texto completo
+        return queryset.filter(
+            Q(codigo__icontains=termino) |
+            Q(usuario__nombre__icontains=termino) |
+            Q(usuario__apellidos__icontains=termino) |
+            Q(item__enunciado__icontains=termino) |
+            Q(item__categoria__nombre__icontains=termino) |
+            Q(descripcion__icontains=termino) |
+            extra_q
+        ).annotate(rank=Value(0.0, output_field=FloatField()))
+
+    # Cada palabra se busca como prefijo para resultados mientras se escribe
+    palabras = re.findall(r'\w+', termino)
+    if not palabras:
+        return queryset.filter(
+            Q(codigo__icontains=termino) | extra_q
+        ).annotate(rank=Value(0.0, output_field=FloatField()))
+
+    query = SearchQuery(
+        ' & '.join(f'{palabra}:*' for palabra in palabras),
+        config=SEARCH_CONFIG,
+        search_type='raw'
+    )
+
+    # El código también se busca como subcadena (parte de un código copiado)
+    return queryset.filter(
+        Q(search_vector=query) |
+        Q(codigo__icontains=termino) |
+        extra_q
+    ).annotate(rank=SearchRank(F('search_vector'), query))
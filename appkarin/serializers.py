@@ -4,6 +4,7 @@ from .models import (
     Archivo, Foro,DenunciaEstado, EstadosDenuncia,Empresa,
     validate_rut, validate_admin_password
 )
+from .catalogo import obtener_catalogo
 import re
 
 
@@ -223,27 +224,21 @@ class DenunciaCreateSerializer(serializers.Serializer):
         allow_blank=True
     )
     
-    def validate_denuncia_relacion(self, value):
-        """Validar que la relación empresa existe"""
-        try:
-            RelacionEmpresa.objects.get(id=value)
-        except RelacionEmpresa.DoesNotExist:
+    def validate_relacion_empresa_id(self, value):
+        """Validar que la relación empresa existe (catálogo en caché)"""
+        if not obtener_catalogo().relacion(value):
             raise serializers.ValidationError('Relación con empresa no válida')
         return value
     
-    def validate_denuncia_tiempo(self, value):
-        """Validar que el tiempo existe"""
-        try:
-            Tiempo.objects.get(id=value)
-        except Tiempo.DoesNotExist:
+    def validate_tiempo_id(self, value):
+        """Validar que el tiempo existe (catálogo en caché)"""
+        if not obtener_catalogo().tiempo(value):
             raise serializers.ValidationError('Tiempo de denuncia no válido')
         return value
     
     def validate_item_id(self, value):
-        """Validar que el item existe"""
-        try:
-            Item.objects.get(id=value)
-        except Item.DoesNotExist:
+        """Validar que el item existe (catálogo en caché)"""
+        if not obtener_catalogo().item(value):
             raise serializers.ValidationError('Tipo de denuncia no válido')
         return value
     
@@ -482,15 +477,14 @@ class ItemSelectionSerializer(serializers.Serializer):
     )
     
     def validate_denuncia_item(self, value):
-        """Validar que el item existe"""
-        try:
-            item = Item.objects.select_related('categoria').get(id=value)
-            # Guardar el item validado para uso posterior
-            self._validated_item = item
-            return value
-        except Item.DoesNotExist:
+        """Validar que el item existe (catálogo en caché)"""
+        item = obtener_catalogo().item(value)
+        if not item:
             raise serializers.ValidationError("Tipo de denuncia no válido")
+        # Guardar el item validado para uso posterior
+        self._validated_item = item
+        return value
     
     def get_validated_item(self):
-        """Obtener el item validado"""
+        """Obtener el item validado (ItemCatalogo)"""
         return getattr(self, '_validated_item', None)
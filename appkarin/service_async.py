@@ -0,0 +1,248 @@
+# service_async.py - Vistas asíncronas (ASGI) para descargas, subidas y emails
+"""
+Versiones async de los endpoints que pasan la mayor parte del tiempo esperando
+a Spaces o a Graph. Mientras esperan no ocupan un worker: un solo proceso
+uvicorn atiende muchas descargas/subidas simultáneas.
+
+Se enrutan sólo en el proceso ASGI (settings.ASYNC_IO_VIEWS, servicio
+web_async); bajo gunicorn/WSGI siguen las vistas síncronas, porque Django
+tendría que consumir en memoria las respuestas con iteradores asíncronos.
+Permisos, validaciones y registro en BD reutilizan los helpers de
+DenunciaManagementViewSet vía sync_to_async.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from appkarin.emailSDK.email_sdk import EmailSDK, verificar_envio
+from .service_consolidated import DenunciaManagementViewSet
+from .service_email import (
+    ASUNTO_CONFIRMACION, REMITENTE_CONFIRMACION,
+    construir_email_confirmacion, emails_administradores
+)
+from .http_async import get_async_http_client
+from .s3_client import get_s3_client
+from .s3_uploads import subir_archivos_async
+from .wizard_state import estado_wizard
+import json
+import mimetypes
+
+
+# Cabeceras de la respuesta de S3 que se entregan tal cual al cliente
+CABECERAS_S3 = ('Content-Length', 'Content-Range', 'ETag', 'Last-Modified')
+
+
+async def _iterar_cuerpo_s3(s3_response):
+    """Entrega el cuerpo de S3 por partes y cierra la conexión al terminar"""
+    try:
+        async for chunk in s3_response.aiter_raw(settings.S3_DOWNLOAD_CHUNK_SIZE):
+            yield chunk
+    finally:
+        await s3_response.aclose()
+
+
+@require_GET
+async def descargar_archivo(request):
+    """
+    GET /api/descargar-archivo/?archivo_id=123
+    Igual que DenunciaManagementViewSet.descargar_archivo (Range/If-Range,
+    If-None-Match, If-Modified-Since y modos presigned/accel), pero el objeto
+    se transmite con httpx desde una URL firmada.
+    """
+    try:
+        viewset = DenunciaManagementViewSet()
+
+        archivo, error = await sync_to_async(viewset._obtener_archivo_autorizado)(request)
+        if error:
+            return JsonResponse(error[0], status=error[1])
+
+        s3_key = viewset._s3_key_archivo(archivo)
+        s3_client = get_s3_client()
+
+        if settings.ARCHIVO_DOWNLOAD_MODE in ('presigned', 'accel'):
+            return viewset._descarga_delegada(s3_client, s3_key, archivo, settings.ARCHIVO_DOWNLOAD_MODE)
+
+        # Firmar es local: no hay llamada de red en el cliente boto3
+        url = s3_client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+                'Key': s3_key
+            },
+            ExpiresIn=settings.ARCHIVO_PRESIGNED_EXPIRES
+        )
+
+        # Reenviar validadores y rango del cliente a S3
+        headers = {}
+        rango = request.headers.get('Range', '')
+        if rango.startswith('bytes='):
+            headers['Range'] = rango
+            if_range = request.headers.get('If-Range')
+            if if_range and if_range.startswith('"'):
+                # If-Range con ETag: el rango sólo vale si el objeto no cambió
+                headers['If-Match'] = if_range
+        if request.headers.get('If-None-Match'):
+            headers['If-None-Match'] = request.headers['If-None-Match']
+        elif request.headers.get('If-Modified-Since'):
+            headers['If-Modified-Since'] = request.headers['If-Modified-Since']
+
+        client = get_async_http_client()
+        s3_response = await client.send(client.build_request('GET', url, headers=headers), stream=True)
+
+        if s3_response.status_code == 412 and 'If-Match' in headers:
+            # El objeto cambió desde la descarga parcial: se entrega completo
+            await s3_response.aclose()
+            headers.pop('If-Match')
+            headers.pop('Range')
+            s3_response = await client.send(client.build_request('GET', url, headers=headers), stream=True)
+
+        if s3_response.status_code not in (200, 206):
+            await s3_response.aclose()
+
+            if s3_response.status_code == 304:
+                response = HttpResponse(status=304)
+                if s3_response.headers.get('ETag'):
+                    response['ETag'] = s3_response.headers['ETag']
+                return response
+
+            if s3_response.status_code == 416:
+                return JsonResponse({'error': 'Rango no satisfacible'}, status=416)
+
+            print(f"❌ Error de S3 (HTTP {s3_response.status_code}) para {s3_key}")
+
+            if s3_response.status_code == 404:
+                return JsonResponse({
+                    'error': 'Archivo no encontrado en el almacenamiento',
+                    'details': f'Key: {s3_key}'
+                }, status=404)
+            return JsonResponse({
+                'error': f'Error al acceder al almacenamiento: HTTP {s3_response.status_code}'
+            }, status=500)
+
+        mime_type = s3_response.headers.get('Content-Type')
+        if not mime_type:
+            mime_type, _ = mimetypes.guess_type(archivo.nombre)
+        if not mime_type:
+            mime_type = 'application/octet-stream'
+
+        response = StreamingHttpResponse(
+            _iterar_cuerpo_s3(s3_response),
+            content_type=mime_type,
+            status=s3_response.status_code
+        )
+        response['Content-Disposition'] = f'attachment; filename="{archivo.nombre}"'
+        response['Accept-Ranges'] = 'bytes'
+        for cabecera in CABECERAS_S3:
+            if s3_response.headers.get(cabecera):
+                response[cabecera] = s3_response.headers[cabecera]
+
+        return response
+
+    except Exception as e:
+        print(f"❌ ERROR GENERAL en descargar_archivo (async): {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({
+            'error': f'Error al descargar archivo: {str(e)}'
+        }, status=500)
+
+
+@require_POST
+async def agregar_archivos(request):
+    """
+    POST /api/agregar-archivos-denuncia/
+    Igual que DenunciaManagementViewSet.agregar_archivos; las subidas a
+    Spaces se hacen con PUT firmados concurrentes (subir_archivos_async).
+    """
+    try:
+        viewset = DenunciaManagementViewSet()
+
+        denuncia, archivos, error = await sync_to_async(viewset._validar_agregar_archivos)(request)
+        if error:
+            return JsonResponse(error[0], status=error[1])
+
+        subidas, errores = viewset._preparar_subidas_admin(archivos)
+
+        resultados = await subir_archivos_async(subidas)
+
+        user = await request.auser()
+        data, status = await sync_to_async(viewset._registrar_subidas_admin)(
+            user, denuncia, subidas, resultados, errores
+        )
+        return JsonResponse(data, status=status)
+
+    except Exception as e:
+        print(f"❌ Error en agregar_archivos (async): {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({
+            'success': False,
+            'message': f'Error interno: {str(e)}'
+        }, status=500)
+
+
+@csrf_exempt
+@require_POST
+async def enviar_email(request):
+    """
+    POST /api/email/send/
+    Igual que EmailSenderAPIView.post; el envío a Graph no bloquea el worker.
+    """
+    try:
+        if request.content_type == 'application/json':
+            data = json.loads(request.body or b'{}')
+        else:
+            data = request.POST
+
+        email = data.get('correo_electronico')
+        if not email:
+            return JsonResponse({
+                'success': True,
+                'message': 'Anonimo',
+                'redirect_url': '/denuncia/final/'
+            })
+
+        estado = estado_wizard(request)
+        codigo = await estado.aget('codigo')
+
+        if not codigo:
+            print("❌ Error: No se encontró código en sesión")
+            return JsonResponse({
+                'success': False,
+                'message': 'Error: No se pudo obtener el código de denuncia',
+                'redirect_url': '/denuncia/Paso1/'
+            }, status=400)
+
+        mensaje = construir_email_confirmacion(codigo)
+
+        categoria_id = await estado.aget('denuncia_categoria_id')
+        cc = await sync_to_async(emails_administradores)(categoria_id)
+
+        # El token de Graph se obtiene (o se toma del caché) en un hilo
+        emailSDK = await sync_to_async(EmailSDK, thread_sensitive=False)(
+            email,
+            ASUNTO_CONFIRMACION,
+            mensaje['template_html'],
+            REMITENTE_CONFIRMACION,
+            cc=cc
+        )
+
+        verificar_envio(await emailSDK.send_mail_async(get_async_http_client()))
+        print('Email enviado a:', email)
+
+        return JsonResponse({
+            'success': True,
+            'message': 'Email enviado correctamente',
+            'email_sent_to': email,
+            'fecha_envio': f"{mensaje['dia']} de {mensaje['mes']} de {mensaje['anio']} a las {mensaje['hora']}",
+            'codigo_denuncia': codigo,
+            'redirect_url': '/denuncia/final/'
+        })
+
+    except Exception as e:
+        print(f"❌ Error enviando email: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'message': f'Error enviando email: {str(e)}'
+        }, status=500)
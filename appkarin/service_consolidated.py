@@ -3,21 +3,66 @@ from rest_framework.views import APIView
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import http_date, parse_http_date_safe
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from .models import Denuncia, DenunciaEstado, EstadosDenuncia, Foro, AdminDenuncias
+from .search import buscar_denuncias
+from .pdf_converter import get_pdf_pool, PDFConversionBusy
+from .pdf_cache import get_pdf_cache, pdf_cache_key
+from .docx_templates import obtener_plantilla
+from .s3_uploads import subir_archivos
+from .s3_client import get_s3_client
+from .service_datatable import ExportDenunciasExcelAPIView
 import json
-from subprocess import Popen
-import os
-from datetime import datetime
-from docxtpl import DocxTemplate
 import datetime
 import os
-import tempfile
-from subprocess import Popen, PIPE
+import io
+import uuid
+import zipfile
+
+
+class _BufferZip(io.RawIOBase):
+    """Destino no posicionable para zipfile: acumula lo escrito hasta vaciarlo"""
+    
+    def __init__(self):
+        self._partes = []
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self._partes.append(bytes(data))
+        return len(data)
+    
+    def vaciar(self):
+        contenido = b''.join(self._partes)
+        self._partes = []
+        return contenido
+
+
+class _IteradorLote:
+    """
+    Contenido del ZIP por lote. close() libera el puesto reservado aunque el
+    generador nunca haya empezado (cliente que se desconecta antes de leer).
+    """
+    
+    def __init__(self, generador, reserva):
+        self._generador = generador
+        self._reserva = reserva
+    
+    def __iter__(self):
+        return self._generador
+    
+    def close(self):
+        self._generador.close()
+        if self._reserva:
+            self._reserva.liberar()
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -259,6 +304,8 @@ class DenunciaManagementViewSet(ViewSet):
             pdf_content = self._generar_pdf_denuncia(denuncia_codigo)
             return pdf_content
             
+        except PDFConversionBusy as e:
+            return Response({'error': str(e)}, status=503, headers={'Retry-After': '5'})
         except Exception as e:
             return Response({'error': str(e)}, status=500)
     
@@ -267,151 +314,301 @@ class DenunciaManagementViewSet(ViewSet):
         Método helper para generar el PDF - CORREGIDO
         """
         try:
-            denuncia = Denuncia.objects.filter(codigo=denuncia_codigo).first()
+            denuncia = Denuncia.objects.select_related(
+                'tipo_empresa', 'item__categoria', 'usuario', 'relacion_empresa', 'tiempo'
+            ).filter(codigo=denuncia_codigo).first()
             if not denuncia:
                 raise ValueError(f"No se encontró denuncia con código: {denuncia_codigo}")
             
-            base_path = os.path.join(os.path.dirname(__file__), 'templates', 'word')
-            template_filename = f'template_denuncia_{denuncia.tipo_empresa.nombre}.docx'
-            path_archive = os.path.join(base_path, template_filename)
-            
-            # Generar el documento
-            doc = DocxTemplate(path_archive)
+            pdf_bytes = self._pdf_denuncia(denuncia)
             
-            context = {
-                'fecha_descarga': datetime.datetime.now().strftime('%d/%m/%Y'),
-                'rol': denuncia.item.categoria.nombre,
-                'codigo': denuncia.codigo,
-                'fecha_denuncia': denuncia.fecha.strftime('%d/%m/%Y'),
-                'usuario_nombre': denuncia.usuario.nombre or '',
-                'usuario_apellidos': denuncia.usuario.apellidos or '',   
-                'usuario_celular': denuncia.usuario.celular or '',
-                'usuario_correo': denuncia.usuario.correo or '',
-                'item_enunciado': denuncia.item.enunciado,
-                'rol_empresa': denuncia.relacion_empresa.rol,
-                'descripcion': denuncia.descripcion,
-                'descripcion_relacion': denuncia.descripcion_relacion or '',
-                'correo_trabajador': denuncia.usuario.correo or '',
-                'tiempo': denuncia.tiempo.intervalo,
-                'archivos': [],
-                'anonimo': 'Sí' if denuncia.usuario.anonimo else 'No'
-            }
-            
-            doc.render(context)
+            response = HttpResponse(pdf_bytes, content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="Informe_denuncia_{denuncia_codigo}.pdf"'
             
-            temp_dir = tempfile.gettempdir() 
+            return response
             
-           
-            path_doc = os.path.join(temp_dir, f'Informe_denuncia_{denuncia_codigo}.docx')
-            doc.save(path_doc)
-            pdf_process = Popen([
-                'libreoffice', 
-                '--headless', 
-                '--convert-to', 'pdf', 
-                '--outdir', temp_dir, 
-                path_doc
-            ], stdout=PIPE, stderr=PIPE)
-            
-            stdout, stderr = pdf_process.communicate()
-            
-            if pdf_process.returncode != 0:
-                print(f"Error en conversión PDF: {stderr.decode()}")
-                raise Exception(f"Error al convertir a PDF: {stderr.decode()}")
-            
-            path_pdf = os.path.join(temp_dir, f'Informe_denuncia_{denuncia_codigo}.pdf')
-            
-            if not os.path.exists(path_pdf):
-                raise FileNotFoundError(f"No se encontró el PDF generado en: {path_pdf}")
-            
-            with open(path_pdf, 'rb') as pdf_file:
-                response = HttpResponse(
-                    pdf_file.read(), 
-                    content_type='application/pdf'
-                )
-                response['Content-Disposition'] = f'attachment; filename="Informe_denuncia_{denuncia_codigo}.pdf"'
+        except Exception as e:
+            print(f"ERROR en _generar_pdf_denuncia: {str(e)}")
+            raise
+    
+    def _template_pdf(self, denuncia):
+        """Ruta de la plantilla Word según el tipo de empresa"""
+        base_path = os.path.join(os.path.dirname(__file__), 'templates', 'word')
+        template_filename = f'template_denuncia_{denuncia.tipo_empresa.nombre}.docx'
+        return os.path.join(base_path, template_filename)
+    
+    def _contexto_pdf(self, denuncia):
+        """Contexto de renderizado de la plantilla del informe"""
+        return {
+            'fecha_descarga': datetime.datetime.now().strftime('%d/%m/%Y'),
+            'rol': denuncia.item.categoria.nombre,
+            'codigo': denuncia.codigo,
+            'fecha_denuncia': denuncia.fecha.strftime('%d/%m/%Y'),
+            'usuario_nombre': denuncia.usuario.nombre or '',
+            'usuario_apellidos': denuncia.usuario.apellidos or '',   
+            'usuario_celular': denuncia.usuario.celular or '',
+            'usuario_correo': denuncia.usuario.correo or '',
+            'item_enunciado': denuncia.item.enunciado,
+            'rol_empresa': denuncia.relacion_empresa.rol,
+            'descripcion': denuncia.descripcion,
+            'descripcion_relacion': denuncia.descripcion_relacion or '',
+            'correo_trabajador': denuncia.usuario.correo or '',
+            'tiempo': denuncia.tiempo.intervalo,
+            'archivos': [],
+            'anonimo': 'Sí' if denuncia.usuario.anonimo else 'No'
+        }
+    
+    def _pdf_denuncia(self, denuncia):
+        """
+        Bytes del PDF de una denuncia.
+        Si la versión actual ya está en caché se entrega sin renderizar ni convertir.
+        """
+        path_archive, context, cache_key, pdf_bytes = self._pdf_en_cache(denuncia)
+        if pdf_bytes is not None:
+            return pdf_bytes
         
-            try:
-                os.remove(path_doc)
-                os.remove(path_pdf)
-            except:
-                pass 
-            
+        # Renderizar en memoria y convertir en el pool persistente de LibreOffice
+        pdf_bytes = get_pdf_pool().convert(self._renderizar_docx(path_archive, context))
+        self._guardar_pdf_en_cache(cache_key, pdf_bytes)
+        
+        return pdf_bytes
+    
+    def _pdf_en_cache(self, denuncia, leer=True):
+        """
+        Retorna (plantilla, contexto, clave de caché, PDF en caché o None).
+        Con leer=False el último valor sólo indica si está en caché (bool).
+        """
+        path_archive = self._template_pdf(denuncia)
+        context = self._contexto_pdf(denuncia)
+        
+        pdf_cache = get_pdf_cache()
+        if not pdf_cache:
+            return path_archive, context, None, None if leer else False
+        
+        cache_key = pdf_cache_key(denuncia.codigo, path_archive, denuncia.fecha_actualizacion, context)
+        if not leer:
+            return path_archive, context, cache_key, pdf_cache.contiene(cache_key)
+        return path_archive, context, cache_key, pdf_cache.get(cache_key)
+    
+    def _guardar_pdf_en_cache(self, cache_key, pdf_bytes):
+        pdf_cache = get_pdf_cache()
+        if not pdf_cache or not cache_key:
+            return
+        try:
+            pdf_cache.set(cache_key, pdf_bytes)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el PDF en caché: {e}")
+    
+    def _renderizar_docx(self, path_archive, context):
+        """Renderiza la plantilla Word (precompilada por proceso) y retorna el .docx en bytes"""
+        return obtener_plantilla(path_archive).render(context)
+    
+    @action(detail=False, methods=['post'])
+    def descargar_lote(self, request):
+        """
+        POST /api/descargar-denuncias-lote/
+        Genera un ZIP con los informes PDF de varias denuncias
+        
+        Body:
+            codigos: Lista de códigos de denuncia, o
+            filtros: Mismos parámetros que el datatable (búsqueda, etc.)
+        
+        El ZIP se transmite a medida que se convierten los PDF. El header
+        X-Lote-Id permite consultar el avance en descargar_lote_progreso.
+        """
+        if not request.user.is_authenticated:
+            return Response({'error': 'Autenticación requerida'}, status=401)
+        
+        try:
+            codigos = request.data.get('codigos')
+            filtros = request.data.get('filtros')
+            
+            if not codigos and filtros is None:
+                return Response({'error': 'Debe indicar codigos o filtros'}, status=400)
+            
+            # Mismo alcance por categoría que el datatable y la exportación Excel
+            admin = AdminDenuncias.objects.filter(id=request.user.id).first()
+            denuncias = ExportDenunciasExcelAPIView()._filtrar_denuncias(request.user, admin, filtros or {})
+            if codigos:
+                denuncias = denuncias.filter(codigo__in=codigos)
+            
+            max_lote = settings.PDF_BATCH_MAX
+            denuncias = list(denuncias.order_by('-fecha')[:max_lote + 1])
+            if len(denuncias) > max_lote:
+                return Response({'error': f'El lote supera el máximo de {max_lote} denuncias'}, status=400)
+            if not denuncias:
+                return Response({'error': 'No se encontraron denuncias'}, status=404)
+            
+            plan = [
+                (f'Informe_denuncia_{denuncia.codigo}.pdf', *self._pdf_en_cache(denuncia, leer=False))
+                for denuncia in denuncias
+            ]
+            
+            lote_id = uuid.uuid4().hex
+            self._actualizar_progreso_lote(lote_id, len(denuncias), 0)
+            
+            # El puesto se reserva antes de responder: si el pool está ocupado
+            # el cliente recibe 503 en vez de un ZIP cortado
+            reserva = None
+            if not all(en_cache for *_, en_cache in plan):
+                reserva = get_pdf_pool().reservar()
+            
+            response = StreamingHttpResponse(
+                _IteradorLote(self._iterar_zip_lote(lote_id, plan, reserva), reserva),
+                content_type='application/zip'
+            )
+            fecha = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            response['Content-Disposition'] = f'attachment; filename="Informes_denuncias_{fecha}.zip"'
+            response['X-Lote-Id'] = lote_id
+            response['X-Lote-Total'] = str(len(denuncias))
             return response
             
+        except PDFConversionBusy as e:
+            return Response({'error': str(e)}, status=503, headers={'Retry-After': '5'})
         except Exception as e:
-            print(f"ERROR en _generar_pdf_denuncia: {str(e)}")
+            return Response({'error': str(e)}, status=500)
+    
+    @action(detail=False, methods=['get'])
+    def descargar_lote_progreso(self, request):
+        """
+        GET /api/descargar-denuncias-lote/progreso/?lote_id=...
+        Avance de una descarga por lote en curso
+        """
+        progreso = caches['compartido'].get(f'appkarin:pdf_lote:{request.query_params.get("lote_id", "")}')
+        if progreso is None:
+            return Response({'error': 'Lote no encontrado'}, status=404)
+        return Response(progreso)
+    
+    def _actualizar_progreso_lote(self, lote_id, total, completados, estado='procesando'):
+        # Caché compartido: la consulta de avance puede llegar a otro worker
+        caches['compartido'].set(f'appkarin:pdf_lote:{lote_id}', {
+            'total': total,
+            'completados': completados,
+            'estado': estado,
+        }, timeout=3600)
+    
+    def _iterar_zip_lote(self, lote_id, plan, reserva):
+        """
+        Genera el ZIP por partes: primero los PDF en caché, luego los demás,
+        renderizando cada documento justo antes de convertirlo en el puesto
+        reservado (en memoria hay a lo sumo un DOCX a la vez).
+        """
+        buffer = _BufferZip()
+        total = len(plan)
+        completados = 0
+        pendientes = []
+        pdf_cache = get_pdf_cache()
+        
+        try:
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+                for nombre, path_archive, context, cache_key, en_cache in plan:
+                    pdf_bytes = pdf_cache.get(cache_key) if en_cache else None
+                    if pdf_bytes is None:
+                        pendientes.append((nombre, path_archive, context, cache_key))
+                        continue
+                    
+                    zf.writestr(nombre, pdf_bytes)
+                    completados += 1
+                    yield buffer.vaciar()
+                
+                self._actualizar_progreso_lote(lote_id, total, completados)
+                
+                for nombre, path_archive, context, cache_key in pendientes:
+                    docx_bytes = self._renderizar_docx(path_archive, context)
+                    if reserva:
+                        pdf_bytes = reserva.convert(docx_bytes)
+                    else:
+                        # Salió del caché de disco después de planificar el lote
+                        pdf_bytes = get_pdf_pool().convert(docx_bytes)
+                    self._guardar_pdf_en_cache(cache_key, pdf_bytes)
+                    zf.writestr(nombre, pdf_bytes)
+                    completados += 1
+                    self._actualizar_progreso_lote(lote_id, total, completados)
+                    yield buffer.vaciar()
+            
+            self._actualizar_progreso_lote(lote_id, total, completados, 'completado')
+            yield buffer.vaciar()
+            
+        except Exception as e:
+            print(f"ERROR en lote PDF {lote_id}: {str(e)}")
+            self._actualizar_progreso_lote(lote_id, total, completados, 'error')
             raise
+        finally:
+            if reserva:
+                reserva.liberar()
     
     @action(detail=False, methods=['get'])
     def descargar_archivo(self, request):
         """
         GET /api/descargar-archivo/?archivo_id=123
         Descarga un archivo específico de una denuncia desde S3
+        
+        Transmite el objeto por partes y respeta Range/If-Range,
+        If-None-Match e If-Modified-Since (ETag y Last-Modified de S3).
+        Con ARCHIVO_DOWNLOAD_MODE = presigned / accel la transferencia se
+        delega al cliente o a nginx (ver _descarga_delegada).
         """
         try:
-            import boto3
             from botocore.exceptions import ClientError
             from django.conf import settings
             import mimetypes
             
-            archivo_id = request.GET.get('archivo_id')
+            archivo, error = self._obtener_archivo_autorizado(request)
+            if error:
+                return Response(error[0], status=error[1])
             
-            if not archivo_id:
-                return Response({'error': 'ID de archivo requerido'}, status=400)
-            
-            
-            try:
-                from .models import Archivo
-                archivo = Archivo.objects.select_related('denuncia').get(id=archivo_id)
-            except Archivo.DoesNotExist:
-                return Response({'error': 'Archivo no encontrado'}, status=404)
+           
+            s3_key = self._s3_key_archivo(archivo)
             
+            s3_client = get_s3_client()
             
-            if request.user.is_authenticated:
-                has_permission, categoria = self.check_admin_permissions(request)
-                if not has_permission:
-                    return Response({'error': 'Sin permisos'}, status=403)
-                
-                if categoria and archivo.denuncia.item.categoria != categoria:
-                    return Response({'error': 'Sin permisos para esta categoría'}, status=403)
+            # Permisos ya validados: la transferencia puede salir del worker
+            if settings.ARCHIVO_DOWNLOAD_MODE in ('presigned', 'accel'):
+                return self._descarga_delegada(s3_client, s3_key, archivo, settings.ARCHIVO_DOWNLOAD_MODE)
             
-           
-            if archivo.archivo:
-                s3_key = archivo.archivo.name
-            else:
-                archivo_url = archivo.url
-                if settings.AWS_S3_CUSTOM_DOMAIN in archivo_url:
-                    s3_key = archivo_url.split(settings.AWS_S3_CUSTOM_DOMAIN + '/')[-1]
-                elif archivo_url.startswith('https://'):
-                    s3_key = archivo_url.split('/')[-2] + '/' + archivo_url.split('/')[-1]
-                elif archivo_url.startswith('/media/'):
-                    s3_key = archivo_url[7:]
-                elif archivo_url.startswith('media/'):
-                    s3_key = archivo_url[6:]
-                else:
-                    s3_key = archivo_url
-            
-            s3_client = boto3.client(
-                's3',
-                endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_S3_REGION_NAME
-            )
+            # Reenviar validadores y rango del cliente a S3
+            get_params = {
+                'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+                'Key': s3_key
+            }
+            rango = request.META.get('HTTP_RANGE', '')
+            if rango.startswith('bytes='):
+                get_params['Range'] = rango
+                if_range = request.META.get('HTTP_IF_RANGE')
+                if if_range and if_range.startswith('"'):
+                    # If-Range con ETag: el rango sólo vale si el objeto no cambió
+                    get_params['IfMatch'] = if_range
+            if request.META.get('HTTP_IF_NONE_MATCH'):
+                get_params['IfNoneMatch'] = request.META['HTTP_IF_NONE_MATCH']
+            elif request.META.get('HTTP_IF_MODIFIED_SINCE'):
+                fecha_ims = parse_http_date_safe(request.META['HTTP_IF_MODIFIED_SINCE'])
+                if fecha_ims:
+                    get_params['IfModifiedSince'] = datetime.datetime.fromtimestamp(fecha_ims, tz=datetime.timezone.utc)
             
             try:
-                s3_response = s3_client.get_object(
-                    Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                    Key=s3_key
-                )
+                try:
+                    s3_response = s3_client.get_object(**get_params)
+                except ClientError as e:
+                    if e.response['Error']['Code'] not in ('PreconditionFailed', '412') or 'IfMatch' not in get_params:
+                        raise
+                    # El objeto cambió desde la descarga parcial: se entrega completo
+                    get_params.pop('IfMatch')
+                    get_params.pop('Range')
+                    s3_response = s3_client.get_object(**get_params)
                 
+            except ClientError as e:
+                error_code = e.response['Error']['Code']
                 
-                file_content = s3_response['Body'].read()
+                if error_code in ('NotModified', '304'):
+                    response = HttpResponse(status=304)
+                    etag = e.response.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get('etag')
+                    if etag:
+                        response['ETag'] = etag
+                    return response
                 
-                print(f"✅ Archivo descargado exitosamente ({len(file_content)} bytes)")
+                if error_code == 'InvalidRange':
+                    return Response({'error': 'Rango no satisfacible'}, status=416)
                 
-            except ClientError as e:
-                error_code = e.response['Error']['Code']
                 print(f"❌ Error de S3 ({error_code}): {str(e)}")
                 
                 if error_code == 'NoSuchKey':
@@ -431,9 +628,21 @@ class DenunciaManagementViewSet(ViewSet):
             if not mime_type:
                 mime_type = 'application/octet-stream'
             
-            response = HttpResponse(file_content, content_type=mime_type)
+            # El cuerpo de S3 se transmite por partes: memoria O(chunk) por descarga
+            response = StreamingHttpResponse(
+                self._iterar_cuerpo_s3(s3_response['Body']),
+                content_type=mime_type,
+                status=206 if s3_response.get('ContentRange') else 200
+            )
             response['Content-Disposition'] = f'attachment; filename="{archivo.nombre}"'
-            response['Content-Length'] = len(file_content)
+            response['Content-Length'] = s3_response['ContentLength']
+            response['Accept-Ranges'] = 'bytes'
+            if s3_response.get('ContentRange'):
+                response['Content-Range'] = s3_response['ContentRange']
+            if s3_response.get('ETag'):
+                response['ETag'] = s3_response['ETag']
+            if s3_response.get('LastModified'):
+                response['Last-Modified'] = http_date(s3_response['LastModified'].timestamp())
             
             return response
         
@@ -445,157 +654,111 @@ class DenunciaManagementViewSet(ViewSet):
                 'error': f'Error al descargar archivo: {str(e)}'
             }, status=500)
      
-    @action(detail=False, methods=['post'])
-    def agregar_archivos(self, request):
+    def _obtener_archivo_autorizado(self, request):
         """
-        POST /api/denuncias/agregar_archivos/
-        Permite a los administradores agregar archivos a una denuncia existente
+        Archivo solicitado en ?archivo_id= si el usuario puede descargarlo
+        
+        Returns:
+            tuple: (archivo, None) o (None, (data, status))
         """
+        from .models import Archivo
+        
+        archivo_id = request.GET.get('archivo_id')
+        
+        if not archivo_id:
+            return None, ({'error': 'ID de archivo requerido'}, 400)
+        
+        
         try:
-            from django.conf import settings
-            from .models import Archivo
-            import os
-            import uuid
-            import boto3
-            from botocore.config import Config
-            
+            archivo = Archivo.objects.select_related('denuncia__item').get(id=archivo_id)
+        except (Archivo.DoesNotExist, ValueError):
+            return None, ({'error': 'Archivo no encontrado'}, 404)
+        
+        
+        if request.user.is_authenticated:
             has_permission, categoria = self.check_admin_permissions(request)
             if not has_permission:
-                return Response({
-                    'success': False,
-                    'message': 'No tiene permisos para agregar archivos'
-                }, status=403)
-            
-            denuncia_codigo = request.data.get('denuncia_codigo')
-            archivos = request.FILES.getlist('archivos[]')
-            
-            if not denuncia_codigo:
-                return Response({
-                    'success': False,
-                    'message': 'Código de denuncia requerido'
-                }, status=400)
-            
-            if not archivos or len(archivos) == 0:
-                return Response({
-                    'success': False,
-                    'message': 'No se recibieron archivos'
-                }, status=400)
-            
-            try:
-                denuncia = Denuncia.objects.get(codigo=denuncia_codigo)
-            except Denuncia.DoesNotExist:
-                return Response({
-                    'success': False,
-                    'message': f'Denuncia {denuncia_codigo} no encontrada'
-                }, status=404)
-            
-            if categoria and denuncia.item.categoria != categoria:
-                return Response({
-                    'success': False,
-                    'message': 'No tiene permisos para modificar esta categoría'
-                }, status=403)
+                return None, ({'error': 'Sin permisos'}, 403)
             
+            if categoria and archivo.denuncia.item.categoria_id != categoria.id:
+                return None, ({'error': 'Sin permisos para esta categoría'}, 403)
         
-            MAX_FILE_SIZE = 500 * 1024 * 1024  
-            ALLOWED_EXTENSIONS = {'.pdf', '.doc', '.docx', '.jpg', '.jpeg', '.png', '.gif', '.xlsx', '.xls', '.txt'}
-            ALLOWED_MIME_TYPES = {
-                'application/pdf',
-                'application/msword',
-                'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                'image/jpeg',
-                'image/png',
-                'image/gif',
-                'application/vnd.ms-excel',
-                'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                'text/plain'
-            }
+        return archivo, None
+    
+    def _s3_key_archivo(self, archivo):
+        """Key en el bucket de un Archivo (campo FileField o URL heredada)"""
+        if archivo.archivo:
+            return archivo.archivo.name
+        
+        archivo_url = archivo.url
+        if settings.AWS_S3_CUSTOM_DOMAIN in archivo_url:
+            return archivo_url.split(settings.AWS_S3_CUSTOM_DOMAIN + '/')[-1]
+        elif archivo_url.startswith('https://'):
+            return archivo_url.split('/')[-2] + '/' + archivo_url.split('/')[-1]
+        elif archivo_url.startswith('/media/'):
+            return archivo_url[7:]
+        elif archivo_url.startswith('media/'):
+            return archivo_url[6:]
+        return archivo_url
+    
+    def _descarga_delegada(self, s3_client, s3_key, archivo, modo):
+        """
+        Entrega la descarga sin mantener ocupado el worker:
+        - presigned: redirección 302 a una URL firmada de corta duración
+        - accel: X-Accel-Redirect a la location interna /_s3_proxy/ de nginx,
+          que descarga la URL firmada indicada en X-S3-Url
+        """
+        import mimetypes
+        
+        mime_type, _ = mimetypes.guess_type(archivo.nombre)
+        url = s3_client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+                'Key': s3_key,
+                'ResponseContentDisposition': f'attachment; filename="{archivo.nombre}"',
+                'ResponseContentType': mime_type or 'application/octet-stream',
+            },
+            ExpiresIn=settings.ARCHIVO_PRESIGNED_EXPIRES
+        )
+        
+        if modo == 'presigned':
+            response = HttpResponseRedirect(url)
+        else:
+            response = HttpResponse()
+            response['X-Accel-Redirect'] = '/_s3_proxy/'
+            response['X-S3-Url'] = url
+        
+        # La URL firmada expira: no debe quedar en cachés intermedias
+        response['Cache-Control'] = 'private, no-store'
+        return response
+    
+    def _iterar_cuerpo_s3(self, body):
+        """Entrega el cuerpo de get_object por partes y cierra la conexión al terminar"""
+        try:
+            for chunk in body.iter_chunks(chunk_size=settings.S3_DOWNLOAD_CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+    
+    @action(detail=False, methods=['post'])
+    def agregar_archivos(self, request):
+        """
+        POST /api/denuncias/agregar_archivos/
+        Permite a los administradores agregar archivos a una denuncia existente
+        """
+        try:
+            denuncia, archivos, error = self._validar_agregar_archivos(request)
+            if error:
+                return Response(error[0], status=error[1])
             
-            s3_client = boto3.client(
-                's3',
-                endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                config=Config(signature_version='s3v4')
-            )
+            subidas, errores = self._preparar_subidas_admin(archivos)
             
-            archivos_subidos = []
-            errores = []
+            # Subida multipart en paralelo; contenido ya almacenado no se vuelve a subir
+            resultados = subir_archivos(get_s3_client(), subidas)
             
-            for archivo in archivos:
-                try:
-        
-                    if archivo.size > MAX_FILE_SIZE:
-                        errores.append(f'{archivo.name}: Excede el tamaño máximo (500MB)')
-                        continue
-                    
-
-                    ext = os.path.splitext(archivo.name)[1].lower()
-                    if ext not in ALLOWED_EXTENSIONS:
-                        errores.append(f'{archivo.name}: Extensión no permitida')
-                        continue
-                    
-                    if archivo.content_type not in ALLOWED_MIME_TYPES:
-                        errores.append(f'{archivo.name}: Tipo de archivo no permitido')
-                        continue
-                    
-                    nombre_unico = f"{uuid.uuid4()}_{archivo.name}"
-                    s3_key = f"{denuncia.codigo}/{nombre_unico}"
-                    
-                    file_content = archivo.read()
-                    
-                    
-                    s3_client.put_object(
-                        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                        Key=s3_key,
-                        Body=file_content,
-                        ContentType=archivo.content_type,
-                        ACL='public-read'
-                    )
-                    
-
-                    url_publica = f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{s3_key}"
-                    
-                  
-                    archivo_obj = Archivo.objects.create(
-                        denuncia=denuncia,
-                        nombre=archivo.name[:250],
-                        descripción=f"Archivo agregado por admin {request.user.username}"[:250],
-                        archivo=s3_key,
-                        url=url_publica,
-                        Peso=archivo.size
-                    )
-                    
-                    archivos_subidos.append({
-                        'id': archivo_obj.id,
-                        'nombre': archivo_obj.nombre,
-                        'url': url_publica,
-                        'peso': archivo.size
-                    })
-                    
-                    
-                except Exception as e:
-                    error_msg = f'{archivo.name}: {str(e)}'
-                    errores.append(error_msg)
-                    print(f"❌ Error subiendo {archivo.name}: {str(e)}")
-            
-            if len(archivos_subidos) > 0:
-                mensaje = f'{len(archivos_subidos)} archivo(s) subido(s) correctamente'
-                if errores:
-                    mensaje += f'. {len(errores)} archivo(s) con errores'
-                
-                return Response({
-                    'success': True,
-                    'message': mensaje,
-                    'archivos_subidos': len(archivos_subidos),
-                    'archivos': archivos_subidos,
-                    'errores': errores if errores else None
-                })
-            else:
-                return Response({
-                    'success': False,
-                    'message': 'No se pudo subir ningún archivo',
-                    'errores': errores
-                }, status=400)
+            data, status = self._registrar_subidas_admin(request.user, denuncia, subidas, resultados, errores)
+            return Response(data, status=status)
             
         except Exception as e:
             print(f"❌ Error en agregar_archivos: {str(e)}")
@@ -605,6 +768,172 @@ class DenunciaManagementViewSet(ViewSet):
                 'success': False,
                 'message': f'Error interno: {str(e)}'
             }, status=500)
+    
+    # Validaciones de archivos agregados por administradores
+    MAX_FILE_SIZE = 500 * 1024 * 1024  
+    ALLOWED_EXTENSIONS = {'.pdf', '.doc', '.docx', '.jpg', '.jpeg', '.png', '.gif', '.xlsx', '.xls', '.txt'}
+    ALLOWED_MIME_TYPES = {
+        'application/pdf',
+        'application/msword',
+        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        'image/jpeg',
+        'image/png',
+        'image/gif',
+        'application/vnd.ms-excel',
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'text/plain'
+    }
+    
+    def _validar_agregar_archivos(self, request):
+        """
+        Permisos, denuncia y archivos recibidos en agregar_archivos
+        (también lo usa la vista asíncrona).
+        
+        Returns:
+            tuple: (denuncia, archivos, None) o (None, None, (data, status))
+        """
+        has_permission, categoria = self.check_admin_permissions(request)
+        if not has_permission:
+            return None, None, ({
+                'success': False,
+                'message': 'No tiene permisos para agregar archivos'
+            }, 403)
+        
+        denuncia_codigo = request.POST.get('denuncia_codigo')
+        archivos = request.FILES.getlist('archivos[]')
+        
+        if not denuncia_codigo:
+            return None, None, ({
+                'success': False,
+                'message': 'Código de denuncia requerido'
+            }, 400)
+        
+        if not archivos or len(archivos) == 0:
+            return None, None, ({
+                'success': False,
+                'message': 'No se recibieron archivos'
+            }, 400)
+        
+        try:
+            denuncia = Denuncia.objects.select_related('item').get(codigo=denuncia_codigo)
+        except Denuncia.DoesNotExist:
+            return None, None, ({
+                'success': False,
+                'message': f'Denuncia {denuncia_codigo} no encontrada'
+            }, 404)
+        
+        if categoria and denuncia.item.categoria_id != categoria.id:
+            return None, None, ({
+                'success': False,
+                'message': 'No tiene permisos para modificar esta categoría'
+            }, 403)
+        
+        return denuncia, archivos, None
+    
+    def _preparar_subidas_admin(self, archivos):
+        """Valida cada archivo; retorna (subidas, errores con su índice)"""
+        errores = []
+        subidas = []
+        
+        for indice, archivo in enumerate(archivos):
+            if archivo.size > self.MAX_FILE_SIZE:
+                errores.append((indice, f'{archivo.name}: Excede el tamaño máximo (500MB)'))
+                continue
+            
+
+            ext = os.path.splitext(archivo.name)[1].lower()
+            if ext not in self.ALLOWED_EXTENSIONS:
+                errores.append((indice, f'{archivo.name}: Extensión no permitida'))
+                continue
+            
+            if archivo.content_type not in self.ALLOWED_MIME_TYPES:
+                errores.append((indice, f'{archivo.name}: Tipo de archivo no permitido'))
+                continue
+            
+            subidas.append({
+                'indice': indice,
+                'archivo': archivo,
+                'fileobj': archivo,
+                'nombre': archivo.name,
+                'sha256': getattr(archivo, 'sha256', None),
+                'content_type': archivo.content_type
+            })
+        
+        return subidas, errores
+    
+    def _registrar_subidas_admin(self, user, denuncia, subidas, resultados, errores):
+        """
+        Crea los Archivo de las subidas exitosas y arma la respuesta
+        
+        Returns:
+            tuple: (data, status)
+        """
+        from .models import Archivo
+        
+        archivos_nuevos = []
+        
+        for subida, error in zip(subidas, resultados):
+            archivo = subida['archivo']
+            s3_key = subida['key']
+            try:
+                if error:
+                    raise error
+                
+                url_publica = f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{s3_key}"
+                
+              
+                archivos_nuevos.append(Archivo(
+                    denuncia=denuncia,
+                    nombre=archivo.name[:250],
+                    descripción=f"Archivo agregado por admin {user.username}"[:250],
+                    archivo=s3_key,
+                    url=url_publica,
+                    Peso=archivo.size,
+                    hash_contenido=subida['sha256']
+                ))
+                
+                
+            except Exception as e:
+                error_msg = f'{archivo.name}: {str(e)}'
+                errores.append((subida['indice'], error_msg))
+                print(f"❌ Error subiendo {archivo.name}: {str(e)}")
+        
+        # Un solo INSERT para todos los archivos subidos
+        if archivos_nuevos:
+            Archivo.crear_lote(archivos_nuevos)
+        
+        archivos_subidos = [
+            {
+                'id': archivo_obj.id,
+                'nombre': archivo_obj.nombre,
+                # Los objetos son privados: se descargan por la vista autorizada
+                'url': f'/api/descargar-archivo/?archivo_id={archivo_obj.id}',
+                'peso': archivo_obj.Peso
+            }
+            for archivo_obj in archivos_nuevos
+        ]
+        
+        # Errores en el mismo orden en que se recibieron los archivos
+        errores = [mensaje for _, mensaje in sorted(errores, key=lambda error: error[0])]
+        
+        if len(archivos_subidos) > 0:
+            mensaje = f'{len(archivos_subidos)} archivo(s) subido(s) correctamente'
+            if errores:
+                mensaje += f'. {len(errores)} archivo(s) con errores'
+            
+            return {
+                'success': True,
+                'message': mensaje,
+                'archivos_subidos': len(archivos_subidos),
+                'archivos': archivos_subidos,
+                'errores': errores if errores else None
+            }, 200
+        else:
+            return {
+                'success': False,
+                'message': 'No se pudo subir ningún archivo',
+                'errores': errores
+            }, 400
             
 
 class DenunciaQueryAPI(APIView):
@@ -625,6 +954,7 @@ class DenunciaQueryAPI(APIView):
         - by_user: Buscar por usuario
         - by_category: Buscar por categoría
         - stats: Obtener estadísticas
+        - search: Búsqueda de texto completo con resultados ordenados por relevancia
         """
         try:
             data = json.loads(request.body) if request.body else {}
@@ -637,6 +967,8 @@ class DenunciaQueryAPI(APIView):
                 return self._query_by_category(data)
             elif action == 'stats':
                 return self._get_stats(data)
+            elif action == 'search':
+                return self._search(request, data)
             else:
                 return JsonResponse({
                     'error': f'Acción no válida: {action}'
@@ -721,4 +1053,43 @@ class DenunciaQueryAPI(APIView):
             'success': True,
             'count': len(results),
             'results': results
-        })
\ No newline at end of file
+        })
+    
+    def _search(self, request, data):
+        """Búsqueda de texto completo (solo administradores)"""
+        termino = data.get('q', '').strip()
+        
+        if not termino:
+            return JsonResponse({'error': 'Término de búsqueda requerido'}, status=400)
+        
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Usuario no autenticado'}, status=401)
+        
+        denuncias = Denuncia.objects.select_related('item', 'item__categoria')
+        
+        if getattr(request.user, 'rol_categoria', None):
+            denuncias = denuncias.filter(item__categoria_id=request.user.rol_categoria_id)
+        elif not request.user.is_superuser:
+            return JsonResponse({'error': 'Sin permisos'}, status=403)
+        
+        try:
+            limit = min(int(data.get('limit', 20)), 100)
+        except (TypeError, ValueError):
+            limit = 20
+        
+        denuncias = buscar_denuncias(denuncias, termino).order_by('-rank', '-fecha')[:limit]
+        
+        results = [{
+            'codigo': d.codigo,
+            'fecha': d.fecha.isoformat(),
+            'estado': d.estado_actual,
+            'categoria': d.item.categoria.nombre,
+            'tipo': d.item.enunciado,
+            'rank': d.rank
+        } for d in denuncias]
+        
+        return JsonResponse({
+            'success': True,
+            'count': len(results),
+            'results': results
+        })
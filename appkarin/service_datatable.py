@@ -1,24 +1,76 @@
 # service_datatable.py - VERSIÓN FINAL CORREGIDA
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.db.models import Q, Count
+from django.utils.dateparse import parse_datetime
+from django.core import signing
+from django.core.cache import caches
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, F, Value, FilteredRelation
+from django.db.models.functions import Coalesce
 from .models import Denuncia, Usuario, AdminDenuncias, Foro, Empresa
+from .cache_utils import get_cache_version, hash_key
+from .search import buscar_denuncias
 import json
+import csv
+import io
+import codecs
+import itertools
 import openpyxl
-from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment, NamedStyle
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.worksheet import Worksheet
 from openpyxl.utils import get_column_letter
 import datetime
 import os
+import tempfile
+
+
+# Grupo de caché de conteos; se invalida en appkarin.signals
+DATATABLE_COUNT_CACHE = 'datatable_count'
+
+
+def annotate_contadores_foro(queryset, admin):
+    """
+    Anota los contadores de mensajes del admin leyendo ForoContador
+    (un LEFT JOIN por clave única, sin GROUP BY sobre Foro)
+    """
+    if not admin:
+        return queryset.annotate(
+            num_mensajes_no_leidos=Value(0),
+            num_mensajes_leidos=Value(0),
+            num_mensajes_total=Value(0)
+        )
+    
+    return queryset.annotate(
+        contador_admin=FilteredRelation(
+            'contadores_foro',
+            condition=Q(contadores_foro__admin=admin)
+        )
+    ).annotate(
+        num_mensajes_no_leidos=Coalesce(F('contador_admin__no_leidos'), 0),
+        num_mensajes_leidos=Coalesce(F('contador_admin__leidos'), 0),
+        num_mensajes_total=Coalesce(F('contador_admin__total'), 0)
+    )
 
 
 @method_decorator(csrf_exempt, name='dispatch')
 class SimpleDenunciaDataTableAPIView(APIView):
     """
     API simplificada para DataTable de denuncias - VERSIÓN CORREGIDA
+
+    Paginación:
+    - offset (por defecto): usa start/length como DataTables
+    - keyset: enviar pagination='keyset' y opcionalmente cursor/cursor_dir
+      para paginar por (fecha, codigo) sin OFFSET
     """
+
+    # ===== CONFIGURACIÓN DE PAGINACIÓN KEYSET =====
+    KEYSET_CURSOR_SALT = 'appkarin.datatable.cursor'
+    KEYSET_MAX_LENGTH = 100
     
     def post(self, request, *args, **kwargs):
         try:
@@ -74,27 +126,9 @@ class SimpleDenunciaDataTableAPIView(APIView):
                 'tipo_empresa'  # Agregar esto si existe
             )
             
-            # Agregar anotaciones según si hay admin o no
+            # Contadores de mensajes precalculados (solo si hay admin)
             if admin:
-                denuncia = denuncia.annotate(
-                    num_archivos=Count('archivo'),
-                    num_mensajes_no_leidos=Count(
-                        'foro',
-                        filter=Q(foro__leido=False, foro__admin=admin)
-                    ),
-                    num_mensajes_leidos=Count(
-                        'foro',
-                        filter=Q(foro__leido=True, foro__admin=admin)
-                    ),
-                    num_mensajes_total=Count(
-                        'foro',
-                        filter=Q(foro__admin=admin)
-                    )
-                )
-            else:
-                denuncia = denuncia.annotate(
-                    num_archivos=Count('archivo')
-                )
+                denuncia = annotate_contadores_foro(denuncia, admin)
             
             # FILTRADO según tipo de usuario
             if request.user and request.user.is_authenticated:
@@ -102,11 +136,13 @@ class SimpleDenunciaDataTableAPIView(APIView):
              
                 if hasattr(request.user, 'rol_categoria') and request.user.rol_categoria:
                     denuncia = denuncia.filter(item__categoria_id=request.user.rol_categoria.id)
+                    count_scope = f'categoria:{request.user.rol_categoria.id}'
                 elif request.user.is_superuser:
-                   pass
+                   count_scope = 'superuser'
                 else:
                     print("Admin sin categoría - sin permisos")
                     denuncia = denuncia.none()
+                    count_scope = None
             else:
                 # Usuarios no autenticados
                 user_info = dt_data.get('user_info', {})
@@ -116,33 +152,43 @@ class SimpleDenunciaDataTableAPIView(APIView):
                 
                 if user_type == 'anonimo' and codigo:
                     denuncia = denuncia.filter(codigo=codigo)
+                    count_scope = f'anonimo:{codigo}'
                 elif user_type == 'identificado' and codigo:
                     denuncia = denuncia.filter(usuario__id=codigo)
+                    count_scope = f'identificado:{codigo}'
                 else:
                     denuncia = denuncia.none()
+                    count_scope = None
             
             # Contar total antes de búsqueda
-            records_total = denuncia.count()
+            records_total = self._cached_count(denuncia, count_scope, '')
             
             # Aplicar búsqueda si existe
             search_value = dt_data.get('search', {}).get('value', '')
             if search_value:
                 denuncia = self._apply_search(denuncia, search_value)
+                
+                # Contar registros filtrados
+                records_filtered = self._cached_count(denuncia, count_scope, search_value)
+            else:
+                records_filtered = records_total
             
-            # Contar registros filtrados
-            records_filtered = denuncia.count()
-            
-            # Aplicar ordenamiento
-            denuncia = self._apply_ordering(denuncia, dt_data)
-            
-            # Paginar
-            start = dt_data['start']
-            length = dt_data['length']
-            
-            if length > 0:
-                denuncias = denuncia[start:start + length]
+            cursores = None
+            if dt_data.get('pagination') == 'keyset':
+                # Paginar por (fecha, codigo) sin OFFSET
+                denuncias, cursores = self._apply_keyset(denuncia, dt_data)
             else:
-                denuncias = denuncia  # Todas las filas si length = -1
+                # Aplicar ordenamiento
+                denuncia = self._apply_ordering(denuncia, dt_data)
+                
+                # Paginar
+                start = dt_data['start']
+                length = dt_data['length']
+                
+                if length > 0:
+                    denuncias = denuncia[start:start + length]
+                else:
+                    denuncias = denuncia  # Todas las filas si length = -1
             
 
             
@@ -163,11 +209,8 @@ class SimpleDenunciaDataTableAPIView(APIView):
                         'tiempo': denuncia.tiempo.intervalo if denuncia.tiempo else 'N/A'
                     }
                     
-                    # Agregar contadores si existen
-                    if hasattr(denuncia, 'num_archivos'):
-                        row['num_archivos'] = denuncia.num_archivos
-                    else:
-                        row['num_archivos'] = 0
+                    # Contador desnormalizado de archivos
+                    row['num_archivos'] = denuncia.num_archivos
                     
                     # Mensajes solo si hay admin
                     if admin:
@@ -193,6 +236,10 @@ class SimpleDenunciaDataTableAPIView(APIView):
                 'data': data
             }
             
+            if cursores is not None:
+                response_data['next_cursor'] = cursores['next']
+                response_data['prev_cursor'] = cursores['prev']
+            
             return JsonResponse(response_data, safe=False)
             
         except Exception as e:
@@ -206,16 +253,76 @@ class SimpleDenunciaDataTableAPIView(APIView):
                 'error': str(e)
             }, status=200)  # Usar 200 para que DataTables lo procese
     
+    def _cached_count(self, queryset, scope, search_value):
+        """
+        Conteo cacheado por (alcance del usuario, término de búsqueda).
+        
+        Conteos y versión viven en el caché compartido: al guardar una
+        denuncia todos los workers dejan de usar los conteos anteriores.
+        
+        Junto al conteo vigente se guarda el último conocido (sin versión):
+        si estaba bajo el umbral no se pide la estimación a Postgres y se
+        cuenta directo, sin el EXPLAIN extra. Ambos se leen en una sola
+        llamada (get_many).
+        
+        Args:
+            queryset: QuerySet a contar
+            scope (str|None): Alcance del usuario (categoría, superuser o
+                código público); None si no tiene acceso a ninguna denuncia
+            search_value (str): Término de búsqueda aplicado ('' si no hay)
+        
+        Returns:
+            int: Conteo exacto, o estimación del planner si supera el umbral
+        """
+        if scope is None:
+            return 0
+        
+        compartido = caches['compartido']
+        version = get_cache_version(DATATABLE_COUNT_CACHE, alias='compartido')
+        base_key = f'datatable:count:{scope}:{hash_key(search_value)}'
+        cache_key = f'{base_key}:v{version}'
+        ultimo_key = f'{base_key}:ultimo'
+        
+        guardados = compartido.get_many([cache_key, ultimo_key])
+        total = guardados.get(cache_key)
+        if total is not None:
+            return total
+        
+        umbral = settings.DATATABLE_COUNT_ESTIMATE_THRESHOLD
+        ultimo = guardados.get(ultimo_key)
+        total = None
+        if ultimo is None or ultimo >= umbral:
+            total = self._estimate_count(queryset)
+        if total is None or total < umbral:
+            total = queryset.count()
+        
+        compartido.set(cache_key, total, settings.DATATABLE_COUNT_CACHE_TIMEOUT)
+        compartido.set(ultimo_key, total, settings.DATATABLE_COUNT_CACHE_TIMEOUT * 12)
+        return total
+    
+    def _estimate_count(self, queryset):
+        """
+        Estimación de filas según el planner de Postgres (EXPLAIN).
+        Retorna None si la base de datos no es Postgres o si falla.
+        """
+        if connection.vendor != 'postgresql':
+            return None
+        
+        try:
+            sql, params = queryset.order_by().values('pk').query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        except Exception as e:
+            print(f"Error estimando conteo: {e}")
+            return None
+    
     def _apply_search(self, queryset, search_value):
-        """Aplicar búsqueda global"""
-        return queryset.filter(
-            Q(codigo__icontains=search_value) |
-            Q(usuario__nombre__icontains=search_value) |
-            Q(usuario__apellidos__icontains=search_value) |
-            Q(item__enunciado__icontains=search_value) |
-            Q(item__categoria__nombre__icontains=search_value) |
-            Q(descripcion__icontains=search_value)
-        )
+        """Aplicar búsqueda global (índice de texto completo)"""
+        return buscar_denuncias(queryset, search_value)
     
     def _apply_ordering(self, queryset, dt_data):
         """Aplicar ordenamiento"""
@@ -250,6 +357,99 @@ class SimpleDenunciaDataTableAPIView(APIView):
         
         # Por defecto, ordenar por fecha descendente
         return queryset.order_by('-fecha')
+    
+    def _apply_keyset(self, queryset, dt_data):
+        """
+        Paginación keyset (seek) sobre (fecha, codigo)
+        
+        Args:
+            queryset: QuerySet ya filtrado y con búsqueda aplicada
+            dt_data (dict): Datos del request. Usa 'length', 'order',
+                'cursor' (opaco, devuelto en la respuesta anterior) y
+                'cursor_dir' ('next' o 'prev')
+        
+        Returns:
+            tuple: (list de denuncias de la página, {'next': str|None, 'prev': str|None})
+        """
+        # Tamaño de página acotado: length = -1 no vuelca toda la tabla
+        length = dt_data['length']
+        if length <= 0 or length > self.KEYSET_MAX_LENGTH:
+            length = self.KEYSET_MAX_LENGTH
+        
+        # Solo la columna fecha admite keyset; su dirección se respeta
+        descending = True
+        order_data = dt_data.get('order', [])
+        if order_data and isinstance(order_data, list):
+            try:
+                if int(order_data[0].get('column', 1)) == 1:
+                    descending = order_data[0].get('dir', 'desc') != 'asc'
+            except (TypeError, ValueError, AttributeError):
+                pass
+        
+        cursor = self._decode_cursor(dt_data.get('cursor'))
+        backwards = bool(cursor) and dt_data.get('cursor_dir') == 'prev'
+        
+        # Al retroceder se recorre en sentido inverso y luego se invierte la página
+        seek_desc = descending != backwards
+        
+        if cursor:
+            fecha, codigo = cursor
+            if seek_desc:
+                queryset = queryset.filter(
+                    Q(fecha__lt=fecha) | Q(fecha=fecha, codigo__lt=codigo)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(fecha__gt=fecha) | Q(fecha=fecha, codigo__gt=codigo)
+                )
+        
+        if seek_desc:
+            queryset = queryset.order_by('-fecha', '-codigo')
+        else:
+            queryset = queryset.order_by('fecha', 'codigo')
+        
+        # Una fila extra indica si existe otra página en ese sentido
+        rows = list(queryset[:length + 1])
+        has_more = len(rows) > length
+        rows = rows[:length]
+        
+        if backwards:
+            rows.reverse()
+        
+        has_next = has_more if not backwards else True
+        has_prev = has_more if backwards else bool(cursor)
+        
+        cursores = {
+            'next': self._encode_cursor(rows[-1]) if rows and has_next else None,
+            'prev': self._encode_cursor(rows[0]) if rows and has_prev else None,
+        }
+        
+        return rows, cursores
+    
+    def _encode_cursor(self, denuncia):
+        """Genera un cursor opaco y firmado a partir de (fecha, codigo)"""
+        return signing.dumps(
+            [denuncia.fecha.isoformat(), denuncia.codigo],
+            salt=self.KEYSET_CURSOR_SALT,
+            compress=True
+        )
+    
+    def _decode_cursor(self, cursor):
+        """Decodifica un cursor; retorna (fecha, codigo) o None si es inválido"""
+        if not cursor:
+            return None
+        
+        try:
+            fecha_iso, codigo = signing.loads(cursor, salt=self.KEYSET_CURSOR_SALT)
+            fecha = parse_datetime(fecha_iso)
+        except (signing.BadSignature, TypeError, ValueError):
+            print("Cursor de paginación inválido")
+            return None
+        
+        if fecha is None:
+            return None
+        
+        return fecha, codigo
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -257,15 +457,64 @@ class ExportDenunciasExcelAPIView(APIView):
     """
     API para exportar denuncias a Excel
     Usa los mismos filtros que SimpleDenunciaDataTableAPIView
+    
+    El campo 'format' del body permite exportar datos crudos:
+    - xlsx (por defecto): reporte con estilos
+    - csv / jsonl: filas transmitidas directamente desde values_list
+    - parquet: archivo columnar (requiere pyarrow)
     """
     
+    # Filas leídas por consulta al recorrer el queryset
+    EXPORT_CHUNK_SIZE = 2000
+    
+    # Columnas de las exportaciones crudas: (nombre, campo para values_list)
+    RAW_COLUMNS = [
+        ('codigo', 'codigo'),
+        ('fecha', 'fecha'),
+        ('categoria', 'item__categoria__nombre'),
+        ('tipo_denuncia', 'item__enunciado'),
+        ('usuario_anonimo', 'usuario__anonimo'),
+        ('usuario_nombre', 'usuario__nombre'),
+        ('usuario_apellidos', 'usuario__apellidos'),
+        ('estado', 'estado_actual'),
+        ('relacion_empresa', 'relacion_empresa__rol'),
+        ('tiempo', 'tiempo__intervalo'),
+        ('empresa', 'tipo_empresa__nombre'),
+        ('num_archivos', 'num_archivos'),
+        ('num_mensajes_leidos', 'num_mensajes_leidos'),
+        ('num_mensajes_no_leidos', 'num_mensajes_no_leidos'),
+        ('num_mensajes_total', 'num_mensajes_total'),
+        ('descripcion', 'descripcion'),
+        ('descripcion_relacion', 'descripcion_relacion'),
+    ]
+    
+    EXPORT_FORMATS = {
+        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'csv': 'text/csv; charset=utf-8',
+        'jsonl': 'application/x-ndjson',
+        'parquet': 'application/vnd.apache.parquet',
+    }
+    
     def post(self, request, *args, **kwargs):
         try:
+            dt_data = self._parse_request(request)
+            formato = dt_data.get('format', 'xlsx')
+            
+            if formato not in self.EXPORT_FORMATS:
+                return JsonResponse({
+                    'error': f'Formato no válido: {formato}'
+                }, status=400)
+            
             # Usar la misma lógica de filtrado que SimpleDenunciaDataTableAPIView
             admin = AdminDenuncias.objects.filter(id=request.user.id).first()
             
             # Obtener denuncias con los mismos filtros
-            denuncias_queryset = self._get_filtered_denuncias(request, admin)
+            denuncias_queryset = self._filtrar_denuncias(request.user, admin, dt_data)
+            
+            if formato in ('csv', 'jsonl'):
+                return self._generar_streaming_crudo(denuncias_queryset, formato)
+            elif formato == 'parquet':
+                return self._generar_parquet_denuncias(denuncias_queryset)
             
             # Generar Excel
             excel_file = self._generar_excel_denuncias(denuncias_queryset, request.user)
@@ -278,39 +527,28 @@ class ExportDenunciasExcelAPIView(APIView):
                 'error': f'Error al generar Excel: {str(e)}'
             }, status=500)
     
-    def _get_filtered_denuncias(self, request, admin):
-        """Obtener denuncias con los mismos filtros que la DataTable"""
-        # Parsear datos del request
-        dt_data = self._parse_request(request)
-        
-        # Query base con anotaciones
-        denuncias = Denuncia.objects.select_related(
-            'usuario',
-            'item', 
-            'item__categoria',
-            'relacion_empresa',
-            'tiempo',
-            'tipo_empresa'
-        ).annotate(
-            num_archivos=Count('archivo'),
-            num_mensajes_no_leidos=Count(
-                'foro',
-                filter=Q(foro__leido=False, foro__admin=admin)
-            ),
-            num_mensajes_leidos=Count(
-                'foro',
-                filter=Q(foro__leido=True, foro__admin=admin)
+    def _filtrar_denuncias(self, user, admin, dt_data):
+        """
+        Aplica alcance del usuario y búsqueda sin depender del request
+        (lo reutilizan los trabajos de exportación en segundo plano)
+        """
+        # Query base con contadores precalculados
+        denuncias = annotate_contadores_foro(
+            Denuncia.objects.select_related(
+                'usuario',
+                'item', 
+                'item__categoria',
+                'relacion_empresa',
+                'tiempo',
+                'tipo_empresa'
             ),
-            num_mensajes_total=Count(
-                'foro',
-                filter=Q(foro__admin=admin)
-            )
+            admin
         )
         
         # Aplicar mismos filtros que SimpleDenunciaDataTableAPIView
-        if request.user.is_authenticated:
-            if request.user.rol_categoria:
-                denuncias = denuncias.filter(item__categoria_id=request.user.rol_categoria.id)
+        if user.is_authenticated:
+            if user.rol_categoria:
+                denuncias = denuncias.filter(item__categoria_id=user.rol_categoria.id)
         else:
             user_info = dt_data.get('user_info', {})
             user_type = user_info.get('tipo', 'guest')
@@ -326,19 +564,151 @@ class ExportDenunciasExcelAPIView(APIView):
         # Aplicar búsqueda si existe
         search_value = dt_data.get('search', {}).get('value', '')
         if search_value:
-            denuncias = denuncias.filter(
-                Q(codigo__icontains=search_value) |
-                Q(usuario__nombre__icontains=search_value) |
-                Q(usuario__apellidos__icontains=search_value) |
-                Q(item__enunciado__icontains=search_value) |
-                Q(item__categoria__nombre__icontains=search_value) |
-                Q(descripcion__icontains=search_value) |
-                Q(estado_actual__icontains=search_value)
+            denuncias = buscar_denuncias(
+                denuncias,
+                search_value,
+                extra_q=Q(estado_actual__icontains=search_value)
             )
         
         # Ordenar por fecha descendente
         return denuncias.order_by('-fecha')
     
+    def _nombre_archivo(self, extension):
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        return f'Reporte_Denuncias_{timestamp}.{extension}'
+    
+    def _iterar_filas(self, denuncias_queryset):
+        """Tuplas crudas desde values_list, sin instanciar modelos"""
+        self.filas_exportadas = 0
+        campos = [campo for _, campo in self.RAW_COLUMNS]
+        for fila in denuncias_queryset.values_list(*campos).iterator(chunk_size=self.EXPORT_CHUNK_SIZE):
+            self.filas_exportadas += 1
+            yield fila
+    
+    def _iterar_csv(self, denuncias_queryset):
+        """Genera el CSV en bloques de bytes (con BOM para Excel)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([nombre for nombre, _ in self.RAW_COLUMNS])
+        
+        for i, fila in enumerate(self._iterar_filas(denuncias_queryset), start=1):
+            writer.writerow(fila)
+            if i % 500 == 0:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        
+        yield buffer.getvalue().encode('utf-8')
+    
+    def _iterar_jsonl(self, denuncias_queryset):
+        """Genera un objeto JSON por línea, en bloques de bytes"""
+        nombres = [nombre for nombre, _ in self.RAW_COLUMNS]
+        lineas = []
+        
+        for fila in self._iterar_filas(denuncias_queryset):
+            lineas.append(json.dumps(dict(zip(nombres, fila)), ensure_ascii=False, default=str))
+            if len(lineas) == 500:
+                yield ('\n'.join(lineas) + '\n').encode('utf-8')
+                lineas = []
+        
+        if lineas:
+            yield ('\n'.join(lineas) + '\n').encode('utf-8')
+    
+    def _generar_streaming_crudo(self, denuncias_queryset, formato):
+        """Respuesta CSV/JSONL transmitida mientras se leen las filas"""
+        if formato == 'csv':
+            contenido = itertools.chain([codecs.BOM_UTF8], self._iterar_csv(denuncias_queryset))
+        else:
+            contenido = self._iterar_jsonl(denuncias_queryset)
+        
+        response = StreamingHttpResponse(contenido, content_type=self.EXPORT_FORMATS[formato])
+        response['Content-Disposition'] = f'attachment; filename="{self._nombre_archivo(formato)}"'
+        return response
+    
+    def _escribir_parquet_denuncias(self, denuncias_queryset, destino):
+        """
+        Escribe un archivo Parquet por lotes de EXPORT_CHUNK_SIZE filas
+        
+        Returns:
+            int: Cantidad de denuncias escritas
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError('Exportación Parquet no disponible: pyarrow no está instalado')
+        
+        schema = pa.schema([
+            ('codigo', pa.string()),
+            ('fecha', pa.timestamp('us', tz='UTC')),
+            ('categoria', pa.string()),
+            ('tipo_denuncia', pa.string()),
+            ('usuario_anonimo', pa.bool_()),
+            ('usuario_nombre', pa.string()),
+            ('usuario_apellidos', pa.string()),
+            ('estado', pa.string()),
+            ('relacion_empresa', pa.string()),
+            ('tiempo', pa.string()),
+            ('empresa', pa.string()),
+            ('num_archivos', pa.int64()),
+            ('num_mensajes_leidos', pa.int64()),
+            ('num_mensajes_no_leidos', pa.int64()),
+            ('num_mensajes_total', pa.int64()),
+            ('descripcion', pa.string()),
+            ('descripcion_relacion', pa.string()),
+        ])
+        
+        with pq.ParquetWriter(destino, schema, compression='zstd') as writer:
+            lote = []
+            for fila in self._iterar_filas(denuncias_queryset):
+                lote.append(fila)
+                if len(lote) == self.EXPORT_CHUNK_SIZE:
+                    writer.write_table(pa.Table.from_pylist(
+                        [dict(zip(schema.names, f)) for f in lote], schema=schema
+                    ))
+                    lote = []
+            
+            if lote or not self.filas_exportadas:
+                writer.write_table(pa.Table.from_pylist(
+                    [dict(zip(schema.names, f)) for f in lote], schema=schema
+                ))
+        
+        return self.filas_exportadas
+    
+    def _generar_parquet_denuncias(self, denuncias_queryset):
+        """Parquet necesita escribir su pie al final: se arma en disco y se envía por bloques"""
+        parquet_file = tempfile.TemporaryFile(suffix='.parquet')
+        self._escribir_parquet_denuncias(denuncias_queryset, parquet_file)
+        parquet_file.seek(0)
+        
+        return FileResponse(
+            parquet_file,
+            as_attachment=True,
+            filename=self._nombre_archivo('parquet'),
+            content_type=self.EXPORT_FORMATS['parquet']
+        )
+    
+    def _escribir_exportacion(self, formato, denuncias_queryset, user, destino):
+        """
+        Escribe la exportación en un archivo binario abierto, en cualquier formato
+        
+        Returns:
+            int: Cantidad de denuncias escritas
+        """
+        if formato == 'xlsx':
+            return self._escribir_excel_denuncias(denuncias_queryset, user, destino)
+        elif formato == 'parquet':
+            return self._escribir_parquet_denuncias(denuncias_queryset, destino)
+        elif formato == 'csv':
+            destino.write(codecs.BOM_UTF8)
+            bloques = self._iterar_csv(denuncias_queryset)
+        else:
+            bloques = self._iterar_jsonl(denuncias_queryset)
+        
+        for bloque in bloques:
+            destino.write(bloque)
+        return self.filas_exportadas
+    
     def _parse_request(self, request):
         """Parsear request de forma segura"""
         try:
@@ -373,120 +743,202 @@ class ExportDenunciasExcelAPIView(APIView):
             print(f"Error parsing request: {e}")
             return {}  # ✅ SIEMPRE DEVOLVER DICCIONARIO
     
-    def _generar_excel_denuncias(self, denuncias_queryset, user):
-        """Generar archivo Excel con las denuncias"""
-        # Crear workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Denuncias"
-        
-        # === Estilos ===
-        titulo_font = Font(name='Calibri', size=16, bold=True, color="FFFFFF")
+    def _registrar_estilos_excel(self, wb):
+        """Registra los estilos con nombre compartidos por todas las celdas"""
+        thin_border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
         header_font = Font(name='Calibri', size=11, bold=True)
         normal_font = Font(name='Calibri', size=10)
-        
-        # Colores
-        title_background = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
         header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
         secondary_header_fill = PatternFill(start_color="DCE6F1", end_color="DCE6F1", fill_type="solid")
         alternating_row_fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid")
         
-        # Bordes
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+        estilos = [
+            NamedStyle(
+                name='dn_titulo',
+                font=Font(name='Calibri', size=16, bold=True, color="FFFFFF"),
+                fill=header_fill,
+                border=thin_border,
+                alignment=Alignment(horizontal='center', vertical='center')
+            ),
+            NamedStyle(
+                name='dn_seccion',
+                font=header_font,
+                fill=secondary_header_fill,
+                border=thin_border,
+                alignment=Alignment(horizontal='center', vertical='center')
+            ),
+            NamedStyle(
+                name='dn_etiqueta',
+                font=header_font,
+                fill=secondary_header_fill,
+                border=thin_border,
+                alignment=Alignment(horizontal='right', vertical='center')
+            ),
+            NamedStyle(
+                name='dn_info',
+                font=normal_font,
+                border=thin_border,
+                alignment=Alignment(horizontal='left', vertical='center')
+            ),
+            NamedStyle(
+                name='dn_encabezado',
+                font=header_font,
+                fill=header_fill,
+                border=thin_border,
+                alignment=Alignment(horizontal='center', vertical='center')
+            ),
+            NamedStyle(
+                name='dn_pie',
+                font=Font(name='Calibri', size=9, italic=True),
+                alignment=Alignment(horizontal='center', vertical='center')
+            ),
+        ]
+        
+        # Celdas de datos: texto, números y descripciones, con variante alternada
+        alineaciones_datos = {
+            'dn_dato': Alignment(horizontal='left', vertical='center'),
+            'dn_numero': Alignment(horizontal='center', vertical='center'),
+            'dn_texto': Alignment(horizontal='left', vertical='top', wrap_text=True),
+        }
+        for nombre, alignment in alineaciones_datos.items():
+            estilos.append(NamedStyle(
+                name=nombre, font=normal_font, border=thin_border, alignment=alignment
+            ))
+            estilos.append(NamedStyle(
+                name=f'{nombre}_alt', font=normal_font, border=thin_border,
+                alignment=alignment, fill=alternating_row_fill
+            ))
+        
+        for estilo in estilos:
+            wb.add_named_style(estilo)
+    
+    def _celda(self, ws, value, style):
+        """Celda de solo escritura con un estilo con nombre"""
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+    
+    def _generar_excel_denuncias(self, denuncias_queryset, user):
+        """
+        Generar archivo Excel con las denuncias
+        
+        Usa un workbook de solo escritura: las filas se leen del queryset por
+        bloques y se escriben a disco a medida que se generan, por lo que la
+        memoria no crece con el número de denuncias.
+        """
+        # El archivo se arma en disco y se envía por bloques
+        excel_file = tempfile.TemporaryFile(suffix='.xlsx')
+        self._escribir_excel_denuncias(denuncias_queryset, user, excel_file)
+        excel_file.seek(0)
+        
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f'Reporte_Denuncias_{timestamp}.xlsx'
+        
+        response = FileResponse(
+            excel_file,
+            as_attachment=True,
+            filename=filename,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
         
+        return response
+    
+    def _escribir_excel_denuncias(self, denuncias_queryset, user, destino):
+        """
+        Escribe el reporte Excel en un archivo abierto en modo binario
+        
+        Returns:
+            int: Cantidad de denuncias escritas
+        """
+        total_registros = denuncias_queryset.count()
+        ahora = datetime.datetime.now()
+        num_columnas = 16  # A hasta P
+        
+        # Crear workbook
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Reporte de Denuncias")
+        self._registrar_estilos_excel(wb)
+        
+        # === Ajustar Anchos de Columnas (antes de escribir filas) ===
+        column_widths = {
+            'A': 15,  # Código
+            'B': 12,  # Fecha
+            'C': 20,  # Categoría
+            'D': 30,  # Tipo de Denuncia
+            'E': 25,  # Usuario
+            'F': 10,  # Anónimo
+            'G': 15,  # Estado
+            'H': 20,  # Relación Empresa
+            'I': 15,  # Tiempo
+            'J': 15,  # Empresa
+            'K': 10,  # Archivos
+            'L': 12,  # Msg. Leídos
+            'M': 12,  # Msg. No Leídos
+            'N': 12,  # Total Msg.
+            'O': 40,  # Descripción
+            'P': 40   # Desc. Relación
+        }
+        
+        for col, width in column_widths.items():
+            ws.column_dimensions[col].width = width
+        
         # === Título Principal ===
-        ws['A1'] = "REPORTE DE DENUNCIAS"
-        ws['A1'].font = titulo_font
-        ws['A1'].alignment = Alignment(horizontal='center', vertical='center')
-        ws['A1'].fill = title_background
-        ws.merge_cells('A1:P1')  # Amplio hasta columna P
-        
-        # Aplicar bordes al título
-        for col in range(1, 17):  # A hasta P
-            cell = ws.cell(row=1, column=col)
-            cell.border = thin_border
-        
-        # Establecer altura de fila
         ws.row_dimensions[1].height = 30
+        ws.append(
+            [self._celda(ws, "REPORTE DE DENUNCIAS", 'dn_titulo')] +
+            [self._celda(ws, None, 'dn_titulo') for _ in range(num_columnas - 1)]
+        )
+        ws.merged_cells.add('A1:P1')
         
         # === Información del Reporte ===
-        ws['A2'] = "INFORMACIÓN DEL REPORTE"
-        ws['A2'].font = header_font
-        ws['A2'].fill = secondary_header_fill
-        ws['A2'].alignment = Alignment(horizontal='center', vertical='center')
-        ws.merge_cells('A2:P2')
-        
-        # Fecha de generación
-        ws['A3'] = "Fecha de Generación:"
-        ws['B3'] = datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
-        ws['A4'] = "Usuario:"
-        ws['B4'] = user.username if user.is_authenticated else "Consulta Pública"
-        ws['A5'] = "Total de Registros:"
-        ws['B5'] = denuncias_queryset.count()
-        
-        # Aplicar estilos a información del reporte
-        for row in range(2, 6):
-            for col in range(1, 17):
-                cell = ws.cell(row=row, column=col)
-                cell.border = thin_border
-                if col == 1:  # Columna A - etiquetas
-                    cell.font = header_font
-                    cell.fill = secondary_header_fill
-                    cell.alignment = Alignment(horizontal='right', vertical='center')
-                else:  # Otras columnas
-                    cell.font = normal_font
-                    cell.alignment = Alignment(horizontal='left', vertical='center')
-        
-        # Combinar celdas para valores
-        for row in range(3, 6):
-            ws.merge_cells(f'B{row}:P{row}')
+        ws.append(
+            [self._celda(ws, "INFORMACIÓN DEL REPORTE", 'dn_seccion')] +
+            [self._celda(ws, None, 'dn_info') for _ in range(num_columnas - 1)]
+        )
+        ws.merged_cells.add('A2:P2')
+        
+        info_reporte = [
+            ("Fecha de Generación:", ahora.strftime('%d/%m/%Y %H:%M')),
+            ("Usuario:", user.username if user.is_authenticated else "Consulta Pública"),
+            ("Total de Registros:", total_registros),
+        ]
+        for row, (etiqueta, valor) in enumerate(info_reporte, start=3):
+            ws.append(
+                [self._celda(ws, etiqueta, 'dn_etiqueta'), self._celda(ws, valor, 'dn_info')] +
+                [self._celda(ws, None, 'dn_info') for _ in range(num_columnas - 2)]
+            )
+            # Combinar celdas para valores
+            ws.merged_cells.add(f'B{row}:P{row}')
+        
+        ws.append([])
         
         # === Encabezados de Columnas ===
         header_row = 7
         
         headers = [
-            ('A', 'Código'),
-            ('B', 'Fecha'),
-            ('C', 'Categoría'),
-            ('D', 'Tipo de Denuncia'),
-            ('E', 'Usuario'),
-            ('F', 'Anónimo'),
-            ('G', 'Estado'),
-            ('H', 'Relación Empresa'),
-            ('I', 'Tiempo Ocurrencia'),
-            ('J', 'Empresa'),
-            ('K', 'Archivos'),
-            ('L', 'Msg. Leídos'),
-            ('M', 'Msg. No Leídos'),
-            ('N', 'Total Msg.'),
-            ('O', 'Descripción'),
-            ('P', 'Desc. Relación')
+            'Código', 'Fecha', 'Categoría', 'Tipo de Denuncia', 'Usuario',
+            'Anónimo', 'Estado', 'Relación Empresa', 'Tiempo Ocurrencia',
+            'Empresa', 'Archivos', 'Msg. Leídos', 'Msg. No Leídos',
+            'Total Msg.', 'Descripción', 'Desc. Relación'
         ]
         
-        # Aplicar encabezados
-        for col, text in headers:
-            ws[f'{col}{header_row}'] = text
-            ws[f'{col}{header_row}'].font = header_font
-            ws[f'{col}{header_row}'].border = thin_border
-            ws[f'{col}{header_row}'].fill = header_fill
-            ws[f'{col}{header_row}'].alignment = Alignment(horizontal='center', vertical='center')
-        
         # Establecer altura de encabezado
         ws.row_dimensions[header_row].height = 25
+        ws.append([self._celda(ws, text, 'dn_encabezado') for text in headers])
         
-        # === Datos de las Denuncias ===
-        data_start_row = header_row + 1
+        # Estilo por columna: K-N números, O-P descripciones largas
+        estilos_columnas = ['dn_dato'] * 10 + ['dn_numero'] * 4 + ['dn_texto'] * 2
         
-        for i, denuncia in enumerate(denuncias_queryset):
-            row = data_start_row + i
-            
+        # === Datos de las Denuncias ===
+        filas_escritas = 0
+        for i, denuncia in enumerate(denuncias_queryset.iterator(chunk_size=self.EXPORT_CHUNK_SIZE)):
             # Aplicar fondo alternado
-            row_fill = alternating_row_fill if i % 2 == 1 else None
+            sufijo = '_alt' if i % 2 == 1 else ''
             
             # Formatear fecha
             try:
@@ -496,75 +948,44 @@ class ExportDenunciasExcelAPIView(APIView):
             
             # Datos de la fila
             row_data = [
-                ('A', denuncia.codigo),
-                ('B', fecha_formateada),
-                ('C', denuncia.item.categoria.nombre),
-                ('D', denuncia.item.enunciado),
-                ('E', denuncia.usuario.nombre_completo if not denuncia.usuario.anonimo else 'Anónimo'),
-                ('F', 'Sí' if denuncia.usuario.anonimo else 'No'),
-                ('G', denuncia.estado_actual),
-                ('H', denuncia.relacion_empresa.rol),
-                ('I', denuncia.tiempo.intervalo),
-                ('J', denuncia.tipo_empresa.nombre if denuncia.tipo_empresa else ''),
-                ('K', denuncia.num_archivos),
-                ('L', denuncia.num_mensajes_leidos),
-                ('M', denuncia.num_mensajes_no_leidos),
-                ('N', denuncia.num_mensajes_total),
-                ('O', denuncia.descripcion[:100] + '...' if len(denuncia.descripcion) > 100 else denuncia.descripcion),
-                ('P', (denuncia.descripcion_relacion[:100] + '...' if len(denuncia.descripcion_relacion) > 100 else denuncia.descripcion_relacion) if denuncia.descripcion_relacion else '')
+                denuncia.codigo,
+                fecha_formateada,
+                denuncia.item.categoria.nombre,
+                denuncia.item.enunciado,
+                denuncia.usuario.nombre_completo if not denuncia.usuario.anonimo else 'Anónimo',
+                'Sí' if denuncia.usuario.anonimo else 'No',
+                denuncia.estado_actual,
+                denuncia.relacion_empresa.rol,
+                denuncia.tiempo.intervalo,
+                denuncia.tipo_empresa.nombre if denuncia.tipo_empresa else '',
+                denuncia.num_archivos,
+                denuncia.num_mensajes_leidos,
+                denuncia.num_mensajes_no_leidos,
+                denuncia.num_mensajes_total,
+                denuncia.descripcion[:100] + '...' if len(denuncia.descripcion) > 100 else denuncia.descripcion,
+                (denuncia.descripcion_relacion[:100] + '...' if len(denuncia.descripcion_relacion) > 100 else denuncia.descripcion_relacion) if denuncia.descripcion_relacion else ''
             ]
             
-            # Aplicar datos y estilos
-            for col, value in row_data:
-                cell = ws[f'{col}{row}']
-                cell.value = value
-                cell.font = normal_font
-                cell.border = thin_border
-                if row_fill:
-                    cell.fill = row_fill
-                
-                # Alineación específica por tipo de dato
-                if col in ['K', 'L', 'M', 'N']:  # Números
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                elif col in ['O', 'P']:  # Descripciones largas
-                    cell.alignment = Alignment(horizontal='left', vertical='top', wrap_text=True)
-                else:
-                    cell.alignment = Alignment(horizontal='left', vertical='center')
+            ws.append([
+                self._celda(ws, value, f'{estilo}{sufijo}')
+                for value, estilo in zip(row_data, estilos_columnas)
+            ])
+            filas_escritas += 1
         
         # === Resumen Final ===
-        summary_row = data_start_row + denuncias_queryset.count() + 2
-        
-        ws[f'A{summary_row}'] = f"Reporte generado automáticamente el {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}"
-        ws[f'A{summary_row}'].font = Font(name='Calibri', size=9, italic=True)
-        ws[f'A{summary_row}'].alignment = Alignment(horizontal='center', vertical='center')
-        ws.merge_cells(f'A{summary_row}:P{summary_row}')
-        
-        # === Ajustar Anchos de Columnas ===
-        column_widths = {
-            'A': 15,  # Código
-            'B': 12,  # Fecha
-            'C': 20,  # Categoría
-            'D': 30,  # Tipo de Denuncia
-            'E': 25,  # Usuario
-            'F': 10,  # Anónimo
-            'G': 15,  # Estado
-            'H': 20,  # Relación Empresa
-            'I': 15,  # Tiempo
-            'J': 15,  # Empresa
-            'K': 10,  # Archivos
-            'L': 12,  # Msg. Leídos
-            'M': 12,  # Msg. No Leídos
-            'N': 12,  # Total Msg.
-            'O': 40,  # Descripción
-            'P': 40   # Desc. Relación
-        }
+        ws.append([])
+        summary_row = header_row + 1 + filas_escritas + 1
         
-        for col, width in column_widths.items():
-            ws.column_dimensions[col].width = width
+        ws.append([self._celda(
+            ws,
+            f"Reporte generado automáticamente el {ahora.strftime('%d/%m/%Y %H:%M')}",
+            'dn_pie'
+        )])
+        ws.merged_cells.add(f'A{summary_row}:P{summary_row}')
         
         # === Configuración de Página ===
-        ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
-        ws.page_setup.paperSize = ws.PAPERSIZE_LETTER
+        ws.page_setup.orientation = Worksheet.ORIENTATION_LANDSCAPE
+        ws.page_setup.paperSize = Worksheet.PAPERSIZE_LETTER
         ws.page_setup.fitToPage = True
         ws.page_setup.fitToWidth = 1
         ws.page_setup.fitToHeight = 0  # Permitir múltiples páginas en altura
@@ -574,20 +995,9 @@ class ExportDenunciasExcelAPIView(APIView):
         ws.page_margins.top = 0.5
         ws.page_margins.bottom = 0.5
         
-        # === Generar nombre de archivo y guardar ===
-        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'Reporte_Denuncias_{timestamp}.xlsx'
+        wb.save(destino)
         
-        # Crear respuesta HTTP
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Guardar el workbook directamente en la respuesta
-        wb.save(response)
-        
-        return response
+        return filas_escritas
 
 
 class DataTableActions(APIView):
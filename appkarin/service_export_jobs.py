@@ -0,0 +1,237 @@
+# service_export_jobs.py - Exportaciones de denuncias en segundo plano
+from rest_framework.views import APIView
+from django.http import JsonResponse, FileResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from django.core.files import File
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import AdminDenuncias, ExportJob
+from .service_datatable import ExportDenunciasExcelAPIView
+from datetime import timedelta
+import hashlib
+import json
+import tempfile
+
+
+# Content-type por formato de exportación (xlsx, csv, jsonl, parquet)
+FORMATOS_EXPORTACION = ExportDenunciasExcelAPIView.EXPORT_FORMATS
+
+
+def calcular_huella(usuario_id, formato, filtros):
+    """Hash estable de los parámetros de una exportación"""
+    contenido = json.dumps(
+        {'usuario': usuario_id, 'formato': formato, 'filtros': filtros},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def encolar_exportacion(usuario, formato, filtros):
+    """
+    Crea un trabajo de exportación o reutiliza uno idéntico reciente.
+    
+    Returns:
+        tuple: (ExportJob, bool reutilizado)
+    """
+    huella = calcular_huella(usuario.id, formato, filtros)
+    limite = timezone.now() - timedelta(seconds=settings.EXPORT_JOB_REUSE_SECONDS)
+    
+    # Un trabajo colgado (su worker cayó) no se reutiliza aunque aún no se haya reclamado
+    existente = ExportJob.objects.filter(
+        huella=huella,
+        fecha_creacion__gte=limite,
+        estado__in=['PENDIENTE', 'PROCESANDO', 'COMPLETADO']
+    ).exclude(
+        Q(estado='PROCESANDO') & Q(fecha_inicio__lt=_limite_colgados())
+    ).order_by('-fecha_creacion').first()
+    
+    if existente and (existente.estado != 'COMPLETADO' or existente.archivo):
+        return existente, True
+    
+    job = ExportJob.objects.create(
+        usuario=usuario,
+        formato=formato,
+        filtros=filtros,
+        huella=huella
+    )
+    return job, False
+
+
+def _limite_colgados():
+    return timezone.now() - timedelta(seconds=settings.EXPORT_JOB_STALE_SECONDS)
+
+
+def reclamar_trabajos_colgados():
+    """
+    Marca como ERROR los trabajos que quedaron en PROCESANDO más de
+    EXPORT_JOB_STALE_SECONDS (el worker murió a mitad de la exportación).
+    No se reencolan: si la caída la provocó el propio trabajo se repetiría
+    sin fin; el usuario puede volver a solicitarla.
+    
+    Returns:
+        int: Trabajos reclamados
+    """
+    return ExportJob.objects.filter(
+        estado='PROCESANDO',
+        fecha_inicio__lt=_limite_colgados()
+    ).update(
+        estado='ERROR',
+        error='La exportación se interrumpió, vuelva a solicitarla',
+        fecha_fin=timezone.now()
+    )
+
+
+def tomar_siguiente_trabajo():
+    """
+    Reserva el trabajo pendiente más antiguo (SKIP LOCKED permite varios workers)
+    
+    Returns:
+        ExportJob o None si la cola está vacía
+    """
+    with transaction.atomic():
+        job = ExportJob.objects.select_for_update(skip_locked=True).filter(
+            estado='PENDIENTE'
+        ).order_by('fecha_creacion').first()
+        
+        if not job:
+            return None
+        
+        job.estado = 'PROCESANDO'
+        job.fecha_inicio = timezone.now()
+        job.save(update_fields=['estado', 'fecha_inicio'])
+    
+    return job
+
+
+def procesar_trabajo(job):
+    """Genera el archivo de un trabajo y lo guarda en EXPORTS_ROOT"""
+    try:
+        usuario = AdminDenuncias.objects.select_related('rol_categoria').get(id=job.usuario_id)
+        exportador = ExportDenunciasExcelAPIView()
+        denuncias = exportador._filtrar_denuncias(usuario, usuario, job.filtros)
+        
+        with tempfile.TemporaryFile() as destino:
+            job.total_registros = exportador._escribir_exportacion(
+                job.formato, denuncias, usuario, destino
+            )
+            destino.seek(0)
+            
+            timestamp = timezone.localtime().strftime('%Y%m%d_%H%M%S')
+            job.archivo.save(
+                f'Reporte_Denuncias_{timestamp}_{job.id.hex[:8]}.{job.formato}',
+                File(destino),
+                save=False
+            )
+        
+        job.estado = 'COMPLETADO'
+        print(f"✅ Exportación {job.id} completada ({job.total_registros} registros)")
+        
+    except Exception as e:
+        print(f"❌ Error en exportación {job.id}: {str(e)}")
+        job.estado = 'ERROR'
+        job.error = str(e)
+    
+    job.fecha_fin = timezone.now()
+    job.save(update_fields=['estado', 'archivo', 'total_registros', 'error', 'fecha_fin'])
+    return job
+
+
+def limpiar_exportaciones_antiguas():
+    """Elimina archivos y registros de exportaciones vencidas"""
+    limite = timezone.now() - timedelta(hours=settings.EXPORT_JOB_RETENTION_HOURS)
+    eliminados = 0
+    
+    for job in ExportJob.objects.filter(fecha_creacion__lt=limite).iterator():
+        try:
+            if job.archivo:
+                job.archivo.delete(save=False)
+        except Exception as e:
+            print(f"⚠️ No se pudo eliminar el archivo de {job.id}: {e}")
+        job.delete()
+        eliminados += 1
+    
+    return eliminados
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ExportJobAPIView(APIView):
+    """
+    API de exportaciones asíncronas
+    
+    - POST   /api/datatable/denuncias/export/jobs/                 Encolar exportación
+    - GET    /api/datatable/denuncias/export/jobs/{id}/            Estado del trabajo
+    - GET    /api/datatable/denuncias/export/jobs/{id}/download/   Descargar archivo
+    """
+    
+    def post(self, request, *args, **kwargs):
+        try:
+            if not request.user.is_authenticated:
+                return JsonResponse({'error': 'Usuario no autenticado'}, status=401)
+            
+            data = ExportDenunciasExcelAPIView()._parse_request(request)
+            formato = data.get('format', 'xlsx')
+            
+            if formato not in FORMATOS_EXPORTACION:
+                return JsonResponse({'error': f'Formato no válido: {formato}'}, status=400)
+            
+            filtros = {
+                'search': data.get('search', {}),
+                'user_info': data.get('user_info', {})
+            }
+            
+            job, reutilizado = encolar_exportacion(request.user, formato, filtros)
+            
+            return JsonResponse({
+                'success': True,
+                'reutilizado': reutilizado,
+                **self._serializar(job)
+            }, status=200 if reutilizado else 202)
+            
+        except Exception as e:
+            print(f"Error en ExportJobAPIView: {str(e)}")
+            return JsonResponse({'error': f'Error al encolar exportación: {str(e)}'}, status=500)
+    
+    def get(self, request, job_id=None, action=None):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Usuario no autenticado'}, status=401)
+        
+        job = ExportJob.objects.filter(id=job_id, usuario_id=request.user.id).first()
+        if not job:
+            return JsonResponse({'error': 'Exportación no encontrada'}, status=404)
+        
+        if action == 'download':
+            if job.estado != 'COMPLETADO' or not job.archivo:
+                return JsonResponse({
+                    'error': 'La exportación aún no está disponible',
+                    'estado': job.estado
+                }, status=409)
+            
+            return FileResponse(
+                job.archivo.open('rb'),
+                as_attachment=True,
+                filename=job.archivo.name,
+                content_type=FORMATOS_EXPORTACION[job.formato]
+            )
+        
+        return JsonResponse({'success': True, **self._serializar(job)})
+    
+    def _serializar(self, job):
+        data = {
+            'id': str(job.id),
+            'estado': job.estado,
+            'formato': job.formato,
+            'total_registros': job.total_registros,
+            'fecha_creacion': job.fecha_creacion.isoformat(),
+            'fecha_fin': job.fecha_fin.isoformat() if job.fecha_fin else None,
+            'status_url': f'/api/datatable/denuncias/export/jobs/{job.id}/',
+            'download_url': None,
+        }
+        if job.estado == 'COMPLETADO':
+            data['download_url'] = f'/api/datatable/denuncias/export/jobs/{job.id}/download/'
+        if job.estado == 'ERROR':
+            data['error'] = job.error
+        return data
@@ -6,22 +6,24 @@ from django.utils.decorators import method_decorator
 from django.db import transaction
 from django.shortcuts import redirect
 from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from .models import (
-    Categoria, Item, RelacionEmpresa, Tiempo, Usuario, 
-    Denuncia, Empresa, Archivo
-)
+from .models import Usuario, Denuncia, Archivo
+from .s3_uploads import subir_archivos, transfer_config, mover_desde_staging, eliminar_sin_referencias
+from .upload_staging import guardar_en_staging, clave_staging_s3, StagingLleno
+from .s3_client import get_s3_client
+from .catalogo import obtener_catalogo
+from .wizard_state import estado_wizard, emitir_token, modo_token, reservar_envio, liberar_envio
 from .serializers import (
     ItemSelectionSerializer, DenunciaCreateSerializer, 
-    UsuarioCreateSerializer,
-    CategoriaWithItemsSerializer, RelacionEmpresaSerializer, 
-    TiempoSerializer, EmpresaSerializer
+    UsuarioCreateSerializer, EmpresaSerializer
 )
 
-import time
 import secrets
 import string
+import hashlib
 import os
 import uuid
 import mimetypes
@@ -133,6 +135,7 @@ class ServiceProcessDenuncia(APIView):
         
         Steps disponibles:
         - items: Seleccionar tipo de denuncia (Paso 1)
+        - upload-slots: Solicitar URLs firmadas para subir adjuntos directo a S3
         - wizard: Completar información de denuncia (Paso 2)
         - user: Registrar usuario (Paso 3)
         - validate-rut: Validar RUT chileno
@@ -146,6 +149,8 @@ class ServiceProcessDenuncia(APIView):
                 return self._process_initialize(request)
             elif step == 'items':
                 return self._process_items(request)
+            elif step == 'upload-slots':
+                return self._process_upload_slots(request)
             elif step == 'wizard':
                 return self._process_wizard(request)
             elif step == 'user':
@@ -168,6 +173,11 @@ class ServiceProcessDenuncia(APIView):
                 'message': f'Error en proceso: {str(e)}'
             }, status=500)
     
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # Modo token: cada paso devuelve el estado actualizado del wizard
+        return emitir_token(request, response)
+    
     def get(self, request, step=None):
         """
         GET /api/denuncia/process/{step}/
@@ -189,10 +199,11 @@ class ServiceProcessDenuncia(APIView):
         """
         Inicializa el proceso de denuncia seleccionando la empresa
         """
+        estado = estado_wizard(request)
         empresa = request.data.get('empresa', '')
         empresa = "".join(empresa.split())
     
-        empresa_filtrada = Empresa.objects.filter(nombre=empresa).first()
+        empresa_filtrada = obtener_catalogo().empresa_por_nombre(empresa)
 
         if not empresa_filtrada:
             return Response({
@@ -200,7 +211,10 @@ class ServiceProcessDenuncia(APIView):
                 'message': 'Empresa no encontrada'
             }, status=404)
 
-        request.session['empresa_id'] = empresa_filtrada.id
+        estado['empresa_id'] = empresa_filtrada.id
+        if modo_token():
+            # Identifica este wizard para aceptar el paso final una sola vez
+            estado['wizard_id'] = uuid.uuid4().hex
         
         return Response({
             'success': True,
@@ -213,18 +227,17 @@ class ServiceProcessDenuncia(APIView):
         """
         Procesa la selección del tipo de denuncia (Paso 1)
         """
+        estado = estado_wizard(request)
         serializer = ItemSelectionSerializer(data=request.data)
         
         if serializer.is_valid():
             item = serializer.get_validated_item()
             
             # Guardar en sesión
-            request.session['denuncia_item_id'] = item.id
-            request.session['denuncia_item_nombre'] = item.enunciado
-            request.session['denuncia_categoria_id'] = item.categoria.id
-            request.session['denuncia_categoria_nombre'] = item.categoria.nombre
-            request.session.modified = True
-            request.session.save()
+            estado['denuncia_item_id'] = item.id
+            estado['denuncia_item_nombre'] = item.enunciado
+            estado['denuncia_categoria_id'] = item.categoria_id
+            estado['denuncia_categoria_nombre'] = item.categoria_nombre
             
             return Response({
                 'success': True,
@@ -232,7 +245,7 @@ class ServiceProcessDenuncia(APIView):
                 'data': {
                     'item_id': item.id,
                     'item_nombre': item.enunciado,
-                    'categoria': item.categoria.nombre
+                    'categoria': item.categoria_nombre
                 },
                 'redirect_url': '/denuncia/Paso2/'
             })
@@ -242,6 +255,162 @@ class ServiceProcessDenuncia(APIView):
             'errors': serializer.errors
         }, status=400)
     
+    # ===== PASO 2: SUBIDA DIRECTA DE ADJUNTOS A S3 =====
+    def _process_upload_slots(self, request):
+        """
+        Entrega un presigned POST por archivo para que el navegador lo suba
+        directamente al prefijo de staging del bucket (sin pasar por Django).
+        
+        Body:
+            archivos: [{nombre, size, type}, ...]
+        """
+        estado = estado_wizard(request)
+        if not estado.get('denuncia_item_id'):
+            return Response({
+                'success': False,
+                'message': 'Debe seleccionar un tipo de denuncia primero',
+                'redirect': '/denuncia/Paso1/'
+            }, status=400)
+        
+        archivos = request.data.get('archivos') or []
+        if not isinstance(archivos, list):
+            return Response({
+                'success': False,
+                'message': 'Formato de archivos inválido'
+            }, status=400)
+        
+        if len(archivos) > settings.UPLOAD_MAX_ARCHIVOS:
+            return Response({
+                'success': False,
+                'message': f'Se permiten hasta {settings.UPLOAD_MAX_ARCHIVOS} archivos adjuntos'
+            }, status=400)
+        
+        archivos_errors = []
+        for archivo in archivos:
+            try:
+                resultado = self._validate_file_meta(
+                    os.path.basename(str(archivo.get('nombre', ''))),
+                    int(archivo.get('size', 0)),
+                    archivo.get('type', '')
+                )
+            except (AttributeError, TypeError, ValueError):
+                resultado = {'success': False, 'message': 'Datos de archivo inválidos'}
+            if not resultado['success']:
+                archivos_errors.append(resultado['message'])
+        
+        if archivos_errors:
+            return Response({
+                'success': False,
+                'message': 'Error en archivos adjuntos',
+                'errors': archivos_errors
+            }, status=400)
+        
+        s3_client = get_s3_client()
+        slots = []
+        respuesta = []
+        
+        for archivo in archivos:
+            nombre = os.path.basename(str(archivo['nombre']))
+            size = int(archivo['size'])
+            content_type = archivo['type']
+            staging_key = clave_staging_s3(nombre)
+            
+            # El tamaño y tipo declarados quedan firmados en la política
+            presigned = s3_client.generate_presigned_post(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                Key=staging_key,
+                Fields={'Content-Type': content_type},
+                Conditions=[
+                    {'Content-Type': content_type},
+                    ['content-length-range', size, size],
+                ],
+                ExpiresIn=settings.UPLOAD_SLOT_EXPIRES
+            )
+            
+            slots.append({
+                'staging_key': staging_key,
+                'original_name': nombre,
+                'size': size,
+                'type': content_type
+            })
+            respuesta.append({
+                'nombre': nombre,
+                'staging_key': staging_key,
+                'url': presigned['url'],
+                'fields': presigned['fields']
+            })
+        
+        estado['archivos_staging_slots'] = slots
+        estado.modified = True
+        
+        return Response({
+            'success': True,
+            'data': {'slots': respuesta}
+        })
+    
+    def _subir_a_staging_s3(self, archivos_procesados):
+        """
+        Sube archivos recibidos en el formulario al prefijo de staging del bucket
+        (modo token). Retorna entradas con el formato de archivos_staging.
+        Si el wizard se abandona, el janitor (limpiar_staging) los elimina.
+        """
+        s3_client = get_s3_client()
+        config = transfer_config()
+        archivos_staging = []
+        
+        for archivo_info in archivos_procesados:
+            nombre = os.path.basename(archivo_info['nombre'])
+            staging_key = clave_staging_s3(nombre)
+            archivo_info['file'].seek(0)
+            s3_client.upload_fileobj(
+                archivo_info['file'], settings.AWS_STORAGE_BUCKET_NAME, staging_key,
+                ExtraArgs={'ContentType': archivo_info['type']}, Config=config
+            )
+            archivos_staging.append({
+                'staging_key': staging_key,
+                'original_name': nombre,
+                'size': archivo_info['size'],
+                'type': archivo_info['type']
+            })
+            print(f"✅ Archivo subido a staging: {staging_key}")
+        
+        return archivos_staging
+    
+    def _confirmar_archivos_staging(self, request, staging_keys):
+        """
+        Verifica que los archivos declarados en upload-slots existan en staging
+        (head_object: sólo metadatos) y retorna (confirmados, errores)
+        """
+        estado = estado_wizard(request)
+        slots = {
+            slot['staging_key']: slot
+            for slot in estado.get('archivos_staging_slots', [])
+        }
+        
+        confirmados = []
+        errores = []
+        s3_client = get_s3_client()
+        
+        for staging_key in staging_keys:
+            slot = slots.get(staging_key)
+            if not slot:
+                errores.append('Archivo adjunto no reconocido')
+                continue
+            try:
+                head = s3_client.head_object(
+                    Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                    Key=staging_key
+                )
+            except Exception:
+                errores.append(f"El archivo {slot['original_name']} no se subió correctamente")
+                continue
+            if head.get('ContentLength') != slot['size']:
+                errores.append(f"El archivo {slot['original_name']} no coincide con el tamaño declarado")
+                continue
+            confirmados.append(slot)
+        
+        return confirmados, errores
+    
     # ===== PASO 2: WIZARD DE DENUNCIA CON ARCHIVOS =====
     @transaction.atomic
     def _process_wizard(self, request):
@@ -249,12 +418,13 @@ class ServiceProcessDenuncia(APIView):
         Procesa la información del wizard de denuncia (Paso 2) incluyendo archivos
         Guarda archivos temporalmente para procesarlos en el siguiente paso
         """
+        estado = estado_wizard(request)
         
         archivos_temp_paths = []  
         
         try:
             # Verificar que haya item seleccionado
-            item_id = request.session.get('denuncia_item_id')
+            item_id = estado.get('denuncia_item_id')
             if not item_id:
                 return Response({
                     'success': False,
@@ -279,8 +449,31 @@ class ServiceProcessDenuncia(APIView):
                 archivos_procesados = []
                 archivos_errors = []
                 
+                # Adjuntos ya subidos directo a S3 (presigned POST)
+                if hasattr(request.data, 'getlist'):
+                    staging_keys = request.data.getlist('archivos_staging[]')
+                else:
+                    staging_keys = request.data.get('archivos_staging', [])
+                
                 archivos = request.FILES.getlist('archivos[]')
                 
+                if len(staging_keys) + len(archivos) > settings.UPLOAD_MAX_ARCHIVOS:
+                    return Response({
+                        'success': False,
+                        'message': f'Se permiten hasta {settings.UPLOAD_MAX_ARCHIVOS} archivos adjuntos'
+                    }, status=400)
+                
+                archivos_staging = []
+                if staging_keys:
+                    archivos_staging, archivos_errors = self._confirmar_archivos_staging(request, staging_keys)
+                    if archivos_errors:
+                        return Response({
+                            'success': False,
+                            'message': 'Error en archivos adjuntos',
+                            'errors': archivos_errors
+                        }, status=400)
+                estado['archivos_staging'] = archivos_staging
+                
                 if archivos and len(archivos) > 0:
                     for archivo in archivos:
                         try:
@@ -308,61 +501,72 @@ class ServiceProcessDenuncia(APIView):
                             'errors': archivos_errors
                         }, status=400)
                 
+                if archivos_procesados and modo_token():
+                    # Sin estado en el servidor ningún nodo guarda el archivo en disco:
+                    # va al staging del bucket, igual que una subida directa
+                    archivos_staging = archivos_staging + self._subir_a_staging_s3(archivos_procesados)
+                    estado['archivos_staging'] = archivos_staging
+                    archivos_procesados = []
+                
                 if archivos_procesados:
+                    if not estado.session_key:
+                        estado.save()
+                    
                     for archivo_info in archivos_procesados:
                         archivo = archivo_info['file']
-                        temp_filename = f"temp_{uuid.uuid4()}_{archivo.name}"
-                        temp_path = os.path.join(settings.MEDIA_ROOT, temp_filename)
                         
                         try:
-                            with open(temp_path, 'wb+') as destination:
-                                for chunk in archivo.chunks():
-                                    destination.write(chunk)
+                            # Volumen de staging dedicado (no el media servido por nginx)
+                            temp_path, sha256 = guardar_en_staging(estado.session_key, archivo)
                             
                             archivos_temp_paths.append({
                                 'temp_path': temp_path,
+                                'sha256': sha256,
                                 'original_name': archivo.name,
                                 'size': archivo.size,
                                 'type': archivo.content_type
                             })
-                            print(f"✅ Archivo guardado temporalmente: {temp_filename}")
+                            print(f"✅ Archivo guardado temporalmente: {temp_path}")
+                        except StagingLleno as e:
+                            self._cleanup_temp_files([a['temp_path'] for a in archivos_temp_paths])
+                            return Response({
+                                'success': False,
+                                'message': str(e)
+                            }, status=503)
                         except Exception as e:
                             print(f"❌ Error guardando archivo temporalmente: {str(e)}")
                             self._cleanup_temp_files([a['temp_path'] for a in archivos_temp_paths])
                             raise
                     
-                    request.session['archivos_temp_paths'] = archivos_temp_paths
+                    estado['archivos_temp_paths'] = archivos_temp_paths
                     print(f"✅ {len(archivos_temp_paths)} archivos guardados temporalmente")
                 
                 
                 validated_data = serializer.validated_data
     
-                request.session['denuncia_relacion_id'] = validated_data['relacion_empresa_id']
-                request.session['denuncia_relacion'] = RelacionEmpresa.objects.get(
-                    id=validated_data['relacion_empresa_id']
-                ).rol
+                estado['denuncia_relacion_id'] = validated_data['relacion_empresa_id']
+                catalogo = obtener_catalogo()
+                estado['denuncia_relacion'] = catalogo.relacion(validated_data['relacion_empresa_id']).rol
                 
                 if validated_data.get('descripcion_relacion'):
-                    request.session['descripcion_relacion'] = validated_data['descripcion_relacion']
+                    estado['descripcion_relacion'] = validated_data['descripcion_relacion']
                 
-                request.session['denuncia_tiempo_id'] = validated_data['tiempo_id']
-                request.session['denuncia_tiempo'] = Tiempo.objects.get(
-                    id=validated_data['tiempo_id']
-                ).intervalo
+                estado['denuncia_tiempo_id'] = validated_data['tiempo_id']
+                estado['denuncia_tiempo'] = catalogo.tiempo(validated_data['tiempo_id']).intervalo
                 
-                request.session['denuncia_descripcion'] = validated_data['descripcion']
+                estado['denuncia_descripcion'] = validated_data['descripcion']
                 
-                request.session.modified = True
+                estado.modified = True
                 
                 
                 return Response({
                     'success': True,
                     'message': 'Información de denuncia procesada',
                     'data': {
-                        'relacion': request.session.get('denuncia_relacion'),
-                        'tiempo': request.session.get('denuncia_tiempo'),
+                        'relacion': estado.get('denuncia_relacion'),
+                        'tiempo': estado.get('denuncia_tiempo'),
                         'descripcion': validated_data['descripcion'][:100] + '...',
-                        'archivos_count': len(archivos_procesados)
+                        'archivos_count': len(archivos_procesados) + len(archivos_staging)
                     },
                     'redirect_url': '/denuncia/Paso3/'
                 })
@@ -396,6 +600,7 @@ class ServiceProcessDenuncia(APIView):
         Procesa el registro de usuario y crea la denuncia final (Paso 3)
         Recupera archivos temporales, los sube a S3 y los elimina localmente
         """
+        estado = estado_wizard(request)
 
         archivos_subidos = []  
         
@@ -410,7 +615,7 @@ class ServiceProcessDenuncia(APIView):
             
             missing_keys = []
             for key in required_session_keys:
-                if not request.session.get(key):
+                if not estado.get(key):
                     missing_keys.append(key)
                     print(f"❌ Falta en sesión: {key}")
             
@@ -454,12 +659,19 @@ class ServiceProcessDenuncia(APIView):
             
             if serializer.is_valid():
                 
+                if modo_token() and estado.get('empresa_id') and not reservar_envio(estado):
+                    return Response({
+                        'success': False,
+                        'message': 'Esta denuncia ya fue enviada',
+                        'redirect': '/denuncia/'
+                    }, status=409)
+                
                 usuario = serializer.update_or_create()
             
                 codigo_denuncia = self._generar_codigo_anonimo()
                 
                 
-                empresa_id = request.session.get('empresa_id')
+                empresa_id = estado.get('empresa_id')
                 if not empresa_id:
                     print("❌ No hay empresa_id en sesión")
                     self._cleanup_temp_files_from_session(request)
@@ -473,63 +685,60 @@ class ServiceProcessDenuncia(APIView):
                     codigo=codigo_denuncia,
                     tipo_empresa_id=empresa_id,
                     usuario=usuario,
-                    item_id=request.session.get('denuncia_item_id'),
-                    relacion_empresa_id=request.session.get('denuncia_relacion_id'),
-                    tiempo_id=request.session.get('denuncia_tiempo_id'),
-                    descripcion=request.session.get('denuncia_descripcion'),
-                    descripcion_relacion=request.session.get('descripcion_relacion', ''),
+                    item_id=estado.get('denuncia_item_id'),
+                    relacion_empresa_id=estado.get('denuncia_relacion_id'),
+                    tiempo_id=estado.get('denuncia_tiempo_id'),
+                    descripcion=estado.get('denuncia_descripcion'),
+                    descripcion_relacion=estado.get('descripcion_relacion', ''),
                     estado_actual='PENDIENTE'
                 )
                 
-                request.session['codigo'] = codigo_denuncia
+                estado['codigo'] = codigo_denuncia
                 
                 archivos_guardados = []
-                archivos_temp_paths = request.session.get('archivos_temp_paths', [])
+                archivos_temp_paths = estado.get('archivos_temp_paths', [])
                 
                 if archivos_temp_paths:
                     
-                    import boto3
-                    from botocore.config import Config
+                    s3_client = get_s3_client()
+                    
+                    subidas = [
+                        {
+                            'archivo_info': archivo_info,
+                            'path': archivo_info['temp_path'],
+                            'nombre': archivo_info['original_name'],
+                            'sha256': archivo_info.get('sha256'),
+                            'content_type': archivo_info['type']
+                        }
+                        for archivo_info in archivos_temp_paths
+                        if os.path.exists(archivo_info['temp_path'])
+                    ]
                     
-                    s3_client = boto3.client(
-                        's3',
-                        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-                        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                        config=Config(signature_version='s3v4')
-                    )
+                    # Subida multipart en paralelo; un contenido repetido se sube una vez
+                    resultados = subir_archivos(s3_client, subidas)
                     
-                    for archivo_info in archivos_temp_paths:
-                        temp_path = archivo_info['temp_path']
+                    for subida, error in zip(subidas, resultados):
+                        archivo_info = subida['archivo_info']
+                        temp_path = subida['path']
+                        s3_key = subida['key']
                         
                         try:
-                            if not os.path.exists(temp_path):
-                                continue
-                            
-                            with open(temp_path, 'rb') as f:
-                                file_content = f.read()
+                            if error:
+                                raise error
                             
-                            s3_key = f"{denuncia.codigo}/{archivo_info['original_name']}"
-                            
-                            s3_client.put_object(
-                                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                                Key=s3_key,
-                                Body=file_content,
-                                ContentType=archivo_info['type'],
-                                ACL='public-read'
-                            )
-                            
-                            archivos_subidos.append(s3_key)
+                            if not subida['reutilizado']:
+                                archivos_subidos.append(s3_key)
                             
                             url_publica = f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{s3_key}"
                             
-                            archivo_obj = Archivo.objects.create(
+                            archivo_obj = Archivo(
                                 denuncia=denuncia,
                                 nombre=archivo_info['original_name'][:250],
                                 descripción=f"Archivo adjunto a denuncia {denuncia.codigo}"[:250],
                                 archivo=s3_key,  
                                 url=url_publica,  
-                                Peso=archivo_info['size']  
+                                Peso=archivo_info['size'],
+                                hash_contenido=subida['sha256']
                             )
                             
                             archivos_guardados.append(archivo_obj)
@@ -546,7 +755,53 @@ class ServiceProcessDenuncia(APIView):
                                     print(f"🗑️ Archivo temporal eliminado: {temp_path}")
                             except Exception as e:
                                 print(f"⚠️ No se pudo eliminar archivo temporal {temp_path}: {e}")
+                
+                archivos_staging = estado.get('archivos_staging', [])
+                
+                if archivos_staging:
+                    s3_client = get_s3_client()
                     
+                    for archivo_info in archivos_staging:
+                        staging_key = archivo_info['staging_key']
+                        
+                        try:
+                            # Se hashea leyendo staging; si el contenido ya existe no se copia
+                            subida = mover_desde_staging(s3_client, staging_key, archivo_info['type'])
+                            s3_key = subida['key']
+                            
+                            if not subida['reutilizado']:
+                                archivos_subidos.append(s3_key)
+                            
+                            url_publica = f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{s3_key}"
+                            
+                            archivo_obj = Archivo(
+                                denuncia=denuncia,
+                                nombre=archivo_info['original_name'][:250],
+                                descripción=f"Archivo adjunto a denuncia {denuncia.codigo}"[:250],
+                                archivo=s3_key,  
+                                url=url_publica,  
+                                Peso=archivo_info['size'],
+                                hash_contenido=subida['sha256']
+                            )
+                            
+                            archivos_guardados.append(archivo_obj)
+                            
+                            try:
+                                s3_client.delete_object(
+                                    Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                                    Key=staging_key
+                                )
+                            except Exception as e:
+                                print(f"⚠️ No se pudo eliminar {staging_key} de staging: {e}")
+                            
+                        except Exception as e:
+                            print(f"❌ Error procesando archivo {staging_key}: {e}")
+                            import traceback
+                            traceback.print_exc()
+                
+                # Un solo INSERT para todos los adjuntos de la denuncia
+                if archivos_guardados:
+                    Archivo.crear_lote(archivos_guardados)
                 
                 self._limpiar_sesion_denuncia(request)
                 
@@ -580,28 +835,13 @@ class ServiceProcessDenuncia(APIView):
             traceback.print_exc()
             
             self._cleanup_temp_files_from_session(request)
+            if modo_token():
+                liberar_envio(estado)
 
             if archivos_subidos:
                 try:
-                    import boto3
-                    from botocore.config import Config
-                    
-                    s3_client = boto3.client(
-                        's3',
-                        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-                        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                        config=Config(signature_version='s3v4')
-                    )
-                    
-                    for s3_key in archivos_subidos:
-                        try:
-                            s3_client.delete_object(
-                                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                                Key=s3_key
-                            )
-                        except Exception as delete_error:
-                            print(f"⚠️ No se pudo eliminar {s3_key} de S3: {delete_error}")
+                    # Sólo los objetos que ningún Archivo llegó a referenciar
+                    eliminar_sin_referencias(get_s3_client(), archivos_subidos)
                 except Exception as cleanup_error:
                     print(f"⚠️ Error en limpieza de S3: {cleanup_error}")
             
@@ -620,26 +860,43 @@ class ServiceProcessDenuncia(APIView):
         Returns:
             dict: {'success': bool, 'message': str}
         """
-        if archivo.size > self.MAX_FILE_SIZE:
+        return self._validate_file_meta(archivo.name, archivo.size, archivo.content_type)
+    
+    def _validate_file_meta(self, nombre, size, content_type):
+        """
+        Valida nombre, tamaño y tipo declarados de un archivo
+        (también se usa antes de firmar una subida directa a S3)
+        
+        Returns:
+            dict: {'success': bool, 'message': str}
+        """
+        if not nombre:
+            return {
+                'success': False,
+                'message': 'Nombre de archivo requerido'
+            }
+        
+        if size <= 0 or size > self.MAX_FILE_SIZE:
             return {
                 'success': False,
-                'message': f'El archivo {archivo.name} excede el tamaño máximo de 500MB'
+                'message': f'El archivo {nombre} excede el tamaño máximo de 500MB'
             }
         
-        ext = os.path.splitext(archivo.name)[1].lower()
+        ext = os.path.splitext(nombre)[1].lower()
         if ext not in self.ALLOWED_EXTENSIONS:
             return {
                 'success': False,
-                'message': f'Extensión {ext} no permitida para {archivo.name}'
+                'message': f'Extensión {ext} no permitida para {nombre}'
             }
         
-        if archivo.content_type not in self.ALLOWED_MIME_TYPES:
+        if content_type not in self.ALLOWED_MIME_TYPES:
             return {
                 'success': False,
-                'message': f'Tipo de archivo no permitido: {archivo.content_type}'
+                'message': f'Tipo de archivo no permitido: {content_type}'
             }
         
         return {'success': True}
+
     
     def _cleanup_temp_files(self, file_paths):
         """
@@ -666,7 +923,8 @@ class ServiceProcessDenuncia(APIView):
         Args:
             request: Objeto request de Django con sesión
         """
-        archivos_temp = request.session.get('archivos_temp_paths', [])
+        estado = estado_wizard(request)
+        archivos_temp = estado.get('archivos_temp_paths', [])
         
         if not archivos_temp:
             return
@@ -680,49 +938,11 @@ class ServiceProcessDenuncia(APIView):
             except Exception as e:
                 print(f"⚠️ Error eliminando archivo temporal: {e}")
     
-    def _cleanup_orphaned_temp_files(self, max_age_hours=24):
-        """
-        OPCIONAL: Limpia archivos temporales huérfanos (con prefijo temp_) en MEDIA_ROOT
-        Esta función puede ser llamada periódicamente por un cron job o Celery task
-        para limpiar archivos que quedaron por procesos interrumpidos.
-        
-        Args:
-            max_age_hours (int): Edad máxima en horas antes de eliminar (default: 24)
-        """
-        try:
-            if not os.path.exists(settings.MEDIA_ROOT):
-                return
-            
-            now = time.time()
-            max_age_seconds = max_age_hours * 3600
-            files_deleted = 0
-            
-            for filename in os.listdir(settings.MEDIA_ROOT):
-                if not filename.startswith('temp_'):
-                    continue
-                    
-                file_path = os.path.join(settings.MEDIA_ROOT, filename)
-                
-                try:
-                    if os.path.isfile(file_path):
-                        file_age = now - os.path.getmtime(file_path)
-                        
-                        if file_age > max_age_seconds:
-                            os.remove(file_path)
-                            files_deleted += 1
-                except Exception as e:
-                    print(f"⚠️ Error procesando {filename}: {e}")
-            
-            if files_deleted > 0:
-                print(f"✅ Total archivos temporales huérfanos eliminados: {files_deleted}")
-        
-        except Exception as e:
-            print(f"⚠️ Error en limpieza de archivos temporales huérfanos: {e}")
-    
     def _limpiar_sesion_denuncia(self, request):
         """
         Limpia los datos de denuncia de la sesión y archivos temporales
         """
+        estado = estado_wizard(request)
         self._cleanup_temp_files_from_session(request)
         
         keys_to_delete = [
@@ -732,12 +952,13 @@ class ServiceProcessDenuncia(APIView):
             'denuncia_tiempo_id', 'denuncia_tiempo',
             'denuncia_descripcion', 'descripcion_relacion',
             'archivos_temp', 'archivos_temp_paths', 'archivos_to_process',
+            'archivos_staging', 'archivos_staging_slots',
         ]
         
         for key in keys_to_delete:
-            request.session.pop(key, None)
+            estado.pop(key, None)
         
-        request.session.modified = True
+        estado.modified = True
     
 
     def _validate_rut(self, request):
@@ -951,46 +1172,58 @@ class ServiceProcessDenuncia(APIView):
         """
         Obtiene todos los datos necesarios para el wizard
         """
-        item_id = request.session.get('denuncia_item_id')
+        estado = estado_wizard(request)
+        item_id = estado.get('denuncia_item_id')
         if not item_id:
             return Response({
                 'success': False,
                 'message': 'Debe seleccionar un tipo de denuncia primero'
             }, status=400)
         
-        relaciones = RelacionEmpresa.objects.all()
-        tiempos = Tiempo.objects.all()
+        catalogo = obtener_catalogo()
+        item = catalogo.item(item_id)
+        item_data = {
+            'id': item.id,
+            'enunciado': item.enunciado,
+            'categoria': item.categoria_nombre
+        } if item else None
         
-        try:
-            item = Item.objects.select_related('categoria').get(id=item_id)
-            item_data = {
-                'id': item.id,
-                'enunciado': item.enunciado,
-                'categoria': item.categoria.nombre
-            }
-        except Item.DoesNotExist:
-            item_data = None
+        # item_seleccionado es propio de cada denuncia: entra en el ETag y la respuesta es privada
+        huella = hashlib.sha256(
+            f"{catalogo.huellas['relacion_empresas']}:{catalogo.huellas['tiempos']}:"
+            f"{catalogo.huellas['categorias']}:{item_id}".encode()
+        ).hexdigest()[:40]
         
-        return Response({
+        return self._respuesta_con_etag(request, huella, {
             'success': True,
             'data': {
                 'item_seleccionado': item_data,
-                'relacion_empresas': RelacionEmpresaSerializer(relaciones, many=True).data,
-                'tiempos': TiempoSerializer(tiempos, many=True).data
+                'relacion_empresas': catalogo.api['relacion_empresas'],
+                'tiempos': catalogo.api['tiempos']
             }
-        })
+        }, private=True, no_cache=True)
     
     def _get_categories_items(self, request):
         """
         Obtiene todas las categorías con sus items
         """
-        categorias = Categoria.objects.prefetch_related('item_set').all()
-        serializer = CategoriaWithItemsSerializer(categorias, many=True)
-        
-        return Response({
+        catalogo = obtener_catalogo()
+        return self._respuesta_con_etag(request, catalogo.huellas['categorias'][:40], {
             'success': True,
-            'data': serializer.data
-        })
+            'data': catalogo.api['categorias']
+        }, public=True, max_age=settings.CATALOGO_HTTP_MAX_AGE)
+    
+    def _respuesta_con_etag(self, request, huella, data, **cache_control):
+        """
+        Respuesta con ETag fuerte y Cache-Control; 304 sin cuerpo si el
+        cliente envía If-None-Match con la misma versión del catálogo
+        """
+        response = Response(data)
+        response['ETag'] = quote_etag(huella)
+        patch_cache_control(response, **cache_control)
+        if cache_control.get('private'):
+            patch_vary_headers(response, ('Cookie', 'X-Wizard-Token'))
+        return get_conditional_response(request._request, etag=response['ETag'], response=response)
     
     def _generar_codigo_anonimo(self):
         """
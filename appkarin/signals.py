@@ -0,0 +1,167 @@
+# signals.py - Contadores desnormalizados e invalidación de cachés (denuncias y catálogo)
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .models import (
+    Denuncia, Archivo, Foro, ForoContador, Usuario, Item, Categoria,
+    RelacionEmpresa, Tiempo, Empresa
+)
+from .catalogo import CATALOGO_CACHE
+from .cache_utils import bump_cache_version
+from .search import actualizar_indice_busqueda
+from .service_datatable import DATATABLE_COUNT_CACHE
+
+
+def recalcular_num_archivos(denuncia_id):
+    """
+    Recalcula Denuncia.num_archivos a partir de la tabla Archivo.
+    Usar también después de operaciones masivas que no disparan señales
+    (bulk_create, queryset.update/delete).
+    """
+    Denuncia.objects.filter(codigo=denuncia_id).update(
+        num_archivos=Archivo.objects.filter(denuncia_id=denuncia_id).count()
+    )
+
+
+def recalcular_contador_foro(denuncia_id, admin_id):
+    """
+    Recalcula el ForoContador de un par (denuncia, admin).
+    Los mensajes sin admin (escritos por el usuario) no se contabilizan.
+    """
+    if not admin_id:
+        return
+
+    totales = Foro.objects.filter(
+        denuncia_id=denuncia_id,
+        admin_id=admin_id
+    ).aggregate(
+        leidos=Count('id', filter=Q(leido=True)),
+        no_leidos=Count('id', filter=Q(leido=False)),
+        total=Count('id')
+    )
+
+    # Sin mensajes (o denuncia eliminada en cascada): no dejar filas huérfanas
+    if not totales['total']:
+        ForoContador.objects.filter(denuncia_id=denuncia_id, admin_id=admin_id).delete()
+        return
+
+    ForoContador.objects.update_or_create(
+        denuncia_id=denuncia_id,
+        admin_id=admin_id,
+        defaults=totales
+    )
+
+
+@receiver(post_save, sender=Denuncia)
+@receiver(post_delete, sender=Denuncia)
+def denuncia_modificada(sender, instance, **kwargs):
+    """Nueva denuncia o cambio de estado: invalida los conteos del DataTable (en todos los workers)"""
+    bump_cache_version(DATATABLE_COUNT_CACHE, alias='compartido')
+
+
+# Campos de Denuncia que entran en el índice de búsqueda (search.py)
+CAMPOS_INDEXADOS = ('codigo', 'descripcion', 'usuario_id', 'item_id')
+_DIFERIDO = object()
+
+
+def _valores_indexados(instance):
+    # Desde __dict__: un campo diferido (.only/.defer) no dispara una consulta
+    return tuple(instance.__dict__.get(campo, _DIFERIDO) for campo in CAMPOS_INDEXADOS)
+
+
+@receiver(post_init, sender=Denuncia)
+def denuncia_cargada(sender, instance, **kwargs):
+    """Valores indexados al cargar, para no reindexar si no cambiaron"""
+    instance._indice_previo = _valores_indexados(instance)
+
+
+@receiver(post_save, sender=Denuncia)
+def denuncia_indexar(sender, instance, created, update_fields=None, **kwargs):
+    """Reindexa sólo si la denuncia es nueva o cambió un campo indexado"""
+    actuales = _valores_indexados(instance)
+    previo, instance._indice_previo = instance._indice_previo, actuales
+
+    if not created:
+        if update_fields is not None and not {'codigo', 'descripcion', 'usuario', 'item'} & set(update_fields):
+            return
+        if _DIFERIDO not in previo and previo == actuales:
+            return
+
+    actualizar_indice_busqueda(Denuncia.objects.filter(codigo=instance.codigo))
+
+
+@receiver(post_save, sender=Usuario)
+def usuario_indexar(sender, instance, created, **kwargs):
+    if not created:
+        actualizar_indice_busqueda(Denuncia.objects.filter(usuario=instance))
+
+
+@receiver(post_save, sender=Item)
+def item_indexar(sender, instance, created, **kwargs):
+    if not created:
+        actualizar_indice_busqueda(Denuncia.objects.filter(item=instance))
+
+
+@receiver(post_save, sender=Categoria)
+def categoria_indexar(sender, instance, created, **kwargs):
+    if not created:
+        actualizar_indice_busqueda(Denuncia.objects.filter(item__categoria=instance))
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=RelacionEmpresa)
+@receiver(post_delete, sender=RelacionEmpresa)
+@receiver(post_save, sender=Tiempo)
+@receiver(post_delete, sender=Tiempo)
+@receiver(post_save, sender=Empresa)
+@receiver(post_delete, sender=Empresa)
+def catalogo_modificado(sender, instance, **kwargs):
+    """Cambio en el catálogo del wizard: nueva versión tras el commit (sin releer datos viejos)"""
+    transaction.on_commit(lambda: bump_cache_version(CATALOGO_CACHE))
+
+
+@receiver(post_save, sender=Archivo)
+def archivo_guardado(sender, instance, created, **kwargs):
+    if created:
+        recalcular_num_archivos(instance.denuncia_id)
+
+
+@receiver(post_delete, sender=Archivo)
+def archivo_eliminado(sender, instance, **kwargs):
+    recalcular_num_archivos(instance.denuncia_id)
+
+
+@receiver(pre_save, sender=Foro)
+def foro_antes_de_guardar(sender, instance, **kwargs):
+    """Guarda el estado previo para detectar cambios de leido/admin"""
+    instance._contador_previo = None
+    if instance.pk:
+        instance._contador_previo = Foro.objects.filter(pk=instance.pk).values(
+            'denuncia_id', 'admin_id', 'leido'
+        ).first()
+
+
+@receiver(post_save, sender=Foro)
+def foro_guardado(sender, instance, created, **kwargs):
+    previo = getattr(instance, '_contador_previo', None)
+
+    if created or not previo:
+        recalcular_contador_foro(instance.denuncia_id, instance.admin_id)
+        return
+
+    # Solo recalcular si cambió algo que afecta a los contadores
+    if (previo['leido'] != instance.leido
+            or previo['admin_id'] != instance.admin_id
+            or previo['denuncia_id'] != instance.denuncia_id):
+        recalcular_contador_foro(instance.denuncia_id, instance.admin_id)
+        if (previo['admin_id'], previo['denuncia_id']) != (instance.admin_id, instance.denuncia_id):
+            recalcular_contador_foro(previo['denuncia_id'], previo['admin_id'])
+
+
+@receiver(post_delete, sender=Foro)
+def foro_eliminado(sender, instance, **kwargs):
+    recalcular_contador_foro(instance.denuncia_id, instance.admin_id)
@@ -962,12 +962,72 @@ const DenunciaApp = {
             }
             formData.append('csrfmiddlewaretoken', csrfToken);
             
+            const files = DenunciaApp.vars.selectedFiles;
+
+            // Con subida directa los adjuntos van al bucket antes de enviar el formulario
+            if (files.length && window.UPLOAD_SLOTS_URL) {
+                submitBtn.html('<i class="fas fa-spinner fa-spin me-2"></i>Subiendo archivos...');
+                this.uploadFilesToStaging(files, csrfToken)
+                    .then((stagingKeys) => {
+                        stagingKeys.forEach((key) => formData.append('archivos_staging[]', key));
+                        submitBtn.html('<i class="fas fa-spinner fa-spin me-2"></i>Procesando...');
+                        this.sendWizardForm(formData, submitBtn);
+                    })
+                    .catch((error) => {
+                        DenunciaApp.common.showError(error.message || 'Error al subir los archivos adjuntos');
+                        submitBtn.prop('disabled', false).html('<i class="fas fa-paper-plane me-2"></i>Continuar');
+                    });
+                return;
+            }
+
             // Agregar archivos
-            DenunciaApp.vars.selectedFiles.forEach((file, index) => {
+            files.forEach((file, index) => {
                 formData.append('archivos[]', file);
             });
 
-           
+            this.sendWizardForm(formData, submitBtn);
+        },
+
+        // Solicita URLs firmadas y sube cada archivo directo al bucket (en paralelo)
+        uploadFilesToStaging: function(files, csrfToken) {
+            return fetch(window.UPLOAD_SLOTS_URL, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': csrfToken
+                },
+                body: JSON.stringify({
+                    archivos: files.map((file) => ({
+                        nombre: file.name,
+                        size: file.size,
+                        type: file.type
+                    }))
+                })
+            })
+            .then((response) => response.json())
+            .then((response) => {
+                if (!response.success) {
+                    const detalle = (response.errors || []).join(', ');
+                    throw new Error(detalle || response.message || 'No se pudo preparar la subida de archivos');
+                }
+
+                return Promise.all(response.data.slots.map((slot, index) => {
+                    const uploadData = new FormData();
+                    Object.entries(slot.fields).forEach(([key, value]) => uploadData.append(key, value));
+                    // El archivo debe ir al final del formulario
+                    uploadData.append('file', files[index]);
+
+                    return fetch(slot.url, { method: 'POST', body: uploadData }).then((upload) => {
+                        if (!upload.ok) {
+                            throw new Error(`Error al subir ${slot.nombre}`);
+                        }
+                        return slot.staging_key;
+                    });
+                }));
+            });
+        },
+
+        sendWizardForm: function(formData, submitBtn) {
             // Obtener URL desde diferentes fuentes
             let submitUrl;
             
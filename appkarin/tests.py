@@ -1,3 +1,352 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache, caches
+from django.db.models import Count, Q
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from .cache_paginas import MARCADOR_CSRF
+from .cache_utils import bump_cache_version
+from .catalogo import CATALOGO_CACHE
+from .models import (
+    AdminDenuncias, Archivo, Categoria, Denuncia, Empresa, Foro, ForoContador,
+    Item, RelacionEmpresa, Tiempo, Usuario
+)
+from .service_datatable import SimpleDenunciaDataTableAPIView
+from .wizard_state import (
+    cifrar_estado, descifrar_estado, emitir_token, estado_wizard,
+    liberar_envio, reservar_envio
+)
+import json
+import time
 
-# Create your tests here.
+
+def crear_denuncias(cantidad):
+    """Denuncias de prueba con fechas distintas (una por minuto, la más nueva primero)"""
+    empresa = Empresa.objects.create(nombre='Integra', descripcion='Empresa de prueba')
+    categoria = Categoria.objects.create(nombre='Ley Karin')
+    item = Item.objects.create(enunciado='Acoso laboral', categoria=categoria)
+    relacion = RelacionEmpresa.objects.create(rol='Trabajador')
+    tiempo = Tiempo.objects.create(intervalo='Menos de 1 mes')
+    usuario = Usuario.objects.create(anonimo=True)
+
+    ahora = timezone.now()
+    denuncias = []
+    for n in range(cantidad):
+        denuncia = Denuncia.objects.create(
+            tipo_empresa=empresa, usuario=usuario, item=item,
+            relacion_empresa=relacion, tiempo=tiempo,
+            descripcion=f'Descripción de prueba {n}'
+        )
+        # auto_now_add no admite fechas explícitas en create()
+        Denuncia.objects.filter(codigo=denuncia.codigo).update(fecha=ahora - timedelta(minutes=n))
+        denuncias.append(denuncia)
+    return denuncias
+
+
+class DataTableKeysetTests(TestCase):
+    """Paginación keyset del DataTable frente a la paginación por OFFSET"""
+
+    TOTAL = 23
+    LARGO = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_denuncias(cls.TOTAL)
+        cls.admin = AdminDenuncias.objects.create_superuser('root', 'root@example.com', None)
+
+    def _post(self, **datos):
+        datos.setdefault('length', self.LARGO)
+        request = APIRequestFactory().post('/api/datatable/denuncias/simple/', datos, format='json')
+        force_authenticate(request, user=self.admin)
+        response = SimpleDenunciaDataTableAPIView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertNotIn('error', data)
+        return data
+
+    def _codigos(self, data):
+        return [fila['codigo'] for fila in data['data']]
+
+    def _recorrer_offset(self, direccion):
+        paginas = []
+        for start in range(0, self.TOTAL, self.LARGO):
+            paginas.append(self._codigos(self._post(
+                start=start, order=[{'column': 1, 'dir': direccion}]
+            )))
+        return paginas
+
+    def _recorrer_keyset(self, direccion):
+        paginas = []
+        cursor = None
+        while True:
+            data = self._post(pagination='keyset', cursor=cursor, cursor_dir='next',
+                              order=[{'column': 1, 'dir': direccion}])
+            paginas.append(self._codigos(data))
+            cursor = data['next_cursor']
+            if cursor is None:
+                return paginas, data
+
+    def test_paginas_keyset_igual_a_offset(self):
+        for direccion in ('desc', 'asc'):
+            with self.subTest(direccion=direccion):
+                keyset, _ = self._recorrer_keyset(direccion)
+                self.assertEqual(keyset, self._recorrer_offset(direccion))
+
+    def test_cursor_prev_vuelve_a_la_pagina_anterior(self):
+        paginas, ultima = self._recorrer_keyset('desc')
+        data = self._post(pagination='keyset', cursor=ultima['prev_cursor'], cursor_dir='prev')
+        self.assertEqual(self._codigos(data), paginas[-2])
+
+    def test_cursor_alterado_vuelve_a_la_primera_pagina(self):
+        primera = self._post(pagination='keyset')
+        alterado = primera['next_cursor'][:-2] + 'xx'
+        data = self._post(pagination='keyset', cursor=alterado, cursor_dir='next')
+        self.assertEqual(self._codigos(data), self._codigos(primera))
+        self.assertIsNone(data['prev_cursor'])
+
+    def test_conteo_cacheado_se_invalida_al_crear_denuncia(self):
+        self.assertEqual(self._post()['recordsTotal'], self.TOTAL)
+        denuncia = Denuncia.objects.first()
+        denuncia.pk = None
+        denuncia.codigo = ''
+        denuncia.save()
+        self.assertEqual(self._post()['recordsTotal'], self.TOTAL + 1)
+
+
+class ContadoresTests(TestCase):
+    """ForoContador y Denuncia.num_archivos frente a Count()"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.denuncia, cls.otra = crear_denuncias(2)
+        cls.admin = AdminDenuncias.objects.create_user('admin1', 'admin1@example.com', None)
+        cls.admin2 = AdminDenuncias.objects.create_user('admin2', 'admin2@example.com', None)
+
+    def assertContadoresForo(self):
+        esperados = {
+            (fila['denuncia_id'], fila['admin_id']): (fila['leidos'], fila['no_leidos'], fila['total'])
+            for fila in Foro.objects.filter(admin__isnull=False).values('denuncia_id', 'admin_id').annotate(
+                leidos=Count('id', filter=Q(leido=True)),
+                no_leidos=Count('id', filter=Q(leido=False)),
+                total=Count('id')
+            )
+        }
+        actuales = {
+            (c.denuncia_id, c.admin_id): (c.leidos, c.no_leidos, c.total)
+            for c in ForoContador.objects.all()
+        }
+        self.assertEqual(actuales, esperados)
+
+    def assertNumArchivos(self):
+        for denuncia in Denuncia.objects.annotate(esperado=Count('archivo')):
+            self.assertEqual(denuncia.num_archivos, denuncia.esperado, denuncia.codigo)
+
+    def test_contador_foro_al_crear_editar_y_eliminar(self):
+        mensajes = [
+            Foro.objects.create(denuncia=self.denuncia, admin=self.admin, mensaje='uno', leido=False),
+            Foro.objects.create(denuncia=self.denuncia, admin=self.admin, mensaje='dos', leido=True),
+            Foro.objects.create(denuncia=self.otra, admin=self.admin2, mensaje='tres', leido=False),
+            # Mensaje del usuario: no se contabiliza
+            Foro.objects.create(denuncia=self.denuncia, admin=None, mensaje='cuatro', leido=False),
+        ]
+        self.assertContadoresForo()
+
+        mensajes[0].leido = True
+        mensajes[0].save()
+        self.assertContadoresForo()
+
+        # Cambio de admin: se recalculan el par nuevo y el anterior
+        mensajes[1].admin = self.admin2
+        mensajes[1].save()
+        self.assertContadoresForo()
+
+        for mensaje in mensajes:
+            mensaje.delete()
+            self.assertContadoresForo()
+        self.assertFalse(ForoContador.objects.exists())
+
+    def test_num_archivos_al_crear_y_eliminar(self):
+        archivo = Archivo.objects.create(denuncia=self.denuncia, nombre='a.pdf', descripción='a')
+        self.assertNumArchivos()
+
+        Archivo.crear_lote([
+            Archivo(denuncia=self.denuncia, nombre='b.pdf', descripción='b'),
+            Archivo(denuncia=self.otra, nombre='c.pdf', descripción='c'),
+        ])
+        self.assertNumArchivos()
+
+        archivo.delete()
+        self.assertNumArchivos()
+
+        Archivo.objects.get(nombre='c.pdf').delete()
+        self.assertNumArchivos()
+
+
+class IndiceBusquedaTests(TestCase):
+    """La denuncia se reindexa sólo si cambió un campo indexado"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.codigo = crear_denuncias(1)[0].codigo
+
+    def test_reindexa_solo_si_cambia_un_campo_indexado(self):
+        with mock.patch('appkarin.signals.actualizar_indice_busqueda') as actualizar:
+            denuncia = Denuncia.objects.get(codigo=self.codigo)
+            denuncia.estado_actual = 'EN_REVISION'
+            denuncia.save()
+            actualizar.assert_not_called()
+
+            denuncia.descripcion = 'Otra descripción'
+            denuncia.save()
+            self.assertEqual(actualizar.call_count, 1)
+
+            # Con campos diferidos sólo se escriben los cargados
+            denuncia = Denuncia.objects.only('codigo', 'estado_actual').get(codigo=self.codigo)
+            denuncia.save()
+            self.assertEqual(actualizar.call_count, 1)
+
+            # Campo indexado diferido y asignado: no se conoce el valor previo, se reindexa
+            denuncia.descripcion = 'Otra descripción'
+            denuncia.save()
+            self.assertEqual(actualizar.call_count, 2)
+
+
+class WizardTokenTests(TestCase):
+    """Estado del wizard en token cifrado (WIZARD_STATE_MODE = 'token')"""
+
+    estado = {'wizard_id': 'a1b2c3', 'empresa_id': 1, 'wizard_data': {'descripcion': 'ñandú ' * 10}}
+
+    def test_ida_y_vuelta(self):
+        self.assertEqual(descifrar_estado(cifrar_estado(self.estado)), self.estado)
+
+    def test_rechaza_token_alterado(self):
+        token = cifrar_estado(self.estado)
+        medio = len(token) // 2
+        alterado = token[:medio] + ('A' if token[medio] != 'A' else 'B') + token[medio + 1:]
+        self.assertIsNone(descifrar_estado(alterado))
+        self.assertIsNone(descifrar_estado('no-es-un-token'))
+
+    @override_settings(WIZARD_TOKEN_MAX_AGE=60)
+    def test_rechaza_token_expirado(self):
+        token = cifrar_estado(self.estado)
+        with mock.patch('cryptography.fernet.time.time', return_value=time.time() + 120):
+            self.assertIsNone(descifrar_estado(token))
+
+    def test_rechaza_token_reutilizado(self):
+        caches['compartido'].delete(f"appkarin:wizard_enviado:{self.estado['wizard_id']}")
+        estado = descifrar_estado(cifrar_estado(self.estado))
+        self.assertTrue(reservar_envio(estado))
+        self.assertFalse(reservar_envio(descifrar_estado(cifrar_estado(self.estado))))
+
+        # Si la creación falla se libera y puede reintentarse
+        liberar_envio(estado)
+        self.assertTrue(reservar_envio(estado))
+        self.assertFalse(reservar_envio({}))
+
+    @override_settings(WIZARD_STATE_MODE='token', WIZARD_TOKEN_COOKIE_CHUNK=40)
+    def test_token_repartido_en_cookies(self):
+        factory = RequestFactory()
+        request = factory.get('/')
+        request.COOKIES = {}
+        estado = estado_wizard(request)
+        estado.update(self.estado)
+        estado['paso'] = 2
+        response = emitir_token(request, HttpResponse())
+
+        cookies = {nombre: morsel.value for nombre, morsel in response.cookies.items()}
+        self.assertGreater(len(cookies), 1)
+        self.assertTrue(all(len(parte) <= 40 for parte in cookies.values()))
+
+        siguiente = factory.get('/')
+        siguiente.COOKIES = cookies
+        self.assertEqual(dict(estado_wizard(siguiente)), dict(self.estado, paso=2))
+
+
+class CatalogoETagTests(TestCase):
+    """ETag y 304 en los endpoints del catálogo"""
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_denuncias(1)
+
+    def setUp(self):
+        bump_cache_version(CATALOGO_CACHE)
+
+    def test_categorias_responde_304_con_el_mismo_etag(self):
+        response = self.client.get('/api/wizard/categories/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get('/api/wizard/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_etag_cambia_con_el_catalogo(self):
+        etag = self.client.get('/api/wizard/categories/')['ETag']
+        Categoria.objects.create(nombre='Nueva categoría')
+        bump_cache_version(CATALOGO_CACHE)
+        response = self.client.get('/api/wizard/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class PaginaCacheadaTests(TestCase):
+    """Páginas completas en caché (cache_paginas.py)"""
+
+    url = '/index/Integra/'
+
+    @classmethod
+    def setUpTestData(cls):
+        crear_denuncias(1)
+
+    def setUp(self):
+        cache.clear()
+        bump_cache_version(CATALOGO_CACHE)
+
+    def test_segunda_visita_desde_cache_y_304(self):
+        primera = self.client.get(self.url)
+        self.assertEqual(primera.status_code, 200)
+
+        with mock.patch('appkarin.views.render_pagina') as render:
+            segunda = self.client.get(self.url)
+            render.assert_not_called()
+        self.assertEqual(segunda.status_code, 200)
+        self.assertEqual(segunda['ETag'], primera['ETag'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=segunda['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def assertSinMarcador(self, response):
+        self.assertNotIn(MARCADOR_CSRF.encode(), response.content)
+        for valor in response.headers.values():
+            self.assertNotIn(MARCADOR_CSRF, valor)
+
+    def test_marcador_csrf_nunca_llega_a_la_respuesta(self):
+        primera = self.client.get(self.url)
+        self.assertIn(b'csrfmiddlewaretoken', primera.content)
+        self.assertSinMarcador(primera)
+
+        for metodo in (self.client.get, self.client.head):
+            response = metodo(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertSinMarcador(response)
+
+            response = metodo(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertSinMarcador(response)
+
+    @override_settings(WIZARD_STATE_MODE='token')
+    def test_marcador_csrf_en_paso1_con_token(self):
+        token = cifrar_estado({'empresa_id': Empresa.objects.get().id})
+        for _ in range(2):
+            response = self.client.get('/denuncia/Paso1/', HTTP_X_WIZARD_TOKEN=token)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'csrfmiddlewaretoken', response.content)
+            self.assertSinMarcador(response)
+
+        response = self.client.head('/denuncia/Paso1/', HTTP_X_WIZARD_TOKEN=token,
+                                    HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertSinMarcador(response)
@@ -0,0 +1,37 @@
+# upload_handlers.py - Upload handlers que calculan el sha256 mientras reciben el archivo
+"""
+Los handlers por defecto de Django con un hashlib.sha256 alimentado con las
+mismas partes que escriben. El UploadedFile resultante trae 'sha256', así
+que ni el staging ni la subida a S3 vuelven a leer el archivo para hashearlo.
+"""
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+import hashlib
+
+
+class _HashUploadMixin:
+
+    def new_file(self, *args, **kwargs):
+        # Antes de super(): MemoryFileUploadHandler corta con StopFutureHandlers
+        self.digest = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        resto = super().receive_data_chunk(raw_data, start)
+        if resto is None:
+            # Este handler se quedó con la parte (si no, la procesa el siguiente)
+            self.digest.update(raw_data)
+        return resto
+
+    def file_complete(self, file_size):
+        archivo = super().file_complete(file_size)
+        if archivo is not None:
+            archivo.sha256 = self.digest.hexdigest()
+        return archivo
+
+
+class HashMemoryFileUploadHandler(_HashUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashTemporaryFileUploadHandler(_HashUploadMixin, TemporaryFileUploadHandler):
+    pass
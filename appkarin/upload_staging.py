@@ -0,0 +1,154 @@
+# upload_staging.py - Almacenamiento temporal de adjuntos entre pasos del wizard
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from pathlib import Path
+from .cache_utils import hash_key
+import datetime
+import hashlib
+import os
+import shutil
+import uuid
+
+
+# Los archivos se agrupan por hora de creación: <raíz>/<AAAAMMDDHH>/<sesión>/<archivo>.
+# El nombre del directorio de cada hora es el índice de antigüedad del janitor.
+FORMATO_BUCKET = '%Y%m%d%H'
+
+
+class StagingLleno(Exception):
+    """No queda espacio suficiente en el volumen de staging"""
+
+
+def staging_root():
+    return Path(settings.UPLOAD_STAGING_ROOT)
+
+
+def _bucket_actual():
+    return datetime.datetime.now(datetime.timezone.utc).strftime(FORMATO_BUCKET)
+
+
+def _bucket_limite(max_age_hours):
+    """Nombre del bucket horario más antiguo que se conserva"""
+    max_age_hours = settings.UPLOAD_STAGING_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    return (
+        datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=max_age_hours)
+    ).strftime(FORMATO_BUCKET)
+
+
+def _directorio_sesion(session_key):
+    directorio = staging_root() / _bucket_actual() / hash_key(session_key)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def guardar_en_staging(session_key, archivo):
+    """
+    Guarda un UploadedFile en el directorio de la sesión.
+    Retorna (ruta, sha256). El hash viene del upload handler, que lo calculó
+    al recibir el archivo; si no, se calcula sobre las mismas partes escritas.
+    
+    Si Django ya lo dejó en disco (TemporaryUploadedFile) se mueve; si no,
+    se escribe por partes (chunks).
+    
+    Raises:
+        StagingLleno: Si el volumen quedaría bajo UPLOAD_STAGING_MIN_FREE_MB
+    """
+    root = staging_root()
+    root.mkdir(parents=True, exist_ok=True)
+
+    libre = shutil.disk_usage(root).free - archivo.size
+    if libre < settings.UPLOAD_STAGING_MIN_FREE_MB * 1024 * 1024:
+        raise StagingLleno('Espacio temporal insuficiente, intente nuevamente más tarde')
+
+    destino = _directorio_sesion(session_key) / f"{uuid.uuid4().hex}_{os.path.basename(archivo.name)}"
+
+    sha256 = getattr(archivo, 'sha256', None)
+    digest = hashlib.sha256()
+    if hasattr(archivo, 'temporary_file_path'):
+        if not sha256:
+            for chunk in archivo.chunks():
+                digest.update(chunk)
+        file_move_safe(archivo.temporary_file_path(), str(destino))
+    else:
+        with open(destino, 'wb') as f:
+            for chunk in archivo.chunks():
+                if not sha256:
+                    digest.update(chunk)
+                f.write(chunk)
+
+    return str(destino), sha256 or digest.hexdigest()
+
+
+def limpiar_staging(max_age_hours=None, max_buckets=None):
+    """
+    Elimina los directorios horarios más antiguos que max_age_hours.
+    
+    Sólo se listan los directorios de primer nivel (uno por hora), nunca los
+    archivos: el costo no depende de cuántos archivos haya acumulados.
+    max_buckets limita cuántas horas se borran por llamada.
+    
+    Returns:
+        int: Directorios horarios eliminados
+    """
+    root = staging_root()
+    if not root.exists():
+        return 0
+
+    limite = _bucket_limite(max_age_hours)
+
+    vencidos = sorted(
+        entrada.name for entrada in os.scandir(root)
+        if entrada.is_dir() and entrada.name.isdigit() and entrada.name < limite
+    )
+    if max_buckets:
+        vencidos = vencidos[:max_buckets]
+
+    for bucket in vencidos:
+        shutil.rmtree(root / bucket, ignore_errors=True)
+
+    return len(vencidos)
+
+
+def clave_staging_s3(nombre):
+    """
+    Clave de un adjunto en el prefijo de staging del bucket (subida directa
+    o modo token): <S3_STAGING_PREFIX><AAAAMMDDHH>/<uuid>/<nombre>, con el
+    mismo bucket horario que el staging local para que el janitor lo limpie.
+    """
+    return f"{settings.S3_STAGING_PREFIX}{_bucket_actual()}/{uuid.uuid4().hex}/{os.path.basename(nombre)}"
+
+
+def limpiar_staging_s3(s3_client, max_age_hours=None, max_buckets=None):
+    """
+    Elimina del bucket los adjuntos de staging de wizards abandonados (los
+    que se completan se borran al crear la denuncia).
+    
+    Igual que limpiar_staging, primero se listan sólo los prefijos horarios
+    (Delimiter='/') y después se borran los objetos de los vencidos, de a
+    1000 por llamada (delete_objects).
+    
+    Returns:
+        int: Prefijos horarios eliminados
+    """
+    bucket_s3 = settings.AWS_STORAGE_BUCKET_NAME
+    prefijo = settings.S3_STAGING_PREFIX
+    limite = _bucket_limite(max_age_hours)
+    paginator = s3_client.get_paginator('list_objects_v2')
+
+    vencidos = []
+    for pagina in paginator.paginate(Bucket=bucket_s3, Prefix=prefijo, Delimiter='/'):
+        for comun in pagina.get('CommonPrefixes', []):
+            hora = comun['Prefix'][len(prefijo):].rstrip('/')
+            if hora.isdigit() and hora < limite:
+                vencidos.append(comun['Prefix'])
+    vencidos.sort()
+    if max_buckets:
+        vencidos = vencidos[:max_buckets]
+
+    for prefijo_hora in vencidos:
+        for pagina in paginator.paginate(Bucket=bucket_s3, Prefix=prefijo_hora):
+            objetos = [{'Key': obj['Key']} for obj in pagina.get('Contents', [])]
+            if objetos:
+                s3_client.delete_objects(Bucket=bucket_s3, Delete={'Objects': objetos, 'Quiet': True})
+
+    return len(vencidos)
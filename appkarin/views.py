@@ -5,6 +5,9 @@ from django.contrib import messages
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from .wizard_state import estado_wizard, emitir_token
+from .catalogo import obtener_catalogo
+from .cache_paginas import pagina_cacheada, render_pagina, sin_cache
 import re
 
 
@@ -12,11 +15,13 @@ import re
 # VISTAS PARA RENDERIZAR TEMPLATES (Sin cambios)
 # =================================================================
 
+@pagina_cacheada('home')
 def renderHome(request,empresa):
     print("Empresa solicitada:", empresa)
-    _empresa=Empresa.objects.filter(nombre=empresa).first()
+    _empresa=obtener_catalogo().empresa_por_nombre(empresa)
     if not _empresa:
-        return render(request, 'notfound.html')
+        # No se cachea: cada nombre inventado sería una entrada nueva
+        return sin_cache(render(request, 'notfound.html'))
 
     url_logo=f'assets/Logo{empresa}.png'
 
@@ -30,24 +35,30 @@ def renderHome(request,empresa):
         'empresa':empresa
     }
 
-    return render(request, 'index.html',context)
+    return render_pagina(request, 'index.html',context)
 
+def _empresa_en_estado(request):
+    return bool(estado_wizard(request).get('empresa_id'))
+
+@pagina_cacheada('items', variante=_empresa_en_estado)
 def renderItemsDenuncia(request):
     print(request)
-    categorias = Categoria.objects.all().prefetch_related('item_set')
+    categorias = obtener_catalogo().categorias
     context = {'categorias': categorias}
     
-    if request.session.get('empresa_id'):
-        return render(request, 'inicioDenuncia.html', context)
-    return render(request, 'warning.html', context)
+    if _empresa_en_estado(request):
+        return render_pagina(request, 'inicioDenuncia.html', context)
+    return render_pagina(request, 'warning.html', context)
 
 def renderWizzDenuncia(request):
     """Vista única del wizard que carga todos los datos necesarios"""
-    if( request.session.get('denuncia_categoria_id')):
-        categorias = Categoria.objects.all().prefetch_related('item_set')
-        relacion_empresas = RelacionEmpresa.objects.all()
-        tiempos = Tiempo.objects.all()
-        wizard_data = request.session.get('wizard_data', {})
+    estado = estado_wizard(request)
+    if( estado.get('denuncia_categoria_id')):
+        catalogo = obtener_catalogo()
+        categorias = catalogo.categorias
+        relacion_empresas = catalogo.relaciones
+        tiempos = catalogo.tiempos
+        wizard_data = estado.get('wizard_data', {})
         
         context = {
             'categorias': categorias,
@@ -62,9 +73,9 @@ def renderWizzDenuncia(request):
 
 def renderUserDenuncia(request):
 
-
-    if(request.session.get('denuncia_categoria_id')):
-        if (request.session.get('denuncia_categoria_id')==1):
+    estado = estado_wizard(request)
+    if(estado.get('denuncia_categoria_id')):
+        if (estado.get('denuncia_categoria_id')==1):
             return render(request, 'terminoDenunciaLeyKarin.html')
         return render(request, 'terminoDenuncia.html')
     else:
@@ -72,16 +83,17 @@ def renderUserDenuncia(request):
 
 def renderCodeDenuncia(request):
 
-    empresa=Empresa.objects.filter(id=request.session.get('empresa_id')).first()
+    estado = estado_wizard(request)
+    empresa=obtener_catalogo().empresa(estado.get('empresa_id'))
 
-    context = {'code': request.session.get('codigo', ''),'empresa':empresa.nombre}
+    context = {'code': estado.get('codigo', ''),'empresa':empresa.nombre}
     response = render(request, 'codeIndex.html', context)
     keys_denuncia = ['item_id', 'wizzard_data', 'codigo','empresa_id']
     for key in keys_denuncia:
-        if key in request.session:
-            del request.session[key]
+        if key in estado:
+            del estado[key]
 
-    return response
+    return emitir_token(request, response)
 
 def renderConsultaDenuncia(request):
     """
@@ -107,9 +119,9 @@ def renderConsultaDenuncia(request):
                 else:
                     messages.error(request, 'El código de denuncia no existe')
                     # Obtener la empresa de la sesión para redirigir correctamente
-                    empresa_id = request.session.get('empresa_id')
+                    empresa_id = estado_wizard(request).get('empresa_id')
                     if empresa_id:
-                        empresa = Empresa.objects.filter(id=empresa_id).first()
+                        empresa = obtener_catalogo().empresa(empresa_id)
                         if empresa:
                             return redirect('home', empresa=empresa.nombre)
                     return redirect('hub')
@@ -126,9 +138,9 @@ def renderConsultaDenuncia(request):
                 else:
                     messages.error(request, 'El código ingresado no existe')
                     # Obtener la empresa de la sesión para redirigir correctamente
-                    empresa_id = request.session.get('empresa_id')
+                    empresa_id = estado_wizard(request).get('empresa_id')
                     if empresa_id:
-                        empresa = Empresa.objects.filter(id=empresa_id).first()
+                        empresa = obtener_catalogo().empresa(empresa_id)
                         if empresa:
                             return redirect('home', empresa=empresa.nombre)
                     return redirect('hub')
@@ -149,9 +161,10 @@ def renderLoginAdmin(request):
     return render(request, 'login.html')
 
 
+@pagina_cacheada('hub')
 def renderHub(request):
 
-    empresas= Empresa.objects.all()
+    empresas= obtener_catalogo().empresas
 
     nombre_empresas=[]
     url_logos = []
@@ -179,4 +192,4 @@ def renderHub(request):
         'cards_data': cards_data
     }
 
-    return render(request, 'hub.html', context)
+    return render_pagina(request, 'hub.html', context)
@@ -0,0 +1,180 @@
+# wizard_state.py - Estado del wizard de denuncia: sesión o token cifrado sin estado
+"""
+Con WIZARD_STATE_MODE = 'session' (por defecto) el wizard guarda su avance en
+request.session, como siempre.
+
+Con WIZARD_STATE_MODE = 'token' el avance viaja en un token firmado y cifrado
+(Fernet: AES-CBC + HMAC-SHA256, con marca de tiempo) que cada paso devuelve en
+'wizard_token' y en la cookie WIZARD_TOKEN_COOKIE. El servidor no guarda nada:
+cualquier nodo web puede atender cualquier paso, sin sesiones compartidas ni
+sticky sessions. Los clientes que no usan cookies pueden reenviarlo en la
+cabecera X-Wizard-Token.
+"""
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+import base64
+import hashlib
+import json
+import zlib
+
+
+class TokenWizard(dict):
+    """
+    Estado leído del token. Expone la parte de la API de sesión que usa el
+    wizard (get, [], pop, modified) para que el código sea el mismo en ambos modos.
+    """
+    session_key = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.modified = False
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.modified = True
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.modified = True
+
+    def pop(self, key, *args):
+        self.modified = self.modified or key in self
+        return super().pop(key, *args)
+
+    async def aget(self, key, default=None):
+        return self.get(key, default)
+
+
+def modo_token():
+    return settings.WIZARD_STATE_MODE == 'token'
+
+
+def _fernet():
+    # La primera clave cifra; las anteriores (rotación) sólo descifran
+    secretos = [settings.WIZARD_TOKEN_KEY or settings.SECRET_KEY, *settings.SECRET_KEY_FALLBACKS]
+    return MultiFernet([
+        Fernet(base64.urlsafe_b64encode(hashlib.sha256(f'appkarin.wizard:{secreto}'.encode()).digest()))
+        for secreto in secretos
+    ])
+
+
+def cifrar_estado(estado):
+    """Token compacto: JSON sin espacios, comprimido y luego cifrado"""
+    contenido = json.dumps(estado, separators=(',', ':'), ensure_ascii=False).encode()
+    return _fernet().encrypt(zlib.compress(contenido, 9)).decode()
+
+
+def descifrar_estado(token):
+    """
+    Returns:
+        dict: Estado del token, o None si es inválido, fue alterado o expiró
+    """
+    try:
+        contenido = _fernet().decrypt(token.encode(), ttl=settings.WIZARD_TOKEN_MAX_AGE)
+        estado = json.loads(zlib.decompress(contenido))
+    except (InvalidToken, ValueError, zlib.error):
+        return None
+    return estado if isinstance(estado, dict) else None
+
+
+def verificar_configuracion():
+    """
+    En modo token el envío único depende de un caché que vean todos los
+    procesos: con memoria local cada worker aceptaría el mismo token una vez.
+    Se llama al iniciar la aplicación (AppConfig.ready).
+    """
+    if modo_token() and isinstance(caches['compartido'], LocMemCache):
+        raise ImproperlyConfigured(
+            "WIZARD_STATE_MODE = 'token' requiere que el caché 'compartido' sea Redis o la base de datos"
+        )
+
+
+def reservar_envio(estado):
+    """
+    Un token sigue siendo válido hasta expirar: el paso final se acepta una
+    sola vez por wizard_id (add es atómico en el caché compartido, Redis o BD,
+    así que vale entre workers y nodos).
+    
+    Returns:
+        bool: False si este wizard ya creó su denuncia
+    """
+    wizard_id = estado.get('wizard_id')
+    if not wizard_id:
+        return False
+    return caches['compartido'].add(f'appkarin:wizard_enviado:{wizard_id}', 1, settings.WIZARD_TOKEN_MAX_AGE)
+
+
+def liberar_envio(estado):
+    """Permite reintentar el paso final si la creación falló"""
+    if estado.get('wizard_id'):
+        caches['compartido'].delete(f'appkarin:wizard_enviado:{estado["wizard_id"]}')
+
+
+def _token_en_cookies(cookies):
+    # El token puede repartirse en varias cookies: nombre, nombre_1, nombre_2, ...
+    partes = []
+    nombre = settings.WIZARD_TOKEN_COOKIE
+    while nombre in cookies:
+        partes.append(cookies[nombre])
+        nombre = f'{settings.WIZARD_TOKEN_COOKIE}_{len(partes)}'
+    return ''.join(partes)
+
+
+def estado_wizard(request):
+    """
+    Estado del wizard para este request: request.session o un TokenWizard.
+    Acepta HttpRequest o el Request de DRF.
+    """
+    request = getattr(request, '_request', request)
+    if not modo_token():
+        return request.session
+
+    estado = getattr(request, '_estado_wizard', None)
+    if estado is None:
+        token = request.headers.get('X-Wizard-Token') or _token_en_cookies(request.COOKIES)
+        estado = TokenWizard(descifrar_estado(token) or {}) if token else TokenWizard()
+        request._estado_wizard = estado
+    return estado
+
+
+def emitir_token(request, response):
+    """
+    Si el estado cambió, entrega el token nuevo en la cookie (repartida en
+    partes bajo el límite de ~4KB por cookie) y en 'wizard_token' de las
+    respuestas JSON de DRF.
+    """
+    request = getattr(request, '_request', request)
+    estado = getattr(request, '_estado_wizard', None)
+    if estado is None or not estado.modified:
+        return response
+
+    token = cifrar_estado(estado) if estado else ''
+    tamano = settings.WIZARD_TOKEN_COOKIE_CHUNK
+    partes = [token[i:i + tamano] for i in range(0, len(token), tamano)]
+
+    for indice, parte in enumerate(partes):
+        nombre = settings.WIZARD_TOKEN_COOKIE if indice == 0 else f'{settings.WIZARD_TOKEN_COOKIE}_{indice}'
+        response.set_cookie(
+            nombre, parte,
+            max_age=None if settings.SESSION_EXPIRE_AT_BROWSER_CLOSE else settings.WIZARD_TOKEN_MAX_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite=settings.SESSION_COOKIE_SAMESITE
+        )
+
+    # Partes sobrantes de un token anterior más largo (o el token completo si el estado quedó vacío)
+    indice = len(partes)
+    nombre = settings.WIZARD_TOKEN_COOKIE if indice == 0 else f'{settings.WIZARD_TOKEN_COOKIE}_{indice}'
+    while nombre in request.COOKIES:
+        response.delete_cookie(nombre, samesite=settings.SESSION_COOKIE_SAMESITE)
+        indice += 1
+        nombre = f'{settings.WIZARD_TOKEN_COOKIE}_{indice}'
+
+    if isinstance(getattr(response, 'data', None), dict):
+        response.data['wizard_token'] = token
+
+    estado.modified = False
+    return response
@@ -1,6 +1,7 @@
 # leykarin/settings/base.py - Configuración base compartida
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,6 +17,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'appkarin'
 ]
@@ -24,6 +26,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'appkarin.middleware.renovar_sesion_middleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -78,11 +81,89 @@ USE_TZ = True
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caché: Redis si REDIS_URL está definido, memoria local en caso contrario.
+# 'compartido' es para estado que todos los workers deben ver igual (avance de
+# lotes, envíos únicos del wizard, versiones de invalidación): Redis o la BD.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'sesion',
+        },
+        'compartido': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'compartido',
+            # Cada uso indica su timeout; sin él (versiones) la clave no expira
+            'TIMEOUT': None,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sesiones',
+        },
+        # Sin Redis, lo que deben ver todos los workers va a la BD
+        # (tabla creada con: python manage.py createcachetable)
+        'compartido': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'appkarin_cache_compartido',
+            # incr() reescribe la clave con el timeout por defecto: las versiones no deben expirar
+            'TIMEOUT': None,
+        }
+    }
+
+# Catálogo del wizard (se invalida por señales al editarlo en el admin)
+CATALOGO_CACHE_TIMEOUT = int(os.getenv('CATALOGO_CACHE_TIMEOUT', 300))
+# max-age de GET api/wizard/categories/ (navegadores y nginx); luego se revalida con ETag
+CATALOGO_HTTP_MAX_AGE = int(os.getenv('CATALOGO_HTTP_MAX_AGE', 60))
+# Páginas públicas cacheadas (hub, inicio de empresa, Paso 1); también acota
+# cuánto tarda en verse un cambio de templates tras un despliegue
+PAGINAS_CACHE_TIMEOUT = int(os.getenv('PAGINAS_CACHE_TIMEOUT', 300))
+
+# Conteos del DataTable
+DATATABLE_COUNT_CACHE_TIMEOUT = int(os.getenv('DATATABLE_COUNT_CACHE_TIMEOUT', 300))
+# Sobre este número de filas se usa la estimación del planner de Postgres
+DATATABLE_COUNT_ESTIMATE_THRESHOLD = int(os.getenv('DATATABLE_COUNT_ESTIMATE_THRESHOLD', 50000))
+
 # Configuración de sesiones
 SESSION_COOKIE_AGE = 1800
-SESSION_SAVE_EVERY_REQUEST = True
+# La sesión se escribe sólo si cambia; renovar_sesion_middleware extiende la
+# expiración como mucho una vez cada SESSION_RENEW_INTERVAL segundos
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_RENEW_INTERVAL = int(os.getenv('SESSION_RENEW_INTERVAL', 300))
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Motor de sesiones: cached_db (Redis + Postgres), cache (sólo Redis),
+# signed_cookies (sin almacenamiento en servidor) o db.
+# cached_db requiere Redis: con caché en memoria local cada worker vería su propia copia
+SESSION_BACKENDS = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cached_db' if REDIS_URL else 'db')
+SESSION_ENGINE = SESSION_BACKENDS[SESSION_BACKEND]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Estado del wizard de denuncia: session (por defecto) o token (firmado y
+# cifrado en el cliente; los nodos web no comparten estado)
+WIZARD_STATE_MODE = os.getenv('WIZARD_STATE_MODE', 'session')
+WIZARD_TOKEN_KEY = os.getenv('WIZARD_TOKEN_KEY')  # por defecto se deriva de SECRET_KEY
+WIZARD_TOKEN_MAX_AGE = int(os.getenv('WIZARD_TOKEN_MAX_AGE', SESSION_COOKIE_AGE))
+WIZARD_TOKEN_COOKIE = 'karin_wizard'
+# Tamaño máximo de cada cookie con una parte del token
+WIZARD_TOKEN_COOKIE_CHUNK = 3500
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = 'Lax'
 
@@ -93,22 +174,66 @@ AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME")
 AWS_S3_ENDPOINT_URL = f"https://{AWS_S3_REGION_NAME}.digitaloceanspaces.com"
 AWS_S3_CUSTOM_DOMAIN = f"{AWS_STORAGE_BUCKET_NAME}.{AWS_S3_REGION_NAME}.digitaloceanspaces.com"
 
-AWS_DEFAULT_ACL = 'public-read'
+# Adjuntos de denuncias: objetos privados, sólo accesibles por la descarga autorizada
+AWS_DEFAULT_ACL = 'private'
 
 AWS_S3_OBJECT_PARAMETERS = {
-    'CacheControl': 'max-age=86400',
-    'ACL': 'public-read'  
+    'CacheControl': 'max-age=86400'
 }
 
 AWS_QUERYSTRING_AUTH = False  
 AWS_S3_SIGNATURE_VERSION = 's3v4' 
 
+# Tamaño de cada parte al transmitir descargas desde S3
+S3_DOWNLOAD_CHUNK_SIZE = int(os.getenv('S3_DOWNLOAD_CHUNK_SIZE', 64 * 1024))
+
+# Descarga de adjuntos: proxy (Django transmite), presigned (302 a URL firmada)
+# o accel (nginx transmite vía X-Accel-Redirect)
+ARCHIVO_DOWNLOAD_MODE = os.getenv('ARCHIVO_DOWNLOAD_MODE', 'proxy')
+ARCHIVO_PRESIGNED_EXPIRES = int(os.getenv('ARCHIVO_PRESIGNED_EXPIRES', 60))
+
+# Subida directa de adjuntos desde el navegador (presigned POST)
+# El bucket debe permitir POST por CORS desde el dominio del sitio
+S3_STAGING_PREFIX = os.getenv('S3_STAGING_PREFIX', 'staging/')
+UPLOAD_SLOT_EXPIRES = int(os.getenv('UPLOAD_SLOT_EXPIRES', 900))
+# Máximo de adjuntos por denuncia en el wizard (el formulario permite 5), tanto URLs firmadas
+# como archivos enviados en el formulario.
+# Los objetos de staging de wizards abandonados los borra el janitor (limpiar_staging)
+UPLOAD_MAX_ARCHIVOS = int(os.getenv('UPLOAD_MAX_ARCHIVOS', 5))
+
+# Cliente S3 compartido (debe cubrir archivos en paralelo x partes concurrentes)
+S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', 32))
+S3_MAX_RETRIES = int(os.getenv('S3_MAX_RETRIES', 4))
+S3_CONNECT_TIMEOUT = int(os.getenv('S3_CONNECT_TIMEOUT', 5))
+S3_READ_TIMEOUT = int(os.getenv('S3_READ_TIMEOUT', 60))
+
+# Subidas desde el servidor: multipart y archivos en paralelo
+S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+S3_MULTIPART_CONCURRENCY = int(os.getenv('S3_MULTIPART_CONCURRENCY', 4))
+S3_UPLOAD_PARALLEL_FILES = int(os.getenv('S3_UPLOAD_PARALLEL_FILES', 4))
+
+# Vistas asíncronas (descargas, subidas de admin y email) en el proceso ASGI
+# Sólo se activa en el servicio uvicorn; gunicorn sigue con las vistas síncronas
+ASYNC_IO_VIEWS = os.getenv('ASYNC_IO_VIEWS', 'False').lower() == 'true'
+
+# Adjuntos temporales del wizard (volumen local dedicado, fuera de MEDIA_ROOT)
+UPLOAD_STAGING_ROOT = os.getenv('UPLOAD_STAGING_ROOT', os.path.join(tempfile.gettempdir(), 'karin_staging'))
+UPLOAD_STAGING_MAX_AGE_HOURS = int(os.getenv('UPLOAD_STAGING_MAX_AGE_HOURS', 6))
+# Espacio libre mínimo que debe quedar en el volumen tras guardar un adjunto
+UPLOAD_STAGING_MIN_FREE_MB = int(os.getenv('UPLOAD_STAGING_MIN_FREE_MB', 1024))
+
 # Storage backend
 DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 
 # Límites de archivos
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+# Mismos handlers de Django, calculando el sha256 al recibir cada archivo
+FILE_UPLOAD_HANDLERS = [
+    'appkarin.upload_handlers.HashMemoryFileUploadHandler',
+    'appkarin.upload_handlers.HashTemporaryFileUploadHandler',
+]
 
 # Media files locales (para desarrollo/fallback)
 MEDIA_URL = f"https://{AWS_S3_CUSTOM_DOMAIN}/"  # URL de S3
@@ -117,5 +242,33 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 
+# Exportaciones en segundo plano (directorio no servido por nginx)
+EXPORTS_ROOT = os.getenv('EXPORTS_ROOT', os.path.join(BASE_DIR, 'exports'))
+# Una exportación idéntica dentro de esta ventana reutiliza el archivo generado
+EXPORT_JOB_REUSE_SECONDS = int(os.getenv('EXPORT_JOB_REUSE_SECONDS', 600))
+# Los archivos generados se eliminan pasado este tiempo
+EXPORT_JOB_RETENTION_HOURS = int(os.getenv('EXPORT_JOB_RETENTION_HOURS', 24))
+# Un trabajo PROCESANDO por más de este tiempo se da por interrumpido (worker caído)
+EXPORT_JOB_STALE_SECONDS = int(os.getenv('EXPORT_JOB_STALE_SECONDS', 1800))
+
+# Conversión DOCX -> PDF (pool persistente de LibreOffice)
+# Lista "host:puerto" de servidores unoserver; vacío = un unoserver local por puesto
+PDF_UNOSERVER_HOSTS = [h.strip() for h in os.getenv('PDF_UNOSERVER_HOSTS', '').split(',') if h.strip()]
+# Puestos de conversión por proceso (repartidos entre PDF_UNOSERVER_HOSTS si hay)
+PDF_POOL_SIZE = int(os.getenv('PDF_POOL_SIZE', 2))
+# Script de consola de unoserver para los puestos locales; debe correr con el
+# Python que trae el módulo uno de LibreOffice (python3-uno)
+PDF_UNOSERVER_COMMAND = os.getenv('PDF_UNOSERVER_COMMAND', 'unoserver')
+PDF_UNOSERVER_START_TIMEOUT = int(os.getenv('PDF_UNOSERVER_START_TIMEOUT', 60))
+# Solicitudes en espera permitidas antes de responder 503
+PDF_QUEUE_MAX = int(os.getenv('PDF_QUEUE_MAX', 10))
+PDF_CONVERSION_TIMEOUT = int(os.getenv('PDF_CONVERSION_TIMEOUT', 60))
+PDF_PROFILES_ROOT = os.getenv('PDF_PROFILES_ROOT', os.path.join(tempfile.gettempdir(), 'lo_profiles'))
+# Caché de PDFs generados (LRU por tamaño; 0 la deshabilita)
+PDF_CACHE_ROOT = os.getenv('PDF_CACHE_ROOT', os.path.join(BASE_DIR, 'pdf_cache'))
+PDF_CACHE_MAX_MB = int(os.getenv('PDF_CACHE_MAX_MB', 200))
+# Descarga de informes por lote (ZIP)
+PDF_BATCH_MAX = int(os.getenv('PDF_BATCH_MAX', 200))
+
 # URL de admin
 ADMIN_URL = os.getenv('ADMIN_URL', 'admin/')
\ No newline at end of file
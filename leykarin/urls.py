@@ -13,7 +13,9 @@ from appkarin.service_admin_auth import ServiceAdminDenunciaAuth
 from appkarin.service_process_denuncia import ServiceProcessDenuncia
 from appkarin.service_consolidated import DenunciaManagementViewSet, DenunciaQueryAPI
 from appkarin.service_datatable import SimpleDenunciaDataTableAPIView, ExportDenunciasExcelAPIView
+from appkarin.service_export_jobs import ExportJobAPIView
 from appkarin.service_email import EmailSenderAPIView
+from appkarin import service_async
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -63,6 +65,11 @@ urlpatterns = [
          {'step': 'items'}, 
          name='process_items'),
     
+    path('api/create/denuncia/upload-slots/', 
+         ServiceProcessDenuncia.as_view(), 
+         {'step': 'upload-slots'}, 
+         name='process_upload_slots'),
+    
     path('api/create/denuncia/wizzard/', 
          ServiceProcessDenuncia.as_view(), 
          {'step': 'wizard'}, 
@@ -88,6 +95,11 @@ urlpatterns = [
          {'step': 'wizard-data'}, 
          name='wizard_data'),
     
+    path('api/wizard/categories/', 
+         ServiceProcessDenuncia.as_view(), 
+         {'step': 'categories'}, 
+         name='wizard_categories'),
+    
     path('api/dashboard/denuncia/', 
          ServiceProcessDenuncia.as_view(), 
          {'step': 'consulta'}, 
@@ -125,12 +137,23 @@ urlpatterns = [
          DenunciaManagementViewSet.as_view({'post': 'descargar'}), 
          name='descargar-denuncia'),
      
+    path('api/descargar-denuncias-lote/', 
+         DenunciaManagementViewSet.as_view({'post': 'descargar_lote'}), 
+         name='descargar-denuncias-lote'),
+
+    path('api/descargar-denuncias-lote/progreso/', 
+         DenunciaManagementViewSet.as_view({'get': 'descargar_lote_progreso'}), 
+         name='descargar-denuncias-lote-progreso'),
+     
+    # En el proceso ASGI (web_async) estas rutas usan las vistas asíncronas
     path('api/descargar-archivo/', 
-     DenunciaManagementViewSet.as_view({'get': 'descargar_archivo'}), 
+     service_async.descargar_archivo if settings.ASYNC_IO_VIEWS
+     else DenunciaManagementViewSet.as_view({'get': 'descargar_archivo'}), 
      name='descargar-archivo-individual'),
 
     path('api/agregar-archivos-denuncia/', 
-     DenunciaManagementViewSet.as_view({'post': 'agregar_archivos'}), 
+     service_async.agregar_archivos if settings.ASYNC_IO_VIEWS
+     else DenunciaManagementViewSet.as_view({'post': 'agregar_archivos'}), 
      name='agregar-archivos-denuncia'),
 
     # API de consultas complejas
@@ -150,10 +173,24 @@ urlpatterns = [
      csrf_exempt(ExportDenunciasExcelAPIView.as_view()), 
      name='datatable_export_excel'),
 
+     # Exportaciones en segundo plano
+     path('api/datatable/denuncias/export/jobs/',
+     csrf_exempt(ExportJobAPIView.as_view()),
+     name='export_jobs'),
+
+     path('api/datatable/denuncias/export/jobs/<uuid:job_id>/',
+     csrf_exempt(ExportJobAPIView.as_view()),
+     name='export_job_status'),
+
+     path('api/datatable/denuncias/export/jobs/<uuid:job_id>/<str:action>/',
+     csrf_exempt(ExportJobAPIView.as_view()),
+     name='export_job_action'),
+
 
      #Api Correos
      path('api/email/send/',
-          csrf_exempt(EmailSenderAPIView.as_view()), 
+          service_async.enviar_email if settings.ASYNC_IO_VIEWS
+          else csrf_exempt(EmailSenderAPIView.as_view()), 
           name='email-sender'),
 
     # =================================================================